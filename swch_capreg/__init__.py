@@ -1,5 +1,15 @@
 from .capacity_registry import SwChCapacityRegistry
+from .registry_host import SwChCapacityRegistryHost
 
 __all__ = [
     "SwChCapacityRegistry",
+    "SwChCapacityRegistryHost",
+    "SwChCapacityRegistryServer",
 ]
+
+def __getattr__(name):
+    # The HTTP service pulls in asyncio, so it is only imported when asked for.
+    if name == "SwChCapacityRegistryServer":
+        from .server import SwChCapacityRegistryServer
+        return SwChCapacityRegistryServer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
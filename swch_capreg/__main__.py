@@ -0,0 +1,31 @@
+"""
+Command-line entry point: python -m swch_capreg <command> [options]
+
+    profile      profile the offer cycle of a capacity and SAT file (profiler.py)
+    coldstart    import time and time-to-first-offer (coldstart.py)
+    loadtest     load test of the local HTTP service (loadtest.py)
+    catalog      memory and parse time of compact catalog records (catalog_bench.py)
+    replay       replay a recorded API-call trace (trace.py)
+"""
+import importlib
+import sys
+
+COMMANDS = {
+    "profile": "profiler",
+    "coldstart": "coldstart",
+    "loadtest": "loadtest",
+    "catalog": "catalog_bench",
+    "replay": "trace",
+}
+
+def main(argv: list | None = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in COMMANDS:
+        print(__doc__.strip(), file=sys.stderr)
+        return 2
+    module = importlib.import_module(f".{COMMANDS[argv[0]]}", __package__)
+    module.main(argv[1:])
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,13 @@
 
-import copy
-import ast
+import contextlib
 import logging
-import yaml
-from sardou import Sardou
-from .res_cap import ResCap
+from .res_cap import ResCap, CatalogRecord
 from .app_req import AppReq
+from .planner import RawCapPlanner
+from . import ndjson
+from .change_feed import ChangeFeed
+from .catalog import SharedCatalog
+from .storage import RegistryStorage
 
 """
 Data structure of the capacity registry:
@@ -83,32 +85,311 @@ capacity = {
     }
 }
 """
+def _yaml_dump(data) -> str:
+    import yaml
+    class _Dumper(yaml.Dumper):
+        pass
+    _Dumper.add_representer(CatalogRecord, lambda dumper, record: dumper.represent_dict(dict(record.items())))
+    return yaml.dump(data, Dumper=_Dumper, default_flow_style=False)
+
+class _YamlDump:
+    """Renders data as YAML only when a log record is actually emitted."""
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self):
+        return _yaml_dump(self.data)
+
 class SwChCapacityRegistry:
 
-    # Logger configuration
+    # Logger configuration, applied on first instantiation with the default logger
     logger = logging.getLogger()
-    logging.basicConfig(
-        level=logging.DEBUG, 
-        format='(%(asctime)s) %(levelname)s:\t%(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
+    logger_configured = False
 
-    #Name of properties to be used in calculations
+    #Name of properties to be used in calculations; with raw cloud capacity, the numeric
+    #properties of the CDT's raw capacity (see _set_raw_dimensions)
     calc_res_props = ["host.num-cpus", "host.mem-size", "host.disk-size"]
     calc_res_props_labels = ["CPU", "RAM", "DISK"]
+    RES_PROP_LABELS = {"host.num-cpus": "CPU", "host.mem-size": "RAM", "host.disk-size": "DISK"}
     capacity: dict = {}
 
     RESOURCE_TYPES_RAW    = ["cpu", "ram", "disk", "pub_ip"]
     RESOURCE_TYPES_FLAVOR = ["cpu", "ram", "disk"] 
 
-    def __init__(self, ra_id: str, logger: logging.Logger | None = None):
+    #Store parsed flavours and edge capacities as schema-backed CatalogRecords instead of dicts
+    compact_catalog = False
+
+    #Layout version of the pre-parsed capacity cache files, part of their cache key
+    CAPACITY_CACHE_FORMAT = 1
+
+    def __init__(self, ra_id: str, logger: logging.Logger | None = None, storage: RegistryStorage | None = None):
         self.ra_id = ra_id
+        if logger is None and not SwChCapacityRegistry.logger_configured:
+            logging.basicConfig(
+                level=logging.DEBUG, 
+                format='(%(asctime)s) %(levelname)s:\t%(message)s',
+                datefmt='%Y-%m-%d %H:%M:%S'
+            )
+            SwChCapacityRegistry.logger_configured = True
         self.logger = logger if logger is not None else self.__class__.logger
         self.capacity = {}
+        self.catalog = None
+        self.storage = storage
+        self.change_feed = ChangeFeed()
+        self.ledger = None
+        self.metrics = None
+        self.trace_recorder = None
+        self.invariants = None
+        self.raise_on_violation = False
+        self.swarm_priorities = dict()
+        self.reservations = None
+        self.raw_demands = dict()
+
+    def attach_reservation_ledger(self):
+        """Mirrors the state counters into a NumPy ReservationLedger (see ledger.py), which serves
+        utilisation summaries and dict views. The capacity dict stays authoritative.
+        Requires the optional numpy dependency.
+        """
+        from .ledger import ReservationLedger
+        self.ledger = ReservationLedger.from_capacity(self.capacity, self.calc_res_props)
+        return self.ledger
+
+    def _set_raw_dimensions(self):
+        """Takes the raw resource vector from the numeric properties of the raw cloud capacity
+        (e.g. host.num-cpus, host.gpus, host.bandwidth); other cloud types keep the defaults.
+        """
+        cloud = self.capacity.get("cloud", {})
+        if cloud.get("type") == "raw":
+            self.calc_res_props = [prop for prop, value in cloud["raw"]["init"].items()
+                                   if isinstance(value, (int, float)) and not isinstance(value, bool)]
+            #initialize() adds these with zero capacity, so only a state saved without them gets here
+            for prop, flavours in self._missing_raw_dimensions(cloud["flavours"], self.calc_res_props).items():
+                self.logger.warning(f"Flavours {', '.join(flavours)} use '{prop}', which the raw capacity does not have; it is not limited.")
+        else:
+            self.calc_res_props = list(self.__class__.calc_res_props)
+        self.calc_res_props_labels = [self.RES_PROP_LABELS.get(prop, prop.removeprefix("host.").upper()) for prop in self.calc_res_props]
+        self.raw_demands = dict()
+
+    @staticmethod
+    def _missing_raw_dimensions(flavours: dict, dimensions: list) -> dict:
+        """Returns {prop: [flavour, ...]} of the non-zero numeric host properties of flavours
+        that are not among the raw dimensions.
+        """
+        missing = dict()
+        for resid, flavour in flavours.items():
+            for prop, value in flavour.items():
+                if prop.startswith("host.") and prop not in dimensions and value \
+                        and isinstance(value, (int, float)) and not isinstance(value, bool):
+                    missing.setdefault(prop, []).append(resid)
+        return missing
+
+    def _raw_demand(self, resid: str) -> tuple:
+        """Returns the non-zero ((prop, amount), ...) demand vector of one unit of a cloud flavour.
+        """
+        demand = self.raw_demands.get(resid)
+        if demand is None:
+            flavour = self.capacity["cloud"]["flavours"][resid]
+            demand = tuple((prop, flavour.get(prop, 0)) for prop in self.calc_res_props if flavour.get(prop, 0))
+            self.raw_demands[resid] = demand
+        return demand
+
+    def _rebuild_mirrors(self):
+        self._set_raw_dimensions()
+        if self.ledger is not None:
+            self.ledger = self.ledger.from_capacity(self.capacity, self.calc_res_props)
+        if self.invariants is not None:
+            self.invariants = self.invariants.__class__(self.capacity, self.calc_res_props)
+        if self.reservations is not None:
+            self.enable_preemption()
+
+    def set_swarm_priority(self, swarmid: str, priority: int):
+        """Sets the priority of a swarm (default 0). With preemption enabled, offer generation
+        for a swarm may reclaim the reserved (not yet accepted) capacity of lower-priority swarms.
+        """
+        self.swarm_priorities[swarmid] = priority
+        if self.reservations is not None:
+            for msid, ms in self.capacity["swarms"].get(swarmid, {}).items():
+                for restype, resources in ms.items():
+                    for resid, rstate in resources.items():
+                        self._sync_reservation(swarmid, msid, restype, resid, rstate)
+
+    def get_swarm_priority(self, swarmid: str) -> int:
+        return self.swarm_priorities.get(swarmid, 0)
+
+    def enable_preemption(self):
+        """Keeps a priority queue of reclaimable reservations per flavour, edge instance and raw pool
+        (see preemption.py), used by offer generation when capacity is short.
+        """
+        from .preemption import ReservationQueue
+        self.reservations = ReservationQueue()
+        for swarmid, swarm in self.capacity.get("swarms", {}).items():
+            for msid, ms in swarm.items():
+                for restype, resources in ms.items():
+                    for resid, rstate in resources.items():
+                        self._sync_reservation(swarmid, msid, restype, resid, rstate)
+        return self.reservations
+
+    def disable_preemption(self):
+        self.reservations = None
+
+    def _reservation_pool(self, restype: str, resid: str) -> tuple:
+        if restype == "cloud":
+            type = self.capacity["cloud"]["type"]
+            return ("raw",) if type == "raw" else (type, resid)
+        return ("edge", resid)
+
+    def _sync_reservation(self, swarmid: str, msid: str, restype: str, resid: str, rstate: dict):
+        key = (swarmid, msid, restype, resid)
+        if rstate.get("reserved", 0) > 0:
+            self.reservations.push(self._reservation_pool(restype, resid), key, self.get_swarm_priority(swarmid))
+        else:
+            self.reservations.remove(key)
+
+    def _preemption_covers(self, restype: str, resid: str, required: int, victims: list) -> bool:
+        if restype == "cloud" and self.capacity["cloud"]["type"] == "raw":
+            free = dict(self.capacity["cloud"]["raw"]["free"])
+            for victim in victims:
+                reserved = self.capacity["swarms"][victim[0]][victim[1]][victim[2]][victim[3]]["reserved"]
+                for prop, amount in self._raw_demand(victim[3]):
+                    free[prop] = free.get(prop, 0) + amount * reserved
+            return all(free.get(prop, 0) >= amount * required for prop, amount in self._raw_demand(resid))
+        section = self.capacity["edge"]["instances"] if restype == "edge" else self.capacity["cloud"]["flavour"]
+        gained = sum(self.capacity["swarms"][victim[0]][victim[1]][victim[2]][victim[3]]["reserved"] for victim in victims)
+        return section["free"].get(resid, 0) + gained >= required
+
+    def _preempt_reservations(self, swarmid: str, restype: str, resid: str, required: int) -> bool:
+        """Releases the lowest-priority reservations of the pool of a resource, and invalidates their
+        offers, if together with the free capacity they cover `required` instances. Returns whether it did.
+        """
+        pool = self._reservation_pool(restype, resid)
+        priority = self.get_swarm_priority(swarmid)
+        entries = []
+        while not self._preemption_covers(restype, resid, required, [entry[2] for entry in entries]):
+            entry = self.reservations.pop_below(pool, priority)
+            if entry is None:
+                for entry in entries:
+                    self.reservations.restore(entry)
+                return False
+            entries.append(entry)
+        with self._storage_batch():
+            for victim_swarmid, victim_msid, victim_restype, victim_resid in [entry[2] for entry in entries]:
+                self.logger.info(f"Preempting reservation of '{victim_resid}' held by swarm '{victim_swarmid}', ms '{victim_msid}' for swarm '{swarmid}'")
+                ms_offers = self.capacity["offers"].get(victim_swarmid, {}).get(victim_msid, {})
+                for offerid in list(ms_offers):
+                    offer = ms_offers[offerid]
+                    first = offer[0] if isinstance(offer, list) and offer else offer
+                    if offerid == "colocated" or not isinstance(first, dict):
+                        continue
+                    if first["ids"]["res_type"] == victim_restype and first["ids"]["res_id"] == victim_resid:
+                        del ms_offers[offerid]
+                        if self.storage is not None:
+                            self.storage.delete_offers(victim_swarmid, victim_msid, offerid)
+                        if self.change_feed.subscriptions:
+                            self._publish_offer_change("offer_removed", victim_swarmid, victim_msid, offerid, offer)
+                rstate = self.capacity["swarms"][victim_swarmid][victim_msid][victim_restype][victim_resid]
+                self.resource_state_change(victim_swarmid, victim_msid, victim_restype, victim_resid, rstate["reserved"], "reserved", "free")
+        return True
+
+    def enable_invariant_checks(self, raise_on_violation: bool = False):
+        """Checks the counters touched by every state change (see invariants.py) in O(1).
+        Violations are logged as errors. With raise_on_violation, a transition that would violate an
+        invariant is refused with a ValueError before anything is changed.
+        """
+        from .invariants import InvariantChecker
+        self.invariants = InvariantChecker(self.capacity, self.calc_res_props)
+        self.raise_on_violation = raise_on_violation
+        return self.invariants
+
+    def disable_invariant_checks(self):
+        self.invariants = None
+
+    def audit_invariants(self) -> list:
+        """Checks every counter of the registry and returns the violations found (empty if none).
+        """
+        from .invariants import InvariantChecker
+        checker = self.invariants if self.invariants is not None else InvariantChecker(self.capacity, self.calc_res_props)
+        violations = checker.audit()
+        for violation in violations:
+            self.logger.error(f"Invariant violated: {violation}")
+        return violations
+
+    def _report_violations(self, violations: list, action: str):
+        for violation in violations:
+            self.logger.error(f"Invariant violated after {action}: {violation}")
+
+    def _refuse_violating_changes(self, changes: list, from_state: str, to_state: str, action: str):
+        """With raise_on_violation, raises ValueError before any counter, storage or mirror is changed
+        if moving [(restype, resid, count), ...] would leave a touched counter violating an invariant.
+        """
+        if self.invariants is None or not self.raise_on_violation:
+            return
+        violations = self.invariants.preview_state_changes(changes, from_state, to_state)
+        if violations:
+            for violation in violations:
+                self.logger.error(f"Refusing {action}: {violation}")
+            raise ValueError(f"Invariant would be violated by {action}: " + "; ".join(violations))
+
+    def attach_metrics(self, collector=None):
+        """Times the METHODS and the offer generation phases of this registry and counts offers,
+        accepts, rejects, failed transitions and overbook attempts (see metrics.py).
+        Returns the collector; collector.export() renders it in Prometheus text format.
+        """
+        from .metrics import MetricsCollector
+        from .methods import METHODS
+        if self.metrics is not None:
+            self.detach_metrics()
+        self.metrics = collector if collector is not None else MetricsCollector()
+        self.metrics.instrument(self, METHODS)
+        return self.metrics
+
+    def detach_metrics(self):
+        from .methods import METHODS
+        if self.metrics is not None:
+            self.metrics.uninstrument(self, METHODS)
+            self.metrics = None
+
+    def start_trace_recording(self, path: str):
+        """Records every public call of this registry with its arguments to a trace file
+        (see trace.py), which TraceReplayer can re-run against fresh registries.
+        """
+        from .trace import TraceRecorder
+        if self.trace_recorder is not None:
+            self.stop_trace_recording()
+        self.trace_recorder = TraceRecorder(self, path)
+        self.trace_recorder.instrument()
+        return self.trace_recorder
+
+    def stop_trace_recording(self):
+        """Stops recording and returns the digest of the final state written to the trace.
+        """
+        if self.trace_recorder is None:
+            return None
+        self.trace_recorder.uninstrument()
+        digest = self.trace_recorder.close()
+        self.trace_recorder = None
+        return digest
+
+    def subscribe_changes(self, maxsize: int = 1024, block_timeout: float | None = 0):
+        """Registers a subscriber for resource state and offer deltas (see change_feed.py).
+        """
+        return self.change_feed.subscribe(maxsize, block_timeout)
+
+    def unsubscribe_changes(self, subscription):
+        self.change_feed.unsubscribe(subscription)
+
+    def _publish_offer_change(self, event: str, swarmid: str, msid: str, offerid: str, offer):
+        if offerid == "colocated":
+            self.change_feed.publish(event, swarm=swarmid, ms=msid, offer=offerid)
+            return
+        instances = offer if isinstance(offer, list) else [offer]
+        ids = instances[0]["ids"] if instances else {}
+        self.change_feed.publish(event, swarm=swarmid, ms=msid, type=ids.get("res_type"),
+                                 resource=ids.get("res_id"), count=len(instances), offer=offerid)
 
     def _lowercase_lambda_string_values(self, lambda_expression: str) -> str:
         if not isinstance(lambda_expression, str):
             return lambda_expression
+        import ast
 
         class LowercaseStringConstants(ast.NodeTransformer):
             def visit_Constant(self, node):
@@ -126,6 +407,7 @@ class SwChCapacityRegistry:
             return lambda_expression
 
     def extract_application_requirements_from_SAT_file(self, application_description_filename: str):
+        from sardou import Sardou
         self.logger.debug(f"Extracting application requirements from '{application_description_filename}'...")
         tosca = Sardou(application_description_filename)
         reqs = tosca.get_requirements()
@@ -135,40 +417,121 @@ class SwChCapacityRegistry:
             if isinstance(expression, str):
                 reqs[msid]["expression"] = self._lowercase_lambda_string_values(expression)
 
-        self.logger.debug(f"Extracted application requirements from '{application_description_filename}':\n {yaml.dump(reqs, default_flow_style=False)}")
+        self.logger.debug("Extracted application requirements from '%s':\n %s", application_description_filename, _YamlDump(reqs))
         
         return reqs
 
-    def initialize_capacity_by_content(self, content: str):
-        tosca = Sardou(content=content)
-        tosca_capacity = tosca.get_capacities()
-        self.logger.debug("Capacity initialised by content:\n %s", yaml.dump(tosca_capacity, default_flow_style=False))
-        self.initialize(init_capacity=tosca_capacity)
+    def _capacity_cache_key(self, data: bytes) -> str:
+        """Returns the cache key of a CDT: the SHA-256 of the cache format, the Sardou version and the CDT.
+        A Sardou upgrade may parse the same CDT differently, so its cached capacities are not reused.
+        """
+        import hashlib
+        from importlib import metadata
+        import sardou
+        sardou_version = getattr(sardou, "__version__", None)
+        if sardou_version is None:
+            try:
+                sardou_version = metadata.version("Sardou")
+            except metadata.PackageNotFoundError:
+                sardou_version = "unknown"
+        digest = hashlib.sha256(f"{self.CAPACITY_CACHE_FORMAT}\0{sardou_version}\0".encode())
+        digest.update(data)
+        return digest.hexdigest()
+
+    def _read_capacity_cache(self, cache_dir: str, digest: str):
+        import json
+        import os
+        cache_filename = os.path.join(cache_dir, f"capacity-{digest}.json")
+        if not os.path.exists(cache_filename):
+            return None
+        try:
+            with open(cache_filename) as f:
+                tosca_capacity = json.load(f)
+            self.logger.debug(f"Pre-parsed capacity loaded from '{cache_filename}'.")
+            return tosca_capacity
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable capacity cache '{cache_filename}': {e}")
+            return None
+
+    def _write_capacity_cache(self, cache_dir: str, digest: str, tosca_capacity: dict):
+        import json
+        import os
+        import tempfile
+        cache_filename = os.path.join(cache_dir, f"capacity-{digest}.json")
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', dir=cache_dir, suffix='.tmp', delete=False) as f:
+                json.dump(tosca_capacity, f)
+            os.replace(f.name, cache_filename)
+        except (OSError, TypeError, ValueError) as e:
+            self.logger.warning(f"Could not write capacity cache '{cache_filename}': {e}")
+
+    def read_capacity_by_content(self, content: str, cache_dir: str | None = None) -> dict:
+        """Returns the capacities parsed by Sardou from CDT content. With cache_dir, they are cached
+        under a key of the content, the Sardou version and CAPACITY_CACHE_FORMAT, and later calls
+        with unchanged content skip Sardou.
+        """
+        digest = self._capacity_cache_key(content.encode()) if cache_dir else None
+        tosca_capacity = self._read_capacity_cache(cache_dir, digest) if cache_dir else None
+        if tosca_capacity is None:
+            from sardou import Sardou
+            tosca = Sardou(content=content)
+            tosca_capacity = tosca.get_capacities()
+            if cache_dir:
+                self._write_capacity_cache(cache_dir, digest, tosca_capacity)
+        self.logger.debug("Capacity initialised by content:\n %s", _YamlDump(tosca_capacity))
+        return tosca_capacity
+
+    def read_capacity_from_file(self, filename: str, cache_dir: str | None = None) -> dict:
+        """Returns the capacities parsed by Sardou from a CDT file, see read_capacity_by_content for cache_dir.
+        """
+        tosca_capacity, digest = None, None
+        if cache_dir:
+            with open(filename, 'rb') as f:
+                digest = self._capacity_cache_key(f.read())
+            tosca_capacity = self._read_capacity_cache(cache_dir, digest)
+        if tosca_capacity is None:
+            from sardou import Sardou
+            tosca = Sardou(path=filename)
+            tosca_capacity = tosca.get_capacities()
+            if cache_dir:
+                self._write_capacity_cache(cache_dir, digest, tosca_capacity)
+        self.logger.debug("Capacity read from file:\n %s", _YamlDump(tosca_capacity))
+        return tosca_capacity
+
+    def initialize_capacity_by_content(self, content: str, cache_dir: str | None = None):
+        self.initialize(init_capacity=self.read_capacity_by_content(content, cache_dir))
         return 
 
-    def initialize_capacity_from_file(self, filename: str):
-        tosca = Sardou(path=filename)
-        tosca_capacity = tosca.get_capacities()
-        self.logger.debug("Capacity read from file:\n %s", yaml.dump(tosca_capacity, default_flow_style=False))
-        self.initialize(init_capacity=tosca_capacity)
+    def initialize_capacity_from_file(self, filename: str, cache_dir: str | None = None):
+        self.initialize(init_capacity=self.read_capacity_from_file(filename, cache_dir))
         return
 
-    def initialize(self, init_capacity: dict):
+    def initialize(self, init_capacity: dict, catalog: SharedCatalog | None = None):
         """Initializes a capacity
+        With a catalog, the parsed flavours and edge capacities (and their match index) are
+        shared with the catalog instead of being parsed again; only the counters are private.
         """
+        if self.change_feed.subscriptions:
+            self.change_feed.publish("reset")
+        self.catalog = catalog
         self.capacity["swarms"] = dict()
         self.capacity["offers"] = dict()
 
         if "cloud_flavours" in init_capacity:
             self.capacity["cloud"] = dict()
-            self.capacity["cloud"]["flavours"] = dict()
-            rescap = ResCap()
-            for act_flavor, act_flavor_data in init_capacity["cloud_flavours"].items():
-                self.capacity["cloud"]["flavours"][act_flavor] = rescap.parse(act_flavor_data)
+            if catalog is not None:
+                self.capacity["cloud"]["flavours"] = catalog.cloud_flavours
+            else:
+                self.capacity["cloud"]["flavours"] = dict()
+                rescap = ResCap()
+                parse = rescap.parse_compact if self.compact_catalog else rescap.parse
+                for act_flavor, act_flavor_data in init_capacity["cloud_flavours"].items():
+                    self.capacity["cloud"]["flavours"][act_flavor] = parse(act_flavor_data)
             if "cloud_capacity_flavour" in init_capacity:
                 self.capacity["cloud"]["type"] = "flavour"
                 self.capacity["cloud"]["flavour"] = dict()
-                self.capacity["cloud"]["flavour"]["init"] = init_capacity.get("cloud_capacity_flavour", dict())
+                self.capacity["cloud"]["flavour"]["init"] = dict(init_capacity.get("cloud_capacity_flavour", dict()))
             elif "cloud_capacity_raw" in init_capacity:
                 self.capacity["cloud"]["type"] = "raw"
                 #FIXME: temporary workaround: convert raw capacity values to int if they are not already
@@ -180,8 +543,13 @@ class SwChCapacityRegistry:
                             init_raw["host." + key] = int(value)
                         else:
                             init_raw["host." + key] = value            
+                #a flavour property the CDT gives no raw capacity for is a dimension with none of it
+                for prop, flavours in self._missing_raw_dimensions(self.capacity["cloud"]["flavours"], init_raw).items():
+                    self.logger.warning(f"Flavours {', '.join(flavours)} use '{prop}', which the raw capacity does not have; its capacity is 0.")
+                    init_raw[prop] = 0
                 self.capacity["cloud"]["raw"] = dict()
                 self.capacity["cloud"]["raw"]["init"] = init_raw
+                self._set_raw_dimensions()
             else:
                 self.logger.info('Cloud flavour detected, but capacity is missing. Initialization was unsuccessful.')
                 return False
@@ -201,13 +569,17 @@ class SwChCapacityRegistry:
                 self.capacity["cloud"][self.capacity["cloud"]["type"]]["reserved"] = init_dict.copy()
                 self.capacity["cloud"][self.capacity["cloud"]["type"]]["assigned"] = init_dict.copy()
                 self.capacity["cloud"][self.capacity["cloud"]["type"]]["allocated"] = init_dict.copy()            
-            self.logger.debug("Initialized capacity:\n %s", yaml.dump(self.capacity, default_flow_style=False))
+            self.logger.debug("Initialized capacity:\n %s", _YamlDump(self.capacity))
         if "edge_instances" in init_capacity:
             self.capacity["edge"] = dict()
-            self.capacity["edge"]["capacities"] = dict()
-            rescap = ResCap()
-            for act_instance, act_instance_data in init_capacity["edge_instances"].items():
-                self.capacity["edge"]["capacities"][act_instance] = rescap.parse(act_instance_data)
+            if catalog is not None:
+                self.capacity["edge"]["capacities"] = catalog.edge_capacities
+            else:
+                self.capacity["edge"]["capacities"] = dict()
+                rescap = ResCap()
+                parse = rescap.parse_compact if self.compact_catalog else rescap.parse
+                for act_instance, act_instance_data in init_capacity["edge_instances"].items():
+                    self.capacity["edge"]["capacities"][act_instance] = parse(act_instance_data)
 
             init_dict = self.capacity["edge"]["capacities"].copy()
             self.capacity["edge"]["instances"] = dict()
@@ -220,7 +592,10 @@ class SwChCapacityRegistry:
             self.capacity["edge"]["instances"]["reserved"] = init_dict.copy()
             self.capacity["edge"]["instances"]["assigned"] = init_dict.copy()
             self.capacity["edge"]["instances"]["allocated"] = init_dict.copy() 
-            self.logger.debug("Initialized capacity:\n %s", yaml.dump(self.capacity, default_flow_style=False))
+            self.logger.debug("Initialized capacity:\n %s", _YamlDump(self.capacity))
+        if self.storage is not None:
+            self.storage.save_capacity(self.capacity)
+        self._rebuild_mirrors()
         return True
 
     def calculate_matching_resources(self, requirements: list = []):
@@ -229,6 +604,10 @@ class SwChCapacityRegistry:
         self.logger.debug("Calculating matching cloud flavors and edge instances:")
         for msid in requirements.keys():
             self.logger.debug(f"\t{msid}")
+            if self.catalog is not None:
+                matching_resources[msid] = self.catalog.match(requirements[msid]["expression"])
+                self.logger.debug(f"\t\t{matching_resources[msid]} (shared catalog)")
+                continue
             matching_resources[msid] = []
             if "cloud" in self.capacity:
                 for flavor_name, flavor_data in self.capacity["cloud"]["flavours"].items():
@@ -272,14 +651,7 @@ class SwChCapacityRegistry:
                 self.logger.debug(f"\tRequired resources per unit of cloud flavor '{res_name}':")
                 self.logger.debug("\t\t"+", ".join([f"{label}: {required_props_per_flavor.get(prop, 0)}" for label, prop in zip(self.calc_res_props_labels, self.calc_res_props)]))
                 self.logger.debug(f"\tRequired instances of cloud flavor '{res_name}': {required_instance}")
-                counter, found = required_instance, False
-                while counter > 0 and not found:
-                    found = True
-                    for prop in self.calc_res_props:
-                        if available_props.get(prop, 0) < (required_props_per_flavor.get(prop, 0) * counter):
-                            counter -= 1
-                            found = False
-                            break
+                counter = max(min([required_instance] + [available_props.get(prop, 0) // amount for prop, amount in self._raw_demand(res_name)]), 0)
                 self.logger.debug(f"\tAvailable instances of cloud flavor '{res_name}': {counter}")
                 self.logger.debug(f"\tCalculated amount for '{counter}' instances of cloud flavor '{res_name}':")
                 self.logger.debug("\t\t"+", ".join([f"{label}: {required_props_per_flavor.get(prop, 0)*counter}" for label, prop in zip(self.calc_res_props_labels, self.calc_res_props)]))
@@ -297,37 +669,162 @@ class SwChCapacityRegistry:
             return available_instances
         return 0
         
+    def plan_raw_flavour_assignment(self, matching_resources: dict, instance_counts: dict, swarmid: str | None = None):
+        """Plans one cloud flavour and instance count per microservice against the raw free pool.
+        With swarmid, the cloud capacity the swarm holds reserved counts as free.
+        """
+        if "cloud" not in self.capacity or self.capacity["cloud"].get("type") != "raw":
+            return dict()
+        free = self.capacity["cloud"]["raw"]["free"]
+        if swarmid is not None and swarmid in self.capacity["swarms"]:
+            free = dict(free)
+            for ms in self.capacity["swarms"][swarmid].values():
+                for resid, rstate in ms.get("cloud", {}).items():
+                    for prop, amount in self._raw_demand(resid):
+                        free[prop] = free.get(prop, 0) + amount * rstate["reserved"]
+        demands = dict()
+        for msid, resources in matching_resources.items():
+            candidates = [resource["cloud"] for resource in resources if "cloud" in resource]
+            if candidates:
+                demands[msid] = {"count": instance_counts.get(msid, 1), "candidates": candidates}
+        planner = RawCapPlanner(self.calc_res_props)
+        plan = planner.plan(demands, self.capacity["cloud"]["flavours"], free)
+        self.logger.debug("Planned raw flavour assignment:\n %s", _YamlDump(plan))
+        return plan
+
     def resource_state_init_amount(self, swarmid: str, msid: str, restype: str, resid: str, state: str, amount: int):
         self.logger.debug(f"Initializing resource amount: '{swarmid}', '{msid}', '{restype}', '{resid}', '{state}', {amount}")
         self.capacity["swarms"].setdefault(swarmid, dict())
         self.capacity["swarms"][swarmid].setdefault(msid, dict())
         self.capacity["swarms"][swarmid][msid].setdefault(restype, dict())
         rstate = self.capacity["swarms"][swarmid][msid][restype].setdefault(resid, {"free": 0, "reserved": 0, "assigned": 0, "allocated": 0})
+        if self.storage is not None:
+            self.storage.set_resource_state(swarmid, msid, restype, resid, dict(rstate, **{state: amount}))
+        if self.invariants is not None:
+            self.invariants.on_init_amount(restype, resid, state, rstate[state], amount)
         rstate[state] = amount
+        if self.ledger is not None:
+            self.ledger.set_holding(swarmid, msid, restype, resid, state, amount)
+        if self.reservations is not None and state == "reserved":
+            self._sync_reservation(swarmid, msid, restype, resid, rstate)
+        if self.change_feed.subscriptions:
+            self.change_feed.publish("init_amount", swarm=swarmid, ms=msid, type=restype, resource=resid,
+                                     count=amount, to=state)
         return amount
 
+    def _storage_batch(self):
+        """Commits the storage writes of its block together, see RegistryStorage.batch."""
+        return self.storage.batch() if self.storage is not None else contextlib.nullcontext()
+
+    def _global_counter_deltas(self, restype: str, resid: str):
+        """Returns the global counter scope touched by one unit of a resource and the amount per counter key.
+        """
+        if restype == "cloud":
+            type = self.capacity["cloud"]["type"]
+            if type == "raw":
+                return "raw", dict(self._raw_demand(resid))
+            return type, {resid: 1}
+        return "edge", {resid: 1}
+
     def resource_state_change(self, swarmid: str, msid: str, restype: str, resid: str, count: int, from_state: str, to_state: str) -> int:
         self.logger.debug(f"Changing state: '{swarmid}', '{msid}', '{restype}', '{resid}', {count}, '{from_state}', '{to_state}'")
         rstate = self.capacity["swarms"][swarmid][msid][restype][resid]
         if rstate[from_state] < count:
             self.logger.warning(f"Trying to change state of resource '{resid}' in swarm '{swarmid}', ms '{msid}', type '{restype}' from state '{from_state}' with count {count}, but only {rstate[from_state]} is available.")
             return None
+        self._refuse_violating_changes([(restype, resid, count)], from_state, to_state,
+                                       f"moving {count} of '{resid}' in swarm '{swarmid}', ms '{msid}' from '{from_state}' to '{to_state}'")
+        if self.storage is not None:
+            self.storage.state_change(swarmid, msid, restype, resid, count, from_state, to_state,
+                                      *self._global_counter_deltas(restype, resid))
+        if self.ledger is not None:
+            self.ledger.transition(swarmid, msid, restype, resid, count, from_state, to_state)
+        return self._apply_state_change(rstate, swarmid, msid, restype, resid, count, from_state, to_state)
+
+    def resource_capacity_adjust(self, restype: str, key: str, delta: int) -> int:
+        """Adds delta units to the init and free counters of a flavour, raw property (restype "cloud")
+        or edge instance. A negative delta removes at most the free amount. Returns the amount moved.
+        Used to move quota between the shards of a ShardedRegistry.
+        """
+        if restype == "cloud":
+            scope = self.capacity["cloud"]["type"]
+            section = self.capacity["cloud"][scope]
         else:
-            rstate[from_state] -= count
-            if to_state != "free":
-                rstate[to_state] += count
+            scope, section = "edge", self.capacity["edge"]["instances"]
+        if delta < 0:
+            delta = -min(-delta, section["free"].get(key, 0))
+        if delta == 0:
+            return 0
+        self.logger.debug(f"Adjusting capacity of {restype} '{key}' by {delta}")
+        known = key in section["init"]
+        if self.storage is not None:
+            self.storage.adjust_capacity(scope, key, delta)
+        section["init"][key] = section["init"].get(key, 0) + delta
+        section["free"][key] = section["free"].get(key, 0) + delta
+        # only a new counter (e.g. a new raw property) changes the shape of the mirrors;
+        # the invariant and preemption mirrors do not track init or free
+        if not known:
+            self._rebuild_mirrors()
+        elif self.ledger is not None:
+            self.ledger.adjust_capacity(restype, key, delta)
+        if self.change_feed.subscriptions:
+            self.change_feed.publish("capacity", type=restype, resource=key, count=delta)
+        return delta
+
+    def resource_state_change_bulk(self, changes: list, from_state: str, to_state: str) -> int:
+        """Moves [(swarmid, msid, restype, resid, count), ...] from from_state to to_state all-or-nothing.
+        Returns the total count moved, or None (changing nothing) if any resource is short.
+        """
+        self.logger.debug(f"Changing state of {len(changes)} resources: '{from_state}', '{to_state}'")
+        needed = dict()
+        for swarmid, msid, restype, resid, count in changes:
+            key = (swarmid, msid, restype, resid)
+            needed[key] = needed.get(key, 0) + count
+        rstates = dict()
+        for key, count in needed.items():
+            swarmid, msid, restype, resid = key
+            rstates[key] = self.capacity["swarms"].get(swarmid, {}).get(msid, {}).get(restype, {}).get(resid)
+            if rstates[key] is None or rstates[key][from_state] < count:
+                self.logger.warning(f"Trying to change state of resource '{resid}' in swarm '{swarmid}', ms '{msid}', type '{restype}' from state '{from_state}' with count {count}, but it is not available.")
+                return None
+        self._refuse_violating_changes([change[2:] for change in changes], from_state, to_state,
+                                       f"moving {len(changes)} resources from '{from_state}' to '{to_state}'")
+        if self.storage is not None:
+            self.storage.state_change_bulk([change + self._global_counter_deltas(change[2], change[3]) for change in changes],
+                                           from_state, to_state)
+        if self.ledger is not None:
+            self.ledger.transition_bulk(changes, from_state, to_state)
+        total = 0
+        for swarmid, msid, restype, resid, count in changes:
+            total += self._apply_state_change(rstates[(swarmid, msid, restype, resid)], swarmid, msid, restype, resid, count, from_state, to_state)
+        return total
+
+    def _apply_state_change(self, rstate: dict, swarmid: str, msid: str, restype: str, resid: str, count: int, from_state: str, to_state: str) -> int:
+        rstate[from_state] -= count
+        if to_state != "free":
+            rstate[to_state] += count
         if restype == "cloud":   
             type = self.capacity["cloud"]["type"]
             if type == "flavour":
                 self.capacity["cloud"][type][from_state][resid] -= count
                 self.capacity["cloud"][type][to_state][resid] += count
             if type == "raw":
-                for prop in self.calc_res_props:
-                    self.capacity["cloud"]["raw"][from_state][prop] -= (self.capacity["cloud"]["flavours"][resid][prop] * count)
-                    self.capacity["cloud"]["raw"][to_state][prop] += (self.capacity["cloud"]["flavours"][resid][prop] * count)
+                from_counters, to_counters = self.capacity["cloud"]["raw"][from_state], self.capacity["cloud"]["raw"][to_state]
+                for prop, amount in self._raw_demand(resid):
+                    from_counters[prop] -= amount * count
+                    to_counters[prop] += amount * count
         if restype == "edge":   
             self.capacity["edge"]["instances"][from_state][resid] -= count
             self.capacity["edge"]["instances"][to_state][resid] += count
+        if self.reservations is not None and "reserved" in (from_state, to_state):
+            self._sync_reservation(swarmid, msid, restype, resid, rstate)
+        if self.invariants is not None:
+            violations = self.invariants.on_state_change(restype, resid, count, from_state, to_state)
+            if violations:
+                self._report_violations(violations, f"moving {count} of '{resid}' in swarm '{swarmid}', ms '{msid}' from '{from_state}' to '{to_state}'")
+        if self.change_feed.subscriptions:
+            self.change_feed.publish("state", swarm=swarmid, ms=msid, type=restype, resource=resid,
+                                     count=count, **{"from": from_state, "to": to_state})
         return count
     
     def resource_set_deployed(self, swarmid: str, msid: str, restype: str, resid: str, count: int):
@@ -346,156 +843,407 @@ class SwChCapacityRegistry:
             return None
         offers = list([offer]) if isinstance(offer, dict) else offer
         res_set = dict()
-        res_set['swarmid'] = offer["ids"]["swarm_id"]
-        res_set['msid'] = offer["ids"]["ms_id"]
-        res_set['resid'] = offer["ids"]["res_id"]
-        res_set['restype'] = offer["ids"]["res_type"]
+        res_set['swarmid'] = offers[0]["ids"]["swarm_id"]
+        res_set['msid'] = offers[0]["ids"]["ms_id"]
+        res_set['resid'] = offers[0]["ids"]["res_id"]
+        res_set['restype'] = offers[0]["ids"]["res_type"]
         res_set['count'] = len(offers) if isinstance(offer, list) else 1
         return res_set
     
+    def resource_utilisation_summary(self):
+        """Returns per-state totals and the used ratio of cloud flavours, edge instances and raw properties.
+        Read from the reservation ledger if one is attached, otherwise summed from the dict counters
+        (no ledger is attached and numpy is not needed).
+        """
+        if self.ledger is not None:
+            return self.ledger.utilisation()
+        states = ["free", "reserved", "assigned", "allocated", "init"]
+        def with_used_ratio(totals):
+            totals["used_ratio"] = float(1 - totals["free"] / totals["init"]) if totals["init"] else 0.0
+            return totals
+        summary = dict()
+        cloud = self.capacity.get("cloud")
+        sections = []
+        if cloud is not None and cloud["type"] == "flavour" and cloud["flavour"]["init"]:
+            sections.append(("cloud", cloud["flavour"], cloud["flavour"]["init"]))
+        if "edge" in self.capacity and self.capacity["edge"]["capacities"]:
+            sections.append(("edge", self.capacity["edge"]["instances"], self.capacity["edge"]["capacities"]))
+        for restype, section, names in sections:
+            summary[restype] = with_used_ratio(dict((state, sum(section.get(state, {}).get(name, 0) for name in names)) for state in states))
+        if cloud is not None and cloud["type"] == "raw":
+            summary["raw"] = dict((prop, with_used_ratio(dict((state, cloud["raw"].get(state, {}).get(prop, 0)) for state in states)))
+                                  for prop in self.calc_res_props)
+        return summary
+
     def resource_set_query_all(self, swarmid: str, msid: str=None):
+        import copy
         return copy.deepcopy(self.capacity.get("swarms", {}).get(swarmid, {}).get(msid, {}) if msid else self.capacity.get("swarms", {}).get(swarmid, {}))
     
 
-    def resource_offer_generate_by_SAT_content(self, swarmid: str, sat_content: str):
+    def resource_set_query_all_as_ndjson(self, swarmid: str, fp, msid: str=None) -> int:
+        """Streams the resource states of a swarm (or one ms) to fp, one resource per line.
+        Paths are [msid, restype, resid], or [restype, resid] when msid is given.
+        """
+        swarm = self.capacity.get("swarms", {}).get(swarmid, {})
+        mss = {msid: swarm.get(msid, {})} if msid else swarm
+        def records():
+            for act_msid, ms in mss.items():
+                prefix = [] if msid else [act_msid]
+                for restype, resources in ms.items():
+                    for resid, rstate in resources.items():
+                        yield prefix + [restype, resid], rstate
+        return ndjson.write_records(records(), fp)
+
+    def resource_offer_generate_by_SAT_content(self, swarmid: str, sat_content: str, instance_counts: dict | None = None):
+        import tempfile
+        SATtempfile = tempfile.NamedTemporaryFile(prefix='SWCH_SAT_', suffix='.yaml', dir='/tmp')
+        try:
+            with open(SATtempfile.name, 'w') as f:
+                f.write(sat_content)
+            return self.resource_offer_generate_from_SAT_file(swarmid, SATtempfile.name, instance_counts)
+        finally:
+            SATtempfile.close()
+
+    def resource_offer_generate_from_SAT_file(self, swarmid: str, sat_filename: str, instance_counts: dict | None = None):
+        for _ in self.resource_offer_generate_iter_from_SAT_file(swarmid, sat_filename, instance_counts):
+            pass
+        return self.capacity["offers"][swarmid]
+
+    def resource_offer_generate_iter_by_SAT_content(self, swarmid: str, sat_content: str, instance_counts: dict | None = None):
         import tempfile
         SATtempfile = tempfile.NamedTemporaryFile(prefix='SWCH_SAT_', suffix='.yaml', dir='/tmp')
         try:
             with open(SATtempfile.name, 'w') as f:
                 f.write(sat_content)
-            return self.resource_offer_generate_from_SAT_file(swarmid, SATtempfile.name)
+            yield from self.resource_offer_generate_iter_from_SAT_file(swarmid, SATtempfile.name, instance_counts)
         finally:
             SATtempfile.close()
 
-    def resource_offer_generate_from_SAT_file(self, swarmid: str, sat_filename: str):
-        import random
+    def resource_offer_generate_iter_from_SAT_file(self, swarmid: str, sat_filename: str, instance_counts: dict | None = None):
+        """Generates offers like resource_offer_generate_from_SAT_file, yielding (msid, offerid, offer)
+        as soon as each offer is reserved and stored, so it can be accepted or rejected right away.
+        Colocated microservices are yielded as (col_msid, "colocated", msid).
+        """
         self.logger.debug(f"Generating offer for swarm '{swarmid}' with requirements from '{sat_filename}'...")
         reqs = self.extract_application_requirements_from_SAT_file(sat_filename)
         matching_resources = self.calculate_matching_resources(reqs)
+        swarm = self.capacity["swarms"].get(swarmid, {})
+        #accepted (assigned or allocated) instances are never released or re-offered: their resources are
+        #frozen, and a microservice whose accepted instances cover its instance count is not re-planned
+        frozen, satisfied = set(), set()
+        for msid, ms in swarm.items():
+            accepted = 0
+            for restype, resources in ms.items():
+                for resid, rstate in resources.items():
+                    if rstate["assigned"] + rstate["allocated"] > 0:
+                        frozen.add((msid, restype, resid))
+                        accepted += rstate["assigned"] + rstate["allocated"]
+            if accepted >= (instance_counts.get(msid, 1) if instance_counts else 1):
+                satisfied.add(msid)
+        #with explicit instance counts, raw cloud flavours are planned for the whole SAT in one solve;
+        #the swarm's own reservations count as free, so a re-offer can keep them
+        raw_plan = self.plan_raw_flavour_assignment(dict((msid, resources) for msid, resources in matching_resources.items() if msid not in satisfied),
+                                                    instance_counts, swarmid) if instance_counts else dict()
+        #re-offer: only the difference to the swarm's current reservations and offers is applied
+        previous = self.capacity["offers"].get(swarmid, {})
         offers = dict()
-        for msid, matching_resources in matching_resources.items():
-            #instance_count_required=random.randint(1,2) #FIX: should read this number from SAT, currently unspecified
-            instance_count_required = 1
-            for resource in matching_resources:
-                resource_type = list(resource.keys())[0]
-                resource_name = resource[resource_type]
-                self.logger.debug(f"AAAAAA '{resource_name}' of type '{resource_type}' for ms '{msid}' with required instance count {instance_count_required}...")
-                available_instances = self.calculate_available_instances_of_resources(resource_type, resource_name, instance_count_required)
-                if available_instances >= instance_count_required:
-                    self.resource_state_init_amount(swarmid, msid, resource_type, resource_name, "free", available_instances)
-                    self.resource_state_change(swarmid, msid, resource_type, resource_name, available_instances, "free", "reserved")
-                    #query provider information for the flavor
-                    flavor_or_edge = "flavours" if resource_type == "cloud" else "capacities"
-                    self.logger.debug(f"BBBBBB '{flavor_or_edge}' of type '{resource_type}'...")
-                    provider_id = self.capacity[resource_type][flavor_or_edge][resource_name]["resource.provider"]
-                    #query characteristics for the flavor
-                    characteristic_names = ["pricing.cost",
-                                            "energy.consumption",
-                                            "host.bandwidth"]
-                    characteristics = dict()
-                    for characteristic_name in characteristic_names:
-                        characteristics[characteristic_name] = self.capacity[resource_type][flavor_or_edge][resource_name].get(characteristic_name, None)
-                    #compose offer
-                    offerid = self.ra_id + "_" + swarmid + "_" + msid + "_" + resource_name
-                    if available_instances > 1:
-                        instance_list = list() 
-                        for instance_index in range(available_instances):
-                            instance_list.append(dict({
-                                    "ids": {
-                                        "offer_id": offerid+"_"+str(instance_index),
-                                        "ra_id": self.ra_id,
-                                        "swarm_id": swarmid,
-                                        "ms_id": msid,
-                                        "provider_id": provider_id,
-                                        "res_type": resource_type,
-                                        "res_id": resource_name
-                                    },
-                                    "characteristics": characteristics,
-                                    "properties": reqs[msid].get("properties", {})}))
-                        offers.setdefault(msid,dict())
-                        offers[msid][offerid]=instance_list
+        self.capacity["offers"][swarmid] = offers
+        #target reservation per (msid, restype, resid); None where it depends on the free capacity
+        targets = dict()
+        for msid, resources in matching_resources.items():
+            instance_count_required = instance_counts.get(msid, 1) if instance_counts else 1
+            for resource in resources:
+                resource_type, resource_name = next(iter(resource.items()))
+                key = (msid, resource_type, resource_name)
+                if msid in satisfied or key in frozen:
+                    #kept as it is, together with its previous offer
+                    targets[key] = swarm.get(msid, {}).get(resource_type, {}).get(resource_name, {}).get("reserved", 0)
+                elif resource_type == "cloud" and msid in raw_plan:
+                    if raw_plan[msid]["flavour"] == resource_name:
+                        targets[key] = raw_plan[msid]["count"]
+                    elif raw_plan[msid]["flavour"] is None and self.reservations is not None:
+                        #unplanned: the candidates are tried in turn, reclaiming lower-priority reservations
+                        targets[key] = None
+                elif swarm.get(msid, {}).get(resource_type, {}).get(resource_name, {}).get("reserved", 0) >= instance_count_required:
+                    targets[key] = instance_count_required
+                else:
+                    targets[key] = None
+        #all shrinking and dropped reservations are released first, so the increases can use that capacity
+        with self._storage_batch():
+            for msid, ms in swarm.items():
+                for restype, resources in ms.items():
+                    for resid, rstate in resources.items():
+                        target = targets.get((msid, restype, resid), 0)
+                        if target is not None and rstate["reserved"] > target:
+                            self.resource_state_change(swarmid, msid, restype, resid, rstate["reserved"] - target, "reserved", "free")
+        #(msid, offerid) of the offers yielded, the ones published as added, and the previous ones published as removed
+        offered, added, replaced = set(), set(), set()
+        try:
+            for msid, matching_resources in matching_resources.items():
+                instance_count_required = instance_counts.get(msid, 1) if instance_counts else 1
+                for resource in matching_resources:
+                    resource_type = list(resource.keys())[0]
+                    resource_name = resource[resource_type]
+                    if (msid, resource_type, resource_name) not in targets:
+                        continue
+                    if msid in satisfied or (msid, resource_type, resource_name) in frozen:
+                        offerid = self.ra_id + "_" + swarmid + "_" + msid + "_" + resource_name
+                        old_offer = previous.get(msid, {}).get(offerid)
+                        if old_offer is not None:
+                            offers.setdefault(msid, dict())[offerid] = old_offer
+                            offered.add((msid, offerid))
+                            yield msid, offerid, old_offer
+                        continue
+                    self.logger.debug(f"Checking '{resource_name}' of type '{resource_type}' for ms '{msid}' with required instance count {instance_count_required}...")
+                    rstate = self.capacity["swarms"].get(swarmid, {}).get(msid, {}).get(resource_type, {}).get(resource_name)
+                    held = rstate["reserved"] if rstate is not None else 0
+                    target = targets[(msid, resource_type, resource_name)]
+                    if target is None and resource_type == "cloud" and raw_plan.get(msid, {}).get("flavour") not in (None, resource_name):
+                        continue
+                    if target is not None and target <= held:
+                        available_instances = target
                     else:
-                        offers.setdefault(msid,dict())
-                        offers[msid][offerid]=dict({
-                                    "ids": {
-                                        "offer_id": offerid,
-                                        "ra_id": self.ra_id,
-                                        "swarm_id": swarmid,
-                                        "ms_id": msid,
-                                        "provider_id": provider_id,
-                                        "res_type": resource_type,
-                                        "res_id": resource_name
-                                    },
-                                    "characteristics": characteristics,
-                                    "properties": reqs[msid].get("properties", {})})
-            if reqs[msid].get("colocated", []):
-                for col_node in reqs[msid]["colocated"]:
-                    offers[col_node]= dict({"colocated": msid})
+                        #increases are checked against the free capacity, also when planned
+                        needed = instance_count_required if target is None else target
+                        missing = needed - held
+                        available_instances = held + self.calculate_available_instances_of_resources(resource_type, resource_name, missing)
+                        if available_instances < needed and target is None and self.reservations is not None \
+                                and self._preempt_reservations(swarmid, resource_type, resource_name, missing):
+                            available_instances = held + self.calculate_available_instances_of_resources(resource_type, resource_name, missing)
+                    if available_instances < instance_count_required:
+                        if held > 0:
+                            self.resource_state_change(swarmid, msid, resource_type, resource_name, held, "reserved", "free")
+                        continue
+                    if available_instances > held:
+                        with self._storage_batch():
+                            self.resource_state_init_amount(swarmid, msid, resource_type, resource_name, "free", available_instances - held)
+                            self.resource_state_change(swarmid, msid, resource_type, resource_name, available_instances - held, "free", "reserved")
+                    if resource_type == "cloud" and msid in raw_plan and raw_plan[msid]["flavour"] is None:
+                        #only one flavour is offered per planned microservice
+                        raw_plan[msid] = dict(raw_plan[msid], flavour=resource_name, count=available_instances)
+                    offerid, offer = self._compose_offer(swarmid, msid, resource_type, resource_name, available_instances, reqs[msid].get("properties", {}))
+                    old_offer = previous.get(msid, {}).get(offerid)
+                    offers.setdefault(msid, dict())
+                    offered.add((msid, offerid))
+                    if old_offer == offer and available_instances == held:
+                        #unchanged offer keeps its object and id, nothing is stored or published
+                        offers[msid][offerid] = old_offer
+                        yield msid, offerid, old_offer
+                        continue
+                    offers[msid][offerid] = offer
+                    if self.storage is not None:
+                        self.storage.put_offer(swarmid, msid, offerid, offer)
+                    if self.change_feed.subscriptions:
+                        if old_offer is not None:
+                            self._publish_offer_change("offer_removed", swarmid, msid, offerid, old_offer)
+                            replaced.add((msid, offerid))
+                        self._publish_offer_change("offer_added", swarmid, msid, offerid, offer)
+                        added.add((msid, offerid))
+                    yield msid, offerid, offer
+                if reqs[msid].get("colocated", []):
+                    for col_node in reqs[msid]["colocated"]:
+                        for act_offerid in list(offers.get(col_node, {})):
+                            offered.discard((col_node, act_offerid))
+                            if (col_node, act_offerid) in added:
+                                self._publish_offer_change("offer_removed", swarmid, col_node, act_offerid, offers[col_node][act_offerid])
+                        offers[col_node]= dict({"colocated": msid})
+                        offered.add((col_node, "colocated"))
+                        if previous.get(col_node) == offers[col_node]:
+                            yield col_node, "colocated", msid
+                            continue
+                        if self.storage is not None:
+                            self.storage.delete_offers(swarmid, col_node)
+                            self.storage.put_offer(swarmid, col_node, "colocated", msid)
+                        if self.change_feed.subscriptions:
+                            self._publish_offer_change("offer_added", swarmid, col_node, "colocated", msid)
+                        yield col_node, "colocated", msid
+        finally:
+            #drop previous offers that were not offered again, and reservations no offer stands for any more;
+            #also when the consumer stops early, so no microservice is left with a reservation but no offer
+            with self._storage_batch():
+                for msid, ms_offers in previous.items():
+                    for offerid, offer in ms_offers.items():
+                        if (msid, offerid) not in offered:
+                            if self.storage is not None:
+                                self.storage.delete_offers(swarmid, msid, offerid)
+                            if self.change_feed.subscriptions and (msid, offerid) not in replaced:
+                                self._publish_offer_change("offer_removed", swarmid, msid, offerid, offer)
+                kept = set()
+                for msid, ms_offers in offers.items():
+                    for offerid, offer in ms_offers.items():
+                        first = offer[0] if isinstance(offer, list) else offer
+                        if isinstance(first, dict):
+                            kept.add((msid, first["ids"]["res_type"], first["ids"]["res_id"]))
+                for msid, ms in self.capacity["swarms"].get(swarmid, {}).items():
+                    for restype, resources in ms.items():
+                        for resid, rstate in resources.items():
+                            if rstate["reserved"] > 0 and (msid, restype, resid) not in kept:
+                                self.resource_state_change(swarmid, msid, restype, resid, rstate["reserved"], "reserved", "free")
         self.logger.debug(f"Generating offer for swarm '{swarmid}' with requirements from '{sat_filename}' finished.")
-        self.capacity["offers"]=dict()
-        self.capacity["offers"][swarmid]=offers
-        return offers
-    
+
+    def _compose_offer(self, swarmid: str, msid: str, resource_type: str, resource_name: str, count: int, properties: dict):
+        """Returns the offer id and the offer payload for count instances of a resource:
+        one dict, or a list of per-instance dicts when count > 1.
+        """
+        #query provider information for the flavor
+        flavor_or_edge = "flavours" if resource_type == "cloud" else "capacities"
+        provider_id = self.capacity[resource_type][flavor_or_edge][resource_name]["resource.provider"]
+        #query characteristics for the flavor
+        characteristic_names = ["pricing.cost",
+                                "energy.consumption",
+                                "host.bandwidth"]
+        characteristics = dict()
+        for characteristic_name in characteristic_names:
+            characteristics[characteristic_name] = self.capacity[resource_type][flavor_or_edge][resource_name].get(characteristic_name, None)
+        #compose offer
+        offerid = self.ra_id + "_" + swarmid + "_" + msid + "_" + resource_name
+        def instance(instance_offerid):
+            return dict({
+                    "ids": {
+                        "offer_id": instance_offerid,
+                        "ra_id": self.ra_id,
+                        "swarm_id": swarmid,
+                        "ms_id": msid,
+                        "provider_id": provider_id,
+                        "res_type": resource_type,
+                        "res_id": resource_name
+                    },
+                    "characteristics": characteristics,
+                    "properties": properties})
+        if count > 1:
+            return offerid, [instance(offerid+"_"+str(instance_index)) for instance_index in range(count)]
+        return offerid, instance(offerid)
+
     def resource_offer_query_all(self, swarmid: str):
+        import copy
         return copy.deepcopy(self.capacity.get("offers", {}).get(swarmid, {}))
 
+    def resource_offer_query_all_as_ndjson(self, swarmid: str, fp) -> int:
+        """Streams the offers of a swarm to fp, one [msid, offerid] record per line,
+        or an empty [msid] record for a microservice without offers.
+        """
+        swarm_offers = self.capacity.get("offers", {}).get(swarmid, {})
+        def records():
+            for msid, ms_offers in swarm_offers.items():
+                if not ms_offers:
+                    yield [msid], dict()
+                for offerid, offer in ms_offers.items():
+                    yield [msid, offerid], offer
+        return ndjson.write_records(records(), fp)
+
     def resource_offer_accept(self, offerid: str, offer: list | dict):
         if offerid == "colocated":
             self.logger.warning(f"Offerid '{offerid}' is a colocation, skipping state change.")
             return True
-        offers = list([offer]) if isinstance(offer, dict) else offer
-        for offer in offers:
-            swarmid = offer["ids"]["swarm_id"]
-            msid = offer["ids"]["ms_id"]
-            resid = offer["ids"]["res_id"]
-            restype = offer["ids"]["res_type"]
-            # Change state of resource from reserved to assigned
-            if self.resource_state_change(swarmid, msid, restype, resid, 1, "reserved", "assigned"):
-                self.logger.debug(f"Accepting offer '{offerid}' for swarm '{swarmid}' succeeded.")
-            else:
-                self.logger.error(f"Failed to change state for resource in offer '{offerid}' for swarm '{swarmid}'")
-                return False
-        return True
+        with self._storage_batch():
+            offers = list([offer]) if isinstance(offer, dict) else offer
+            for offer in offers:
+                swarmid = offer["ids"]["swarm_id"]
+                msid = offer["ids"]["ms_id"]
+                resid = offer["ids"]["res_id"]
+                restype = offer["ids"]["res_type"]
+                # Change state of resource from reserved to assigned
+                if self.resource_state_change(swarmid, msid, restype, resid, 1, "reserved", "assigned"):
+                    self.logger.debug(f"Accepting offer '{offerid}' for swarm '{swarmid}' succeeded.")
+                else:
+                    self.logger.error(f"Failed to change state for resource in offer '{offerid}' for swarm '{swarmid}'")
+                    return False
+            return True
 
     def resource_offer_reject(self, offerid: str, offer: list | dict):
         if offerid == "colocated":
             self.logger.warning(f"Offerid '{offerid}' is a colocation, skipping state change.")
             return True
-        offers = list([offer]) if isinstance(offer, dict) else offer
-        for offer in offers:
-            swarmid = offer["ids"]["swarm_id"]
-            msid = offer["ids"]["ms_id"]
-            resid = offer["ids"]["res_id"]
-            restype = offer["ids"]["res_type"]
-            # Change state of resource from reserved to free
-            if self.resource_state_change(swarmid, msid, restype, resid, 1, "reserved", "free"):
-                del self.capacity["offers"][swarmid][msid][offerid]
-                self.logger.debug(f"Rejecting offer '{offerid}' for swarm '{swarmid}' succeeded.")
-            else:
-                self.logger.error(f"Rejecting offer '{offerid}' for swarm '{swarmid}' failed.")
-                return False
+        with self._storage_batch():
+            offers = list([offer]) if isinstance(offer, dict) else offer
+            for offer in offers:
+                swarmid = offer["ids"]["swarm_id"]
+                msid = offer["ids"]["ms_id"]
+                resid = offer["ids"]["res_id"]
+                restype = offer["ids"]["res_type"]
+                # Change state of resource from reserved to free
+                if not self.resource_state_change(swarmid, msid, restype, resid, 1, "reserved", "free"):
+                    self.logger.error(f"Rejecting offer '{offerid}' for swarm '{swarmid}' failed.")
+                    return False
+            # a list offer is removed once, after all of its instances are released
+            removed = self.capacity["offers"].get(swarmid, {}).get(msid, {}).pop(offerid, None)
+            if removed is not None:
+                if self.storage is not None:
+                    self.storage.delete_offers(swarmid, msid, offerid)
+                if self.change_feed.subscriptions:
+                    self._publish_offer_change("offer_removed", swarmid, msid, offerid, removed)
+        self.logger.debug(f"Rejecting offer '{offerid}' for swarm '{swarmid}' succeeded.")
         return True
 
     def resources_and_offers_destroy_all(self, swarmid: str):
-        swarm = self.capacity["swarms"].get(swarmid, {})
-        for msid, ms in swarm.items():
-            for restype, resources in ms.items():
-                for resid, rstate in resources.items():
-                    for state, count in rstate.items():
-                        if count > 0:
-                            self.logger.debug(f"Releasing resource: '{swarmid}', '{msid}', '{restype}', '{resid}', '{state}': {count}")
-                            self.resource_state_change(swarmid, msid, restype, resid, count, state, "free")
-        del self.capacity["offers"][swarmid]
-        del self.capacity["swarms"][swarmid]
+        with self._storage_batch():
+            swarm = self.capacity["swarms"].get(swarmid, {})
+            for msid, ms in swarm.items():
+                for restype, resources in ms.items():
+                    for resid, rstate in resources.items():
+                        for state, count in rstate.items():
+                            if count > 0:
+                                self.logger.debug(f"Releasing resource: '{swarmid}', '{msid}', '{restype}', '{resid}', '{state}': {count}")
+                                self.resource_state_change(swarmid, msid, restype, resid, count, state, "free")
+            if self.change_feed.subscriptions:
+                for msid, ms_offers in self.capacity["offers"].get(swarmid, {}).items():
+                    for offerid, offer in ms_offers.items():
+                        self._publish_offer_change("offer_removed", swarmid, msid, offerid, offer)
+            self.capacity["offers"].pop(swarmid, None)
+            self.capacity["swarms"].pop(swarmid, None)
+            if self.storage is not None:
+                self.storage.delete_offers(swarmid)
+                self.storage.delete_resources(swarmid)
+        if self.ledger is not None:
+            self.ledger.drop_swarm(swarmid)
+        if self.change_feed.subscriptions:
+            self.change_feed.publish("swarm_removed", swarm=swarmid)
         return True
 
     def save_capacity_registry_as_yaml(self):
         #Returning capacity registry information in YAML format
-        return yaml.dump(self.capacity, default_flow_style=False)
+        return _yaml_dump(self.capacity)
 
     def load_capacity_registry_from_yaml(self, yaml_str):
         #Loading capacity registry information from YAML format
+        import yaml
         self.capacity = yaml.safe_load(yaml_str)
+        self.catalog = None
+        if self.storage is not None:
+            self.storage.save_capacity(self.capacity)
+        self._rebuild_mirrors()
+        if self.change_feed.subscriptions:
+            self.change_feed.publish("reset")
+        return
+
+    def initialize_from_storage(self) -> bool:
+        """Rebuilds the registry state from its storage, e.g. after a restart.
+        Returns False if there is no storage or it holds no state.
+        The whole state is loaded into memory at once; it is not loaded lazily.
+        """
+        capacity = self.storage.load_capacity() if self.storage is not None else None
+        if capacity is None:
+            return False
+        self.capacity = capacity
+        self.catalog = None
+        self._rebuild_mirrors()
+        if self.change_feed.subscriptions:
+            self.change_feed.publish("reset")
+        return True
+
+    def save_capacity_registry_as_ndjson(self, fp) -> int:
+        #Streaming capacity registry information to fp, one innermost dict per line
+        return ndjson.write_records(ndjson.iter_leaf_records(self.capacity), fp)
+
+    def load_capacity_registry_from_ndjson(self, fp):
+        #Loading capacity registry information record by record from fp
+        self.capacity = ndjson.load_records(ndjson.read_records(fp))
+        self.catalog = None
+        if self.storage is not None:
+            self.storage.save_capacity(self.capacity)
+        self._rebuild_mirrors()
+        if self.change_feed.subscriptions:
+            self.change_feed.publish("reset")
         return
 
     def dump_capacity_registry_info(self):
@@ -0,0 +1,53 @@
+"""
+Parsed provider catalog shared by many registries.
+
+A SharedCatalog parses the cloud flavours and edge instances of a capacity once into
+compact CatalogRecords on one interned key schema (or into interned dicts with
+compact=False), and caches which resources match a requirement expression.
+Registries initialized with the catalog point at its dicts, which must be treated as
+read-only; each registry keeps its own counters, swarms and offers.
+"""
+import sys
+import threading
+from .res_cap import ResCap
+from .app_req import AppReq
+
+
+class SharedCatalog:
+
+    def __init__(self, init_capacity: dict, compact: bool = True):
+        self.init_capacity = init_capacity
+        rescap = ResCap()
+        parse = rescap.parse_compact if compact else (lambda data: self._intern(rescap.parse(data)))
+        self.cloud_flavours = dict()
+        for act_flavor, act_flavor_data in init_capacity.get("cloud_flavours", {}).items():
+            self.cloud_flavours[sys.intern(act_flavor)] = parse(act_flavor_data)
+        self.edge_capacities = dict()
+        for act_instance, act_instance_data in init_capacity.get("edge_instances", {}).items():
+            self.edge_capacities[sys.intern(act_instance)] = parse(act_instance_data)
+        self.match_index = dict()
+        self.lock = threading.Lock()
+
+    def _intern(self, flat: dict) -> dict:
+        return dict((sys.intern(key), sys.intern(value) if isinstance(value, str) else value) for key, value in flat.items())
+
+    def match(self, expression: str) -> list:
+        """
+        Returns the resources matching a requirement expression as [{"cloud"|"edge": <name>}, ...].
+        Every distinct expression is evaluated against the catalog once.
+        """
+        matches = self.match_index.get(expression)
+        if matches is None:
+            app_req = AppReq()
+            found = []
+            for restype, resources in (("cloud", self.cloud_flavours), ("edge", self.edge_capacities)):
+                for name, data in resources.items():
+                    try:
+                        if app_req.eval_app_req_with_vars(expression, [data])[0] == True:
+                            found.append((restype, name))
+                    except Exception:
+                        pass
+            matches = tuple(found)
+            with self.lock:
+                self.match_index[expression] = matches
+        return [{restype: name} for restype, name in matches]
@@ -0,0 +1,66 @@
+"""
+Parse-time and memory benchmark of dict vs compact (CatalogRecord) catalog entries.
+
+    python -m swch_capreg.catalog_bench --entries 50000
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from .res_cap import ResCap
+
+
+def synthetic_entry(index: int) -> dict:
+    """
+    Returns a flavour shaped like the capabilities of the sample CDTs in tests/.
+    """
+    return {
+        "host": {"num-cpus": 1 + index % 32, "mem-size": 1 + index % 64, "disk-size": 10 * (1 + index % 8), "bandwidth": 1000},
+        "os": {"type": "linux", "version": "22.04", "distribution": "ubuntu"},
+        "resource": {"provider": f"Provider-{index % 20}", "capacity-provider": f"Provider-{index % 20}", "type": "cloud"},
+        "network": {"ipv4_enabled": False, "ipv6_enabled": False, "type": "ethernet"},
+        "pricing": {"cost": round(0.01 * (index % 50), 2)},
+        "locality": {"continent": "Europe", "country": "Hungary", "city": "Budapest"},
+        "energy": {"powered-type": "mains-powered", "energy-type": "non-green", "consumption": 0.10},
+    }
+
+def _parse_all(entries: list, compact: bool) -> dict:
+    rescap = ResCap()
+    parse = rescap.parse_compact if compact else rescap.parse
+    return dict((f"flavour-{index}", parse(entry)) for index, entry in enumerate(entries))
+
+def measure(entries: list, compact: bool) -> dict:
+    """
+    Times parsing without tracing, then parses again under tracemalloc for the retained size.
+    """
+    gc.collect()
+    started = time.perf_counter()
+    catalog = _parse_all(entries, compact)
+    elapsed = time.perf_counter() - started
+    del catalog
+    gc.collect()
+    tracemalloc.start()
+    catalog = _parse_all(entries, compact)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del catalog
+    return {"parse_seconds": elapsed, "memory_bytes": memory, "bytes_per_entry": memory / max(len(entries), 1)}
+
+def run(entries: int = 50000) -> dict:
+    data = [synthetic_entry(index) for index in range(entries)]
+    report = {"entries": entries, "dict": measure(data, False), "compact": measure(data, True)}
+    report["memory_saving"] = 1 - report["compact"]["memory_bytes"] / report["dict"]["memory_bytes"]
+    report["parse_speedup"] = report["dict"]["parse_seconds"] / report["compact"]["parse_seconds"]
+    return report
+
+def main(argv: list | None = None):
+    parser = argparse.ArgumentParser(description="Compare dict and compact catalog records.")
+    parser.add_argument("--entries", type=int, default=50000)
+    options = parser.parse_args(argv)
+    report = run(options.entries)
+    print(json.dumps(report, indent=2))
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Change feed of registry deltas.
+
+Events are small dicts:
+    {"seq": <int>, "event": "state" | "init_amount" | "offer_added" | "offer_removed" | "swarm_removed" | "reset",
+     "swarm": <swarmid>, "ms": <msid>, "type": <restype>, "resource": <resid>,
+     "from": <state>, "to": <state>, "count": <int>, "offer": <offerid>}
+Fields not relevant to an event are None. "init_amount" sets the "to" counter of a
+swarm resource to count instead of moving count between states. "swarm_removed" follows the releases
+and offer removals of resources_and_offers_destroy_all, after which the swarm holds nothing. "reset" is published when the whole
+registry is replaced (initialize/load), after which mirrors have to resync.
+Sequence numbers are consecutive per registry, so a gap tells a subscriber that
+events were dropped.
+"""
+import queue
+import threading
+
+
+class ChangeSubscription:
+    """
+    Bounded queue of change events for one subscriber.
+    When the queue is full the publisher waits up to block_timeout seconds (None waits
+    forever, 0 never waits); events that still do not fit are dropped and counted.
+    By default a slow subscriber never holds up the registry.
+    """
+    def __init__(self, maxsize: int = 1024, block_timeout: float | None = 0):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, event: dict) -> bool:
+        try:
+            if self.block_timeout == 0:
+                self.queue.put_nowait(event)
+            else:
+                self.queue.put(event, timeout=self.block_timeout)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def get(self, timeout: float | None = None) -> dict | None:
+        """
+        Returns the next event, or None if none arrived within timeout.
+        """
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def drain(self) -> list:
+        """
+        Returns all queued events without waiting.
+        """
+        events = []
+        while True:
+            try:
+                events.append(self.queue.get_nowait())
+            except queue.Empty:
+                return events
+
+    def close(self):
+        self.closed = True
+
+    def __iter__(self):
+        while not self.closed:
+            event = self.get(timeout=0.1)
+            if event is not None:
+                yield event
+        yield from self.drain()
+
+class ChangeFeed:
+    """
+    Publishes change events to registered subscriptions.
+    """
+    FIELDS = ("swarm", "ms", "type", "resource", "from", "to", "count", "offer")
+
+    def __init__(self):
+        self.subscriptions = []
+        self.seq = 0
+        self.lock = threading.Lock()
+
+    def subscribe(self, maxsize: int = 1024, block_timeout: float | None = 0) -> ChangeSubscription:
+        subscription = ChangeSubscription(maxsize, block_timeout)
+        with self.lock:
+            self.subscriptions = self.subscriptions + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription: ChangeSubscription):
+        subscription.close()
+        with self.lock:
+            self.subscriptions = [s for s in self.subscriptions if s is not subscription]
+
+    def publish(self, event: str, **fields) -> int:
+        """
+        Sends one event to every subscription and returns its sequence number.
+        """
+        with self.lock:
+            self.seq += 1
+            record = dict((name, fields.get(name)) for name in self.FIELDS)
+            record["seq"] = self.seq
+            record["event"] = event
+            subscriptions = self.subscriptions
+        for subscription in subscriptions:
+            subscription.put(record)
+        return record["seq"]
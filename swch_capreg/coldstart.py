@@ -0,0 +1,67 @@
+"""
+Cold-start benchmark: import time and time-to-first-offer in fresh interpreters.
+
+Every sample runs in a new Python process, so module import, Sardou parsing (or the
+pre-parsed capacity cache) and the first offer generation are measured as a
+short-lived CLI or serverless invocation would see them.
+
+    python -m swch_capreg.coldstart --capacity tests/sztaki-capacity-raw.yaml --sat tests/BookInfo.yaml --repeat 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+
+_SAMPLE = r"""
+import json, logging, sys, time
+started = time.perf_counter()
+import swch_capreg
+imported = time.perf_counter()
+capreg = swch_capreg.SwChCapacityRegistry("ra-coldstart")
+logging.getLogger().setLevel(logging.WARNING)
+timings = {"import": imported - started}
+capacity, sat, cache_dir = sys.argv[1], sys.argv[2], sys.argv[3] or None
+if capacity:
+    capreg.initialize_capacity_from_file(capacity, cache_dir=cache_dir)
+    initialized = time.perf_counter()
+    timings["initialize"] = initialized - imported
+    if sat:
+        capreg.resource_offer_generate_from_SAT_file("swarm1", sat)
+        timings["first_offer"] = time.perf_counter() - initialized
+timings["total"] = time.perf_counter() - started
+print(json.dumps(timings))
+"""
+
+def sample(capacity: str | None, sat: str | None, cache_dir: str | None) -> dict:
+    completed = subprocess.run([sys.executable, "-c", _SAMPLE, capacity or "", sat or "", cache_dir or ""],
+                               capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def run(capacity: str | None, sat: str | None, repeat: int = 5) -> dict:
+    """
+    Returns median timings (seconds) of `repeat` cold starts, without and with the capacity cache.
+    """
+    def medians(samples):
+        return dict((key, statistics.median(s[key] for s in samples)) for key in samples[0])
+
+    report = {"uncached": medians([sample(capacity, sat, None) for _ in range(repeat)])}
+    if capacity:
+        with tempfile.TemporaryDirectory(prefix="swch_capcache_") as cache_dir:
+            sample(capacity, sat, cache_dir)
+            report["cached"] = medians([sample(capacity, sat, cache_dir) for _ in range(repeat)])
+    return report
+
+def main(argv: list | None = None):
+    parser = argparse.ArgumentParser(description="Measure import time and time-to-first-offer.")
+    parser.add_argument("--capacity", help="capacity file (CDT)")
+    parser.add_argument("--sat", help="SAT file for the first offer")
+    parser.add_argument("--repeat", type=int, default=5)
+    options = parser.parse_args(argv)
+    report = run(options.capacity, options.sat, options.repeat)
+    print(json.dumps(report, indent=2))
+    return report
+
+if __name__ == "__main__":
+    main()
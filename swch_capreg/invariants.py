@@ -0,0 +1,147 @@
+"""
+Invariant verification of registry counters.
+
+For every flavour (flavour mode), raw property (raw mode) and edge instance:
+    init == free + reserved + assigned + allocated, and no counter is negative
+    reserved/assigned/allocated == the sum held by all swarms (rstate), where in raw
+    mode a swarm holding n units of a flavour holds n times its demand of each property
+The InvariantChecker keeps running totals of the swarm holdings, so after a state change
+only the counters of the touched resource are checked (O(1) per transition); audit()
+recomputes everything from the capacity dict.
+"""
+
+STATES = ["free", "reserved", "assigned", "allocated"]
+HELD_STATES = ["reserved", "assigned", "allocated"]
+
+
+class InvariantChecker:
+
+    def __init__(self, capacity: dict, props: list):
+        self.capacity = capacity
+        self.props = list(props)
+        # (restype, resid) -> (scope, per-unit amounts); the catalog does not change after initialization
+        self.deltas = dict()
+        self.held = self._held_totals()
+
+    def _scope_deltas(self, restype: str, resid: str):
+        #same scope and per-unit amounts as SwChCapacityRegistry._global_counter_deltas
+        cached = self.deltas.get((restype, resid))
+        if cached is None:
+            if restype == "cloud":
+                cloud_type = self.capacity["cloud"]["type"]
+                if cloud_type == "raw":
+                    flavour = self.capacity["cloud"]["flavours"][resid]
+                    cached = "raw", dict((prop, flavour.get(prop, 0)) for prop in self.props if flavour.get(prop, 0))
+                else:
+                    cached = cloud_type, {resid: 1}
+            else:
+                cached = "edge", {resid: 1}
+            self.deltas[(restype, resid)] = cached
+        return cached
+
+    def _section(self, scope: str) -> dict:
+        return self.capacity["edge"]["instances"] if scope == "edge" else self.capacity["cloud"][scope]
+
+    def _held_totals(self) -> dict:
+        held = dict()
+        for swarm in self.capacity.get("swarms", {}).values():
+            for ms in swarm.values():
+                for restype, resources in ms.items():
+                    for resid, rstate in resources.items():
+                        scope, deltas = self._scope_deltas(restype, resid)
+                        for key, unit in deltas.items():
+                            totals = held.setdefault((scope, key), dict.fromkeys(HELD_STATES, 0))
+                            for state in HELD_STATES:
+                                totals[state] += unit * rstate.get(state, 0)
+        return held
+
+    def on_init_amount(self, restype: str, resid: str, state: str, old_amount: int, amount: int):
+        if state not in HELD_STATES:
+            return
+        scope, deltas = self._scope_deltas(restype, resid)
+        for key, unit in deltas.items():
+            self.held.setdefault((scope, key), dict.fromkeys(HELD_STATES, 0))[state] += unit * (amount - old_amount)
+
+    def on_state_change(self, restype: str, resid: str, count: int, from_state: str, to_state: str) -> list:
+        """
+        Updates the running totals for one transition and returns the violations of the touched counters.
+        """
+        scope, deltas = self._scope_deltas(restype, resid)
+        violations = []
+        section = self._section(scope)
+        for key, unit in deltas.items():
+            totals = self.held.setdefault((scope, key), dict.fromkeys(HELD_STATES, 0))
+            if from_state in HELD_STATES:
+                totals[from_state] -= unit * count
+            if to_state in HELD_STATES:
+                totals[to_state] += unit * count
+            violations.extend(self._check(scope, key, section, totals))
+        return violations
+
+    def preview_state_changes(self, changes: list, from_state: str, to_state: str) -> list:
+        """
+        Returns the violations that moving [(restype, resid, count), ...] from from_state to to_state
+        would cause, without changing the counters or the running totals.
+        """
+        moved = dict()
+        for restype, resid, count in changes:
+            scope, deltas = self._scope_deltas(restype, resid)
+            for key, unit in deltas.items():
+                moved[(scope, key)] = moved.get((scope, key), 0) + unit * count
+        violations = []
+        for (scope, key), amount in moved.items():
+            totals = dict(self.held.get((scope, key), dict.fromkeys(HELD_STATES, 0)))
+            if from_state in HELD_STATES:
+                totals[from_state] -= amount
+            if to_state in HELD_STATES:
+                totals[to_state] += amount
+            violations.extend(self._check(scope, key, self._section(scope), totals, (from_state, to_state, amount)))
+        return violations
+
+    def _check(self, scope: str, key: str, section: dict, totals: dict | None, moved: tuple | None = None) -> list:
+        counters = dict((state, section[state].get(key, 0)) for state in STATES)
+        if moved is not None:
+            from_state, to_state, amount = moved
+            counters[from_state] -= amount
+            counters[to_state] += amount
+        free, reserved, assigned, allocated = (counters[state] for state in STATES)
+        init = section["init"].get(key, 0)
+        held = totals if totals is not None else dict.fromkeys(HELD_STATES, 0)
+        if (free >= 0 and reserved >= 0 and assigned >= 0 and allocated >= 0 and free + reserved + assigned + allocated == init
+                and held["reserved"] == reserved and held["assigned"] == assigned and held["allocated"] == allocated):
+            return []
+        violations = []
+        for state, value in zip(STATES, (free, reserved, assigned, allocated)):
+            if value < 0:
+                violations.append(f"{scope} '{key}': {state} is negative ({value})")
+        if free + reserved + assigned + allocated != init:
+            violations.append(f"{scope} '{key}': free + reserved + assigned + allocated = {free + reserved + assigned + allocated}, init = {init}")
+        for state, value in zip(HELD_STATES, (reserved, assigned, allocated)):
+            if held[state] != value:
+                violations.append(f"{scope} '{key}': swarms hold {held[state]} {state}, global counter is {value}")
+        return violations
+
+    def audit(self) -> list:
+        """
+        Checks every counter against freshly computed swarm totals and resyncs the running totals.
+        """
+        violations = []
+        self.held = self._held_totals()
+        scopes = []
+        if "cloud" in self.capacity:
+            scopes.append(self.capacity["cloud"]["type"])
+        if "edge" in self.capacity:
+            scopes.append("edge")
+        for scope in scopes:
+            section = self._section(scope)
+            keys = self.props if scope == "raw" else section.get("init", {}).keys()
+            for key in keys:
+                violations.extend(self._check(scope, key, section, self.held.get((scope, key))))
+        for swarmid, swarm in self.capacity.get("swarms", {}).items():
+            for msid, ms in swarm.items():
+                for restype, resources in ms.items():
+                    for resid, rstate in resources.items():
+                        for state, value in rstate.items():
+                            if value < 0:
+                                violations.append(f"swarm '{swarmid}', ms '{msid}', {restype} '{resid}': {state} is negative ({value})")
+        return violations
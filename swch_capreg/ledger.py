@@ -0,0 +1,211 @@
+"""
+NumPy-backed reservation ledger.
+
+The ledger keeps the state counters of a registry as int64 matrices:
+    counts    resources x states       cloud flavours (flavour mode) and edge instances
+    raw       raw properties x states  raw cloud pool (raw mode)
+    holdings  swarm holdings x states  per-swarm/ms/resource counters (rstate)
+with (restype, resid) and (swarmid, msid, restype, resid) mapped to row indices.
+The ledger is an opt-in mirror: the registry's `capacity` dict stays authoritative and
+availability is checked there. Single and bulk transitions and utilisation summaries are
+vector operations; dict views in the layout of `capacity` are only built by views().
+Requires the optional `numpy` dependency (pip install swchcapreg[ledger]).
+"""
+import numpy as np
+
+STATES = ["free", "reserved", "assigned", "allocated", "init"]
+STATE_INDEX = dict((state, index) for index, state in enumerate(STATES))
+HOLDING_STATES = STATES[:4]
+
+
+class ReservationLedger:
+
+    def __init__(self, props: list):
+        self.props = list(props)
+        self.cloud_type = None
+        self.rows = dict()
+        self.row_ids = []
+        self.counts = np.zeros((0, len(STATES)), dtype=np.int64)
+        self.raw = np.zeros((len(self.props), len(STATES)), dtype=np.int64)
+        self.flavour_rows = dict()
+        self.demand = np.zeros((0, len(self.props)), dtype=np.int64)
+        self.holding_rows = dict()
+        self.holding_ids = []
+        self.holdings = np.zeros((16, len(HOLDING_STATES)), dtype=np.int64)
+
+    @classmethod
+    def from_capacity(cls, capacity: dict, props: list):
+        """
+        Builds a ledger from the counters of a registry capacity dict.
+        """
+        ledger = cls(props)
+        counts = []
+        if "cloud" in capacity:
+            ledger.cloud_type = capacity["cloud"]["type"]
+            flavours = capacity["cloud"]["flavours"]
+            ledger.flavour_rows = dict((name, index) for index, name in enumerate(flavours))
+            ledger.demand = np.array([[data.get(prop, 0) for prop in ledger.props] for data in flavours.values()],
+                                     dtype=np.int64).reshape(len(flavours), len(ledger.props))
+            section = capacity["cloud"][ledger.cloud_type]
+            if ledger.cloud_type == "flavour":
+                for name in section["init"]:
+                    ledger.rows[("cloud", name)] = len(ledger.row_ids)
+                    ledger.row_ids.append(("cloud", name))
+                    counts.append([section.get(state, {}).get(name, 0) for state in STATES])
+            else:
+                ledger.raw = np.array([[section.get(state, {}).get(prop, 0) for state in STATES] for prop in ledger.props],
+                                      dtype=np.int64).reshape(len(ledger.props), len(STATES))
+        if "edge" in capacity:
+            section = capacity["edge"]["instances"]
+            for name in capacity["edge"]["capacities"]:
+                ledger.rows[("edge", name)] = len(ledger.row_ids)
+                ledger.row_ids.append(("edge", name))
+                counts.append([section.get(state, {}).get(name, 0) for state in STATES])
+        ledger.counts = np.array(counts, dtype=np.int64).reshape(len(counts), len(STATES))
+        for swarmid, swarm in capacity.get("swarms", {}).items():
+            for msid, ms in swarm.items():
+                for restype, resources in ms.items():
+                    for resid, rstate in resources.items():
+                        row = ledger._holding_row(swarmid, msid, restype, resid)
+                        ledger.holdings[row] = [rstate.get(state, 0) for state in HOLDING_STATES]
+        return ledger
+
+    def _holding_row(self, swarmid: str, msid: str, restype: str, resid: str) -> int:
+        key = (swarmid, msid, restype, resid)
+        row = self.holding_rows.get(key)
+        if row is None:
+            row = len(self.holding_ids)
+            if row == len(self.holdings):
+                self.holdings = np.concatenate([self.holdings, np.zeros_like(self.holdings)])
+            self.holding_rows[key] = row
+            self.holding_ids.append(key)
+        return row
+
+    def _global_delta(self, restype: str, resid: str):
+        """
+        Returns (matrix, row or rows, units) of the global counters touched by one unit of a resource.
+        """
+        if restype == "cloud" and self.cloud_type == "raw":
+            return self.raw, slice(None), self.demand[self.flavour_rows[resid]]
+        return self.counts, self.rows[(restype, resid)], 1
+
+    def drop_swarm(self, swarmid: str):
+        """
+        Forgets the holdings of a swarm; their rows stay allocated but are no longer reported.
+        """
+        for key in [key for key in self.holding_rows if key[0] == swarmid]:
+            row = self.holding_rows.pop(key)
+            self.holdings[row] = 0
+            self.holding_ids[row] = None
+
+    def set_holding(self, swarmid: str, msid: str, restype: str, resid: str, state: str, amount: int):
+        self.holdings[self._holding_row(swarmid, msid, restype, resid), STATE_INDEX[state]] = amount
+
+    def transition(self, swarmid: str, msid: str, restype: str, resid: str, count: int, from_state: str, to_state: str):
+        """
+        Moves count from from_state to to_state; returns count, or None if the holding is short.
+        Like the registry, moving to "free" releases the holding without counting it as free.
+        """
+        row = self._holding_row(swarmid, msid, restype, resid)
+        source, target = STATE_INDEX[from_state], STATE_INDEX[to_state]
+        if self.holdings[row, source] < count:
+            return None
+        self.holdings[row, source] -= count
+        if to_state != "free":
+            self.holdings[row, target] += count
+        matrix, index, units = self._global_delta(restype, resid)
+        matrix[index, source] -= units * count
+        matrix[index, target] += units * count
+        return count
+
+    def transition_bulk(self, changes: list, from_state: str, to_state: str) -> bool:
+        """
+        Applies [(swarmid, msid, restype, resid, count), ...] all-or-nothing.
+        Returns False without changing anything if any holding is short.
+        """
+        if not changes:
+            return True
+        source, target = STATE_INDEX[from_state], STATE_INDEX[to_state]
+        rows = np.array([self._holding_row(*change[:4]) for change in changes], dtype=np.int64)
+        amounts = np.array([change[4] for change in changes], dtype=np.int64)
+        needed = np.zeros(len(self.holding_ids), dtype=np.int64)
+        np.add.at(needed, rows, amounts)
+        if np.any(self.holdings[:len(needed), source] < needed):
+            return False
+        np.subtract.at(self.holdings[:, source], rows, amounts)
+        if to_state != "free":
+            np.add.at(self.holdings[:, target], rows, amounts)
+
+        resource_rows, resource_amounts, raw_amounts = [], [], np.zeros(len(self.props), dtype=np.int64)
+        for (swarmid, msid, restype, resid, count) in changes:
+            if restype == "cloud" and self.cloud_type == "raw":
+                raw_amounts += self.demand[self.flavour_rows[resid]] * count
+            else:
+                resource_rows.append(self.rows[(restype, resid)])
+                resource_amounts.append(count)
+        if resource_rows:
+            np.subtract.at(self.counts[:, source], resource_rows, resource_amounts)
+            np.add.at(self.counts[:, target], resource_rows, resource_amounts)
+        self.raw[:, source] -= raw_amounts
+        self.raw[:, target] += raw_amounts
+        return True
+
+    def adjust_capacity(self, restype: str, key: str, delta: int) -> bool:
+        """
+        Adds delta to the init and free counters of a flavour, raw property or edge instance.
+        Returns False without changing anything if the ledger has no row for it.
+        """
+        if restype == "cloud" and self.cloud_type == "raw":
+            if key not in self.props:
+                return False
+            matrix, row = self.raw, self.props.index(key)
+        elif (restype, key) in self.rows:
+            matrix, row = self.counts, self.rows[(restype, key)]
+        else:
+            return False
+        matrix[row, STATE_INDEX["init"]] += delta
+        matrix[row, STATE_INDEX["free"]] += delta
+        return True
+
+    def utilisation(self) -> dict:
+        """
+        Returns per-state totals and the share of init that is not free, for resources and raw properties.
+        """
+        summary = dict()
+        for restype in ("cloud", "edge"):
+            rows = [row for (act_type, _), row in self.rows.items() if act_type == restype]
+            if rows:
+                totals = self.counts[rows].sum(axis=0)
+                summary[restype] = dict(zip(STATES, totals.tolist()))
+                summary[restype]["used_ratio"] = float(1 - totals[0] / totals[4]) if totals[4] else 0.0
+        if self.cloud_type == "raw":
+            summary["raw"] = dict()
+            for prop, values in zip(self.props, self.raw):
+                summary["raw"][prop] = dict(zip(STATES, values.tolist()))
+                summary["raw"][prop]["used_ratio"] = float(1 - values[0] / values[4]) if values[4] else 0.0
+        return summary
+
+    def views(self) -> dict:
+        """
+        Builds dict views of the counters in the layout of the registry capacity dict.
+        """
+        views = {"swarms": dict()}
+        if self.cloud_type is not None:
+            if self.cloud_type == "raw":
+                section = dict((state, dict(zip(self.props, self.raw[:, index].tolist()))) for index, state in enumerate(STATES))
+            else:
+                section = self._resource_view("cloud")
+            views["cloud"] = {self.cloud_type: section}
+        if any(act_type == "edge" for act_type, _ in self.row_ids):
+            views["edge"] = {"instances": self._resource_view("edge")}
+        for key, values in zip(self.holding_ids, self.holdings.tolist()):
+            if key is None:
+                continue
+            swarmid, msid, restype, resid = key
+            resources = views["swarms"].setdefault(swarmid, dict()).setdefault(msid, dict()).setdefault(restype, dict())
+            resources[resid] = dict(zip(HOLDING_STATES, values))
+        return views
+
+    def _resource_view(self, restype: str) -> dict:
+        rows = [(name, row) for (act_type, name), row in self.rows.items() if act_type == restype]
+        return dict((state, dict((name, int(self.counts[row, index])) for name, row in rows)) for index, state in enumerate(STATES))
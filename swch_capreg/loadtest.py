@@ -0,0 +1,121 @@
+"""
+Load test for the local capacity registry HTTP service.
+
+Runs keep-alive clients against a running server (--host/--port), or against a server
+started in a background thread for a capacity file (--capacity), and reports
+requests/sec and latency percentiles.
+
+    python -m swch_capreg.loadtest --capacity tests/sztaki-capacity-raw.yaml --connections 8 --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import threading
+import time
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+async def _client(host: str, port: int, path: str, body: bytes, count: int, latencies: list):
+    reader, writer = await asyncio.open_connection(host, port)
+    request = (f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+               f"Content-Length: {len(body)}\r\n\r\n").encode("latin-1") + body
+    try:
+        for _ in range(count):
+            started = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            length = 0
+            await reader.readline()
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.strip().lower() == "content-length":
+                    length = int(value.strip())
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - started)
+    finally:
+        writer.close()
+
+async def run_load(host: str, port: int, method: str, args: list, connections: int, requests: int, batch: int = 1) -> dict:
+    """
+    Sends `requests` HTTP requests over `connections` keep-alive connections.
+    With batch > 1 every request is a /batch call carrying `batch` calls of the method.
+    """
+    call = {"args": args}
+    if batch > 1:
+        path, body = "/batch", json.dumps([dict(call, method=method) for _ in range(batch)]).encode()
+    else:
+        path, body = f"/call/{method}", json.dumps(call).encode()
+    latencies = []
+    per_connection = [requests // connections + (1 if i < requests % connections else 0) for i in range(connections)]
+    started = time.perf_counter()
+    await asyncio.gather(*[_client(host, port, path, body, count, latencies) for count in per_connection if count])
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "calls": len(latencies) * batch,
+        "seconds": elapsed,
+        "requests_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+        "calls_per_sec": len(latencies) * batch / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+def _start_background_server(capacity_filename: str, sat_filename: str | None, swarmid: str):
+    from .capacity_registry import SwChCapacityRegistry
+    from .server import SwChCapacityRegistryServer
+    capreg = SwChCapacityRegistry("ra-loadtest")
+    capreg.initialize_capacity_from_file(capacity_filename)
+    if sat_filename:
+        capreg.resource_offer_generate_from_SAT_file(swarmid, sat_filename)
+    logging.getLogger().setLevel(logging.WARNING)
+    server = SwChCapacityRegistryServer(capreg, port=0)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def serve():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=serve, daemon=True).start()
+    ready.wait()
+    return server
+
+def main(argv: list | None = None):
+    parser = argparse.ArgumentParser(description="Load test the capacity registry HTTP service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None, help="port of a running server")
+    parser.add_argument("--capacity", help="capacity file for a server started in the background")
+    parser.add_argument("--sat", help="SAT file to generate offers for before the test (background server only)")
+    parser.add_argument("--swarm", default="swarm1")
+    parser.add_argument("--method", default="resource_offer_query_all")
+    parser.add_argument("--args", default=None, help="JSON list of positional arguments (default: [swarm])")
+    parser.add_argument("--connections", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=1, help="calls per request via the /batch endpoint")
+    options = parser.parse_args(argv)
+
+    if options.port is None:
+        if not options.capacity:
+            parser.error("either --port or --capacity is required")
+        server = _start_background_server(options.capacity, options.sat, options.swarm)
+        options.port = server.port
+    args = json.loads(options.args) if options.args else [options.swarm]
+    report = asyncio.run(run_load(options.host, options.port, options.method, args,
+                                  options.connections, options.requests, options.batch))
+    print(json.dumps(report, indent=2))
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -9,15 +9,21 @@ METHODS: list[str] = [
 	"initialize_capacity_from_file",
 	"resource_offer_generate_by_SAT_content",
 	"resource_offer_generate_from_SAT_file",
+	"resource_offer_generate_iter_by_SAT_content",
+	"resource_offer_generate_iter_from_SAT_file",
 	"resource_offer_accept",
 	"resource_offer_reject",
 	"resource_offer_query_all",
+	"resource_offer_query_all_as_ndjson",
 	"resources_and_offers_destroy_all",
 	"resource_set_get_from_offer",
 	"resource_set_deployed",
 	"resource_set_undeployed",
     "resource_set_query_all",
+	"resource_set_query_all_as_ndjson",
 	"save_capacity_registry_as_yaml",
 	"load_capacity_registry_from_yaml",
+	"save_capacity_registry_as_ndjson",
+	"load_capacity_registry_from_ndjson",
 	"dump_capacity_registry_info"
 ]
@@ -0,0 +1,220 @@
+"""
+Latency histograms and counters of registry methods, exported in Prometheus text format.
+
+A MetricsCollector is attached to a registry with SwChCapacityRegistry.attach_metrics().
+Attaching wraps the METHODS of that registry instance and the methods of its offer
+generation phases; detaching removes the wrappers again, so a registry without a
+collector runs its plain methods.
+
+    collector = capreg.attach_metrics()
+    ...
+    print(collector.export())
+"""
+import functools
+import inspect
+import threading
+import time
+
+# seconds
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+#internal methods timed as a phase of offer generation and state transitions
+PHASES = {
+    "extract_application_requirements_from_SAT_file": "sat_parse",
+    "calculate_matching_resources": "matching",
+    "plan_raw_flavour_assignment": "planning",
+    "calculate_available_instances_of_resources": "availability",
+    "resource_state_init_amount": "reservation",
+    "resource_state_change": "transition",
+    "resource_state_change_bulk": "transition",
+}
+
+COUNTERS = {
+    "offers_generated": "Offers generated or changed (colocations and unchanged re-offers not included).",
+    "offers_accepted": "Offers accepted.",
+    "offers_rejected": "Offers rejected.",
+    "failed_transitions": "State transitions refused because the source state was short or an invariant would be violated.",
+    "overbook_attempts": "Refused state transitions that would have taken capacity, i.e. all but releases to free.",
+}
+
+TRANSITIONS = ("resource_state_change", "resource_state_change_bulk")
+
+def unwrap_method(capreg, name: str):
+    """
+    Removes the outermost instance-level wrapper of a registry method (see functools.wraps),
+    restoring the wrapper below it or the plain method. Wrappers must be removed in reverse order.
+    """
+    wrapper = capreg.__dict__.get(name)
+    if wrapper is None:
+        return
+    wrapped = getattr(wrapper, "__wrapped__", None)
+    if wrapped is None or (inspect.ismethod(wrapped) and wrapped.__self__ is capreg):
+        del capreg.__dict__[name]
+    else:
+        setattr(capreg, name, wrapped)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(labels: tuple) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+
+class MetricsCollector:
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS, prefix: str = "swch_capreg"):
+        self.buckets = tuple(sorted(buckets))
+        self.prefix = prefix
+        # (name, labels) -> [bucket counts..., sum, count]
+        self.histograms = dict()
+        # (name, labels) -> value
+        self.counters = dict()
+        self.lock = threading.Lock()
+
+    def observe(self, name: str, labels: tuple, seconds: float):
+        key = (name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[index] += 1
+                    break
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+    def inc(self, name: str, labels: tuple, amount: int = 1):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def time(self, name: str, labels: tuple):
+        """
+        Context manager observing the wall time of its block.
+        """
+        return _Timer(self, name, labels)
+
+    def export(self) -> str:
+        """
+        Returns all histograms and counters in Prometheus text exposition format.
+        """
+        lines = []
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        last = None
+        for (name, labels), histogram in histograms:
+            metric = f"{self.prefix}_{name}_seconds"
+            if metric != last:
+                lines.append(f"# TYPE {metric} histogram")
+                last = metric
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{_labels(labels + (("le", repr(bound)),))}}} {cumulative}')
+            lines.append(f'{metric}_bucket{{{_labels(labels + (("le", "+Inf"),))}}} {histogram[-1]}')
+            lines.append(f"{metric}_sum{{{_labels(labels)}}} {histogram[-2]!r}")
+            lines.append(f"{metric}_count{{{_labels(labels)}}} {histogram[-1]}")
+        for (name, labels), value in counters:
+            metric = f"{self.prefix}_{name}_total"
+            if metric != last:
+                if name in COUNTERS:
+                    lines.append(f"# HELP {metric} {COUNTERS[name]}")
+                lines.append(f"# TYPE {metric} counter")
+                last = metric
+            lines.append(f"{metric}{{{_labels(labels)}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def __call__(self) -> str:
+        return self.export()
+
+    def instrument(self, capreg, methods: list):
+        """
+        Wraps the given public methods and the PHASES methods on one registry instance.
+        """
+        ra_id = ("ra_id", capreg.ra_id)
+        for name in methods:
+            setattr(capreg, name, self._wrap(capreg, getattr(capreg, name), "method", (ra_id, ("method", name))))
+        for name, phase in PHASES.items():
+            setattr(capreg, name, self._wrap(capreg, getattr(capreg, name), "phase", (ra_id, ("phase", phase))))
+
+    def uninstrument(self, capreg, methods: list):
+        for name in list(methods) + list(PHASES):
+            unwrap_method(capreg, name)
+
+    def _count(self, name: str, args: tuple, kwargs: dict, result, ra_id: tuple, previous: dict | None = None):
+        #every other generate method ends up in resource_offer_generate_iter_from_SAT_file
+        if name == "resource_offer_generate_iter_from_SAT_file":
+            msid, offerid, offer = result
+            #a re-offer yields its unchanged offers again as the very same objects
+            if offerid != "colocated" and previous.get(msid, {}).get(offerid) is not offer:
+                self.inc("offers_generated", (ra_id,))
+        elif name in ("resource_offer_accept", "resource_offer_reject"):
+            offerid = args[0] if args else kwargs.get("offerid")
+            if result and offerid != "colocated":
+                self.inc("offers_accepted" if name == "resource_offer_accept" else "offers_rejected", (ra_id,))
+        elif name in TRANSITIONS and result is None:
+            self.inc("failed_transitions", (ra_id,))
+            #to_state is the last parameter of both transition methods
+            to_state = kwargs.get("to_state", args[-1] if args else None)
+            if to_state != "free":
+                self.inc("overbook_attempts", (ra_id,))
+
+    def _wrap(self, capreg, method, kind: str, labels: tuple):
+        name = method.__name__
+        ra_id = labels[0]
+        if inspect.isgeneratorfunction(method):
+            @functools.wraps(method)
+            def timed_generator(*args, **kwargs):
+                #only the time spent inside the generator is observed, not the consumer's
+                elapsed = 0.0
+                swarmid = args[0] if args else kwargs.get("swarmid")
+                previous = capreg.capacity["offers"].get(swarmid, {}) if name == "resource_offer_generate_iter_from_SAT_file" else None
+                iterator = method(*args, **kwargs)
+                try:
+                    while True:
+                        started = time.perf_counter()
+                        try:
+                            item = next(iterator)
+                        except StopIteration:
+                            return
+                        finally:
+                            elapsed += time.perf_counter() - started
+                        self._count(name, args, kwargs, item, ra_id, previous)
+                        yield item
+                finally:
+                    iterator.close()
+                    self.observe(kind, labels, elapsed)
+            return timed_generator
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            except ValueError:
+                #a transition refused by the invariant checks counts like one refused for a short source
+                if name in TRANSITIONS:
+                    self._count(name, args, kwargs, None, ra_id)
+                raise
+            finally:
+                self.observe(kind, labels, time.perf_counter() - started)
+            self._count(name, args, kwargs, result, ra_id)
+            return result
+        return timed
+
+class _Timer:
+    __slots__ = ("collector", "name", "labels", "started")
+
+    def __init__(self, collector: MetricsCollector, name: str, labels: tuple):
+        self.collector = collector
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.collector.observe(self.name, self.labels, time.perf_counter() - self.started)
+        return False
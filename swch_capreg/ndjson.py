@@ -0,0 +1,67 @@
+"""
+Newline-delimited JSON helpers for streaming registry subtrees.
+
+Every line is one record: {"path": [<key>, ...], "value": <subtree>}, where the path
+is relative to the root of the dumped subtree. Reading the records back and setting
+each value at its path rebuilds the original subtree.
+"""
+import json
+from collections.abc import Mapping
+
+def iter_leaf_records(tree: dict, path: list | None = None):
+    """
+    Yields (path, value) for every innermost dict of the tree, i.e. a dict without dict values.
+    """
+    path = path if path is not None else []
+    if isinstance(tree, Mapping) and any(isinstance(value, Mapping) for value in tree.values()):
+        for key, value in tree.items():
+            if isinstance(value, Mapping):
+                yield from iter_leaf_records(value, path + [key])
+            else:
+                yield path + [key], value
+    else:
+        yield path, tree
+
+def _to_json(value):
+    # read-only mappings such as compact catalog records are written as plain objects
+    if isinstance(value, Mapping):
+        return dict(value.items())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def write_records(records, fp) -> int:
+    """
+    Writes (path, value) records to a file-like object, one JSON document per line.
+    Returns the number of records written.
+    """
+    count = 0
+    for path, value in records:
+        fp.write(json.dumps({"path": path, "value": value}, separators=(",", ":"), default=_to_json))
+        fp.write("\n")
+        count += 1
+    return count
+
+def read_records(fp):
+    """
+    Yields (path, value) records from a file-like object written by write_records.
+    """
+    for line in fp:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        yield record["path"], record["value"]
+
+def load_records(records, tree: dict | None = None) -> dict:
+    """
+    Rebuilds a subtree from (path, value) records.
+    """
+    tree = tree if tree is not None else dict()
+    for path, value in records:
+        if not path:
+            tree.update(value)
+            continue
+        node = tree
+        for key in path[:-1]:
+            node = node.setdefault(key, dict())
+        node[path[-1]] = value
+    return tree
@@ -0,0 +1,57 @@
+class RawCapPlanner:
+    """
+    Class to plan flavour assignments of a whole SAT against a shared raw capacity pool.
+    """
+    def __init__(self, props: list):
+        self.props = list(props)
+
+    def _vector(self, data: dict) -> list:
+        return [data.get(prop, 0) for prop in self.props]
+
+    def _fit(self, free: list, required: list) -> int:
+        """
+        Returns how many units of the required vector fit into the free vector.
+        """
+        fits = [f // r for f, r in zip(free, required) if r > 0]
+        return max(min(fits), 0) if fits else float("inf")
+
+    def _share(self, free: list, required: list, count: int) -> float:
+        """
+        Returns the dominant share of the free vector consumed by count units of the required vector.
+        """
+        shares = [(r * count) / f if f > 0 else float("inf") for f, r in zip(free, required) if r > 0]
+        return max(shares) if shares else 0.0
+
+    def plan(self, demands: dict, flavours: dict, free: dict) -> dict:
+        """
+        Computes a flavour assignment for all microservices in one pass.
+        demands:  {msid: {"count": <instances>, "candidates": [<flavour_name>, ...]}}
+        flavours: {flavour_name: <flat flavour dict>}
+        free:     {resource_key: <amount>}
+        Returns {msid: {"flavour": <flavour_name or None>, "count": <planned>, "required": <instances>}}.
+        Microservices are placed hardest-first (largest dominant share of their cheapest
+        candidate), each taking the candidate that fits its whole demand with the smallest
+        dominant share of what is still free. Microservices that do not fit get no flavour.
+        """
+        free_vec = self._vector(free)
+        vectors = dict((name, self._vector(flavours[name])) for name in flavours)
+
+        def hardness(msid):
+            demand = demands[msid]
+            shares = [self._share(free_vec, vectors[name], demand["count"]) for name in demand["candidates"] if name in vectors]
+            return min(shares) if shares else 0.0
+
+        plan = dict()
+        for msid in sorted(demands.keys(), key=hardness, reverse=True):
+            required = demands[msid]["count"]
+            best_name, best_share = None, float("inf")
+            for name in demands[msid]["candidates"]:
+                if name not in vectors or self._fit(free_vec, vectors[name]) < required:
+                    continue
+                share = self._share(free_vec, vectors[name], required)
+                if share < best_share:
+                    best_name, best_share = name, share
+            if best_name is not None:
+                free_vec = [f - r * required for f, r in zip(free_vec, vectors[best_name])]
+            plan[msid] = {"flavour": best_name, "count": required if best_name else 0, "required": required}
+        return plan
@@ -0,0 +1,73 @@
+"""
+Indexed priority queues of reclaimable reservations.
+
+Every (swarmid, msid, restype, resid) holding `reserved` capacity has one entry in the heap
+of its pool: ("flavour", name), ("edge", name) or ("raw",) for the whole raw cloud pool.
+Entries are ordered by swarm priority (lowest first) and, within a priority, newest first.
+Pushing, removing and popping the lowest-priority reservation of a pool are O(log n);
+removed entries are only marked invalid and dropped when they reach the top of the heap.
+"""
+import heapq
+import itertools
+
+_VALID = 4
+
+
+class ReservationQueue:
+
+    def __init__(self):
+        self.heaps = dict()
+        # key -> [priority, order, key, pool, valid]
+        self.entries = dict()
+        self.order = itertools.count()
+
+    def push(self, pool: tuple, key: tuple, priority: int):
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[0] == priority:
+                return
+            entry[_VALID] = False
+        entry = [priority, -next(self.order), key, pool, True]
+        self.entries[key] = entry
+        heap = self.heaps.setdefault(pool, [])
+        heapq.heappush(heap, entry)
+        if len(heap) > 2 * len(self.entries) + 16:
+            self._compact(pool)
+
+    def remove(self, key: tuple):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            entry[_VALID] = False
+
+    def pop_below(self, pool: tuple, priority: int):
+        """
+        Removes and returns the entry [priority, order, key, pool, valid] of the lowest-priority
+        reservation of the pool if its priority is below `priority`, otherwise None.
+        """
+        heap = self.heaps.get(pool)
+        while heap and not heap[0][_VALID]:
+            heapq.heappop(heap)
+        if not heap or heap[0][0] >= priority:
+            return None
+        entry = heapq.heappop(heap)
+        del self.entries[entry[2]]
+        return entry
+
+    def restore(self, entry: list):
+        """
+        Puts back an entry returned by pop_below, keeping its place in the order.
+        """
+        if entry[2] not in self.entries:
+            self.entries[entry[2]] = entry
+            heapq.heappush(self.heaps[entry[3]], entry)
+
+    def _compact(self, pool: tuple):
+        heap = [entry for entry in self.heaps[pool] if entry[_VALID]]
+        heapq.heapify(heap)
+        self.heaps[pool] = heap
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
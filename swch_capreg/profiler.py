@@ -0,0 +1,164 @@
+"""
+Profiler for capacity and SAT workloads.
+
+Runs the full offer cycle (generate, accept/reject, deploy, destroy) for a number of
+swarms under cProfile and tracemalloc, and reports the wall time per phase, the top
+functions and the top allocation sites as JSON, so runs can be compared.
+
+    python -m swch_capreg profile --capacity tests/sztaki-capacity-raw.yaml --sat tests/BookInfo.yaml --swarms 10
+
+Phase times are exclusive: time spent in a nested phase (e.g. availability checks during
+offer generation) is only counted there. Both profilers are active during the run, so
+absolute times include their overhead.
+"""
+import argparse
+import cProfile
+import json
+import logging
+import pstats
+import sys
+import time
+import tracemalloc
+from .capacity_registry import SwChCapacityRegistry
+
+#registry methods timed as a phase: method name -> (phase, phase of the caller it is counted in or None for any)
+PHASES = {
+    "read_capacity_from_file": ("sardou_parse", None),
+    "initialize": ("initialize", None),
+    "extract_application_requirements_from_SAT_file": ("sardou_parse", None),
+    "_lowercase_lambda_string_values": ("expression_lowering", None),
+    "calculate_matching_resources": ("matching", None),
+    "plan_raw_flavour_assignment": ("planning", None),
+    "calculate_available_instances_of_resources": ("availability", None),
+    "resource_state_init_amount": ("reservation", "offer_composition"),
+    "resource_state_change": ("reservation", "offer_composition"),
+    "resource_offer_generate_from_SAT_file": ("offer_composition", None),
+    "resource_offer_accept": ("accept", None),
+    "resource_offer_reject": ("reject", None),
+    "resource_set_deployed": ("deploy", None),
+    "resources_and_offers_destroy_all": ("destroy", None),
+}
+
+class PhaseTimer:
+    """
+    Wraps registry methods on one instance and accumulates exclusive wall time and calls per phase.
+    """
+    def __init__(self):
+        self.times = dict()
+        self.calls = dict()
+        # stack of [phase, start, time spent in nested phases]
+        self.stack = []
+
+    def instrument(self, capreg: SwChCapacityRegistry, phases: dict = PHASES):
+        for name, (phase, within) in phases.items():
+            setattr(capreg, name, self._wrap(getattr(capreg, name), phase, within))
+
+    def _wrap(self, method, phase: str, within: str | None):
+        def timed(*args, **kwargs):
+            if within is not None and (not self.stack or self.stack[-1][0] != within):
+                return method(*args, **kwargs)
+            frame = [phase, time.perf_counter(), 0.0]
+            self.stack.append(frame)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - frame[1]
+                self.stack.pop()
+                if self.stack:
+                    self.stack[-1][2] += elapsed
+                self.times[phase] = self.times.get(phase, 0.0) + elapsed - frame[2]
+                self.calls[phase] = self.calls.get(phase, 0) + 1
+        return timed
+
+    def report(self) -> dict:
+        return dict((phase, {"seconds": self.times[phase], "calls": self.calls[phase]})
+                    for phase in sorted(self.times, key=self.times.get, reverse=True))
+
+def run_cycle(capreg: SwChCapacityRegistry, swarmid: str, sat: str):
+    """
+    Generates offers for a swarm, accepts the first offer of each ms and rejects the others,
+    deploys the accepted resources and destroys everything of the swarm.
+    """
+    capreg.resource_offer_generate_from_SAT_file(swarmid, sat)
+    accepted = []
+    for msid, ms_offers in capreg.resource_offer_query_all(swarmid).items():
+        offerids = [offerid for offerid in ms_offers if offerid != "colocated"]
+        for offerid in offerids[1:]:
+            capreg.resource_offer_reject(offerid, ms_offers[offerid])
+        if offerids:
+            capreg.resource_offer_accept(offerids[0], ms_offers[offerids[0]])
+            accepted.append(capreg.resource_set_get_from_offer(offerids[0], ms_offers[offerids[0]]))
+    for res_set in accepted:
+        capreg.resource_set_deployed(res_set["swarmid"], res_set["msid"], res_set["restype"], res_set["resid"], res_set["count"])
+    capreg.resources_and_offers_destroy_all(swarmid)
+
+def _top_functions(profiler: cProfile.Profile, top: int) -> list:
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, function), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        if filename == __file__:
+            #the phase wrappers and the cycle driver of this module
+            continue
+        rows.append({"function": f"{filename}:{line}({function})", "calls": calls,
+                     "tottime": tottime, "cumtime": cumtime})
+    rows.sort(key=lambda row: row["cumtime"], reverse=True)
+    return rows[:top]
+
+def _top_allocations(snapshot: tracemalloc.Snapshot, top: int) -> list:
+    return [{"site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", "bytes": stat.size, "count": stat.count}
+            for stat in snapshot.statistics("lineno")[:top]]
+
+def run(capacity: str, sat: str, swarms: int = 1, top: int = 20, cache_dir: str | None = None) -> dict:
+    """
+    Profiles initialization from the capacity file and `swarms` offer cycles of the SAT file.
+    """
+    capreg = SwChCapacityRegistry("ra-profile")
+    logging.getLogger().setLevel(logging.WARNING)
+    timer = PhaseTimer()
+    timer.instrument(capreg)
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    started = time.perf_counter()
+    profiler.enable()
+    try:
+        capreg.initialize_capacity_from_file(capacity, cache_dir=cache_dir)
+        for index in range(swarms):
+            run_cycle(capreg, f"swarm{index + 1}", sat)
+    finally:
+        profiler.disable()
+        total = time.perf_counter() - started
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {
+        "capacity": capacity,
+        "sat": sat,
+        "swarms": swarms,
+        "python": sys.version.split()[0],
+        "total_seconds": total,
+        "phases": timer.report(),
+        "memory": {"current_bytes": current, "peak_bytes": peak},
+        "top_functions": _top_functions(profiler, top),
+        "top_allocations": _top_allocations(snapshot, top),
+    }
+
+def main(argv: list | None = None):
+    parser = argparse.ArgumentParser(prog="python -m swch_capreg profile",
+                                     description="Profile the offer cycle of a capacity and SAT file.")
+    parser.add_argument("--capacity", required=True, help="capacity file (CDT)")
+    parser.add_argument("--sat", required=True, help="SAT file")
+    parser.add_argument("--swarms", type=int, default=1, help="number of swarms to run the cycle for")
+    parser.add_argument("--top", type=int, default=20, help="number of functions and allocation sites to list")
+    parser.add_argument("--cache-dir", help="pre-parsed capacity cache directory")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    options = parser.parse_args(argv)
+    report = run(options.capacity, options.sat, options.swarms, options.top, options.cache_dir)
+    if options.output:
+        with open(options.output, "w") as fp:
+            json.dump(report, fp, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return report
+
+if __name__ == "__main__":
+    main()
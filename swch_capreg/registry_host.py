@@ -0,0 +1,53 @@
+"""
+Host for many resource agent registries over one shared provider catalog.
+"""
+import logging
+from .capacity_registry import SwChCapacityRegistry
+from .catalog import SharedCatalog
+
+
+class SwChCapacityRegistryHost:
+    """
+    Keeps one SwChCapacityRegistry per ra_id, all initialized from the same SharedCatalog.
+    Reloading the catalog only affects registries created afterwards.
+    """
+    def __init__(self, logger: logging.Logger | None = None):
+        self.logger = logger
+        self.catalog = None
+        self.registries = dict()
+
+    def load_catalog(self, init_capacity: dict, compact: bool = True) -> SharedCatalog:
+        self.catalog = SharedCatalog(init_capacity, compact)
+        return self.catalog
+
+    def load_catalog_by_content(self, content: str, cache_dir: str | None = None) -> SharedCatalog:
+        parser = SwChCapacityRegistry("catalog", self.logger)
+        return self.load_catalog(parser.read_capacity_by_content(content, cache_dir))
+
+    def load_catalog_from_file(self, filename: str, cache_dir: str | None = None) -> SharedCatalog:
+        parser = SwChCapacityRegistry("catalog", self.logger)
+        return self.load_catalog(parser.read_capacity_from_file(filename, cache_dir))
+
+    def registry(self, ra_id: str) -> SwChCapacityRegistry:
+        """
+        Returns the registry of ra_id, creating it on the shared catalog if needed.
+        """
+        if ra_id not in self.registries:
+            if self.catalog is None:
+                raise ValueError("No catalog loaded, call load_catalog* first.")
+            capreg = SwChCapacityRegistry(ra_id, self.logger)
+            capreg.initialize(init_capacity=self.catalog.init_capacity, catalog=self.catalog)
+            self.registries[ra_id] = capreg
+        return self.registries[ra_id]
+
+    def remove(self, ra_id: str):
+        self.registries.pop(ra_id, None)
+
+    def __getitem__(self, ra_id: str) -> SwChCapacityRegistry:
+        return self.registries[ra_id]
+
+    def __contains__(self, ra_id: str) -> bool:
+        return ra_id in self.registries
+
+    def __len__(self) -> int:
+        return len(self.registries)
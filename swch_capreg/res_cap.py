@@ -1,8 +1,70 @@
-import yaml
+import sys
+from collections.abc import Mapping
 
-class ResCap:
+_MISSING = object()
+
+class CatalogSchema:
+    """
+    Interned dot-separated keys shared by all compact records of a catalog.
+    Keys are resolved from their path tuple once and get a fixed slot index.
+    """
     def __init__(self):
-        pass
+        self.keys = []
+        self.index = {}
+        self.numeric = []
+        # trie of path components: node = (children by component, slots by leaf component)
+        self.root = ({}, {})
+
+    def slot(self, path: tuple) -> int:
+        key = sys.intern(".".join(path))
+        slot = self.index.get(key)
+        if slot is None:
+            slot = len(self.keys)
+            self.keys.append(key)
+            self.index[key] = slot
+            #temporary workaround (see ResCap): these values are converted to int
+            self.numeric.append(key.endswith('.mem-size') or key.endswith('.disk-size'))
+        return slot
+
+class CatalogRecord(Mapping):
+    """
+    Read-only flat record of one flavour or edge instance; values are kept in a tuple
+    aligned with the slots of a shared CatalogSchema.
+    """
+    __slots__ = ("schema", "_values")
+
+    def __init__(self, schema: CatalogSchema, values: tuple):
+        self.schema = schema
+        self._values = values
+
+    def __getitem__(self, key):
+        slot = self.schema.index.get(key)
+        if slot is None or slot >= len(self._values) or self._values[slot] is _MISSING:
+            raise KeyError(key)
+        return self._values[slot]
+
+    def __iter__(self):
+        keys = self.schema.keys
+        return (keys[slot] for slot, value in enumerate(self._values) if value is not _MISSING)
+
+    def __len__(self):
+        return sum(1 for value in self._values if value is not _MISSING)
+
+    def __repr__(self):
+        return f"CatalogRecord({dict(self.items())!r})"
+
+    def __reduce__(self):
+        return dict, (dict(self.items()),)
+
+class ResCap:
+    def __init__(self, schema: CatalogSchema | None = None):
+        self.schema = schema
+
+    def _leaf_value(self, key: str, d):
+        #temporary workaround: convert integers to string
+        if key.endswith('.mem-size') or key.endswith('.disk-size'):
+            return int(d)
+        return d.lower() if isinstance(d, str) else d
 
     def parse(self, data: dict) -> dict:
         """
@@ -18,12 +80,44 @@ class ResCap:
                     extract_flat(v, prefix + [k])
             else:
                 key = ".".join(prefix)
-                #temporary workaround: convert integers to string
-                if key.endswith('.mem-size') or key.endswith('.disk-size'):
-                    value = int(d)
-                else:
-                    value = d.lower() if isinstance(d, str) else d
-                result[key] = value
+                result[key] = self._leaf_value(key, d)
 
         extract_flat(data)
         return result
+
+    def parse_compact(self, data: dict) -> CatalogRecord:
+        """
+        Same as parse, but returns a CatalogRecord on the shared schema of this ResCap.
+        String values are interned, so repeated values are stored once across the catalog.
+        """
+        if self.schema is None:
+            self.schema = CatalogSchema()
+        schema = self.schema
+        numeric = schema.numeric
+        slots = {}
+
+        def extract_flat(d, node, prefix):
+            children, leaves = node
+            for k, v in d.items():
+                if isinstance(v, dict):
+                    child = children.get(k)
+                    if child is None:
+                        child = children[k] = ({}, {})
+                    extract_flat(v, child, prefix + (k,))
+                else:
+                    slot = leaves.get(k)
+                    if slot is None:
+                        slot = leaves[k] = schema.slot(prefix + (k,))
+                    if numeric[slot]:
+                        v = int(v)
+                    elif isinstance(v, str):
+                        v = sys.intern(v.lower())
+                    slots[slot] = v
+
+        extract_flat(data, schema.root, ())
+        values = [_MISSING] * len(schema.keys)
+        for slot, value in slots.items():
+            values[slot] = value
+        while values and values[-1] is _MISSING:
+            values.pop()
+        return CatalogRecord(schema, tuple(values))
@@ -0,0 +1,176 @@
+"""
+Local HTTP/1.1 service exposing the METHODS catalog of a SwChCapacityRegistry.
+
+Endpoints:
+    GET  /methods          -> {"methods": [<method name>, ...]}
+    GET  /metrics          -> Prometheus text of the attached MetricsCollector (404 if none)
+    POST /call/<method>    body: {"args": [...], "kwargs": {...}}  -> {"result": ...}
+    POST /batch            body: [{"method": <name>, "args": [...], "kwargs": {...}}, ...]
+                           -> [{"result": ...} or {"error": ...}, ...] in call order
+Connections are kept alive unless the client asks otherwise (or speaks HTTP/1.0 without
+"Connection: keep-alive"). Calls are executed one by one on the event loop thread, so the
+registry is never accessed concurrently.
+Methods taking a file-like `fp` (the NDJSON ones) get an in-memory buffer: a string passed
+as `fp` is read from, otherwise the written text is returned as "output" next to "result".
+"""
+import asyncio
+import inspect
+import io
+import json
+from .methods import METHODS
+
+
+class SwChCapacityRegistryServer:
+
+    REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+    def __init__(self, registry, host: str = "127.0.0.1", port: int = 8080, methods: list | None = None):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.methods = list(methods) if methods is not None else list(METHODS)
+        self.logger = registry.logger
+        self.server = None
+
+    def call(self, method: str, args: list | None = None, kwargs: dict | None = None) -> dict:
+        """
+        Executes one registry method and returns its JSON-ready response body.
+        Raises KeyError for methods not in the catalog.
+        """
+        if method not in self.methods:
+            raise KeyError(method)
+        func = getattr(self.registry, method)
+        args = list(args or [])
+        kwargs = dict(kwargs or {})
+        buffer = None
+        if "fp" in inspect.signature(func).parameters:
+            content = kwargs.pop("fp", None)
+            buffer = io.StringIO(content) if isinstance(content, str) else io.StringIO()
+            kwargs["fp"] = buffer
+        result = func(*args, **kwargs)
+        if inspect.isgenerator(result):
+            result = list(result)
+        response = {"result": result}
+        if buffer is not None and not isinstance(content, str):
+            response["output"] = buffer.getvalue()
+        return response
+
+    def call_batch(self, calls: list) -> list:
+        responses = []
+        for act_call in calls:
+            method = act_call.get("method") if isinstance(act_call, dict) else None
+            if method not in self.methods:
+                responses.append({"error": f"Unknown method: {method!r}"})
+                continue
+            try:
+                responses.append(self.call(method, act_call.get("args"), act_call.get("kwargs")))
+            except Exception as e:
+                responses.append({"error": f"{e.__class__.__name__}: {e}"})
+        return responses
+
+    def handle(self, verb: str, target: str, body: bytes):
+        """
+        Routes one request and returns (status, response body).
+        """
+        path = target.split("?", 1)[0].rstrip("/")
+        if path == "/methods":
+            if verb != "GET":
+                return 405, {"error": "Use GET"}
+            return 200, {"methods": self.methods}
+        if path == "/metrics":
+            if verb != "GET":
+                return 405, {"error": "Use GET"}
+            if getattr(self.registry, "metrics", None) is None:
+                return 404, {"error": "No metrics collector attached"}
+            return 200, self.registry.metrics.export()
+        if path != "/batch" and not path.startswith("/call/"):
+            return 404, {"error": f"Unknown path: {path}"}
+        if verb != "POST":
+            return 405, {"error": "Use POST"}
+        try:
+            payload = json.loads(body) if body else None
+        except ValueError as e:
+            return 400, {"error": f"Invalid JSON body: {e}"}
+        if path == "/batch":
+            if not isinstance(payload, list):
+                return 400, {"error": "Batch body must be a list of calls"}
+            return 200, self.call_batch(payload)
+        payload = payload if payload is not None else {}
+        if not isinstance(payload, dict):
+            return 400, {"error": "Call body must be an object with args and kwargs"}
+        method = path[len("/call/"):]
+        if method not in self.methods:
+            return 404, {"error": f"Unknown method: {method!r}"}
+        try:
+            return 200, self.call(method, payload.get("args"), payload.get("kwargs"))
+        except Exception as e:
+            self.logger.error(f"Calling '{method}' failed: {e!r}")
+            return 500, {"error": f"{e.__class__.__name__}: {e}"}
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    verb, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = dict()
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+                try:
+                    length = int(headers.get("content-length", 0))
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    #the body cannot be delimited, so the connection cannot be reused
+                    keep_alive = False
+                    status, response = 400, {"error": f"Invalid Content-Length: {headers['content-length']}"}
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, response = self.handle(verb, target, body)
+                if isinstance(response, str):
+                    data, content_type = response.encode(), "text/plain; version=0.0.4"
+                else:
+                    data, content_type = json.dumps(response, separators=(",", ":")).encode(), "application/json"
+                writer.write(
+                    f"HTTP/1.1 {status} {self.REASONS.get(status, '')}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.logger.info(f"Capacity registry '{self.registry.ra_id}' served on http://{self.host}:{self.port}")
+        return self.server
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    def run(self):
+        asyncio.run(self.serve_forever())
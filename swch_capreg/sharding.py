@@ -0,0 +1,277 @@
+"""
+Sharded registry front end over worker processes.
+
+A ShardedRegistry starts one SwChCapacityRegistry per worker process, all on the same
+catalog, and splits the provider capacity into per-shard quotas: flavour counts and raw
+properties are divided evenly, edge instances are dealt round-robin. Swarm-scoped calls
+(resource_offer_*, resource_set_*, resources_and_offers_destroy_all) are routed to the
+shard of the swarm id (CRC32 of the id modulo the number of shards), so the calls of
+different swarms run in parallel on different cores.
+
+Quotas only move as free capacity (SwChCapacityRegistry.resource_capacity_adjust), so
+the shards' init counters always add up to the global capacity. Each worker reports the
+free amount of every counter a call touched; before routing an offer request to a shard,
+the counters of that shard that fell below `low_water` of their even share are refilled
+from the shard with the most free capacity of that counter. Counters with fewer units than
+shards (e.g. single edge instances) stay on the shard they were dealt to.
+
+    with ShardedRegistry.from_file("ra-1", "capacity.yaml", shards=4) as sharded:
+        futures = [sharded.submit("resource_offer_generate_from_SAT_file", swarmid, "app.yaml") for swarmid in swarmids]
+        offers = [future.result() for future in futures]
+"""
+import collections
+import inspect
+import io
+import logging
+import math
+import multiprocessing
+import zlib
+from .capacity_registry import SwChCapacityRegistry
+from .methods import METHODS
+
+SWARM_METHODS = [name for name in METHODS
+                 if name.startswith(("resource_offer_", "resource_set_")) or name == "resources_and_offers_destroy_all"]
+
+def shard_quotas(init_capacity: dict, shards: int) -> list:
+    """
+    Splits the capacity of a CDT into `shards` quota dicts of {(restype, key): amount}.
+    Keys are flavour names or raw properties for restype "cloud" and instance names for "edge".
+    """
+    quotas = [dict() for _ in range(shards)]
+    totals = dict()
+    if "cloud_capacity_flavour" in init_capacity:
+        for name, amount in init_capacity["cloud_capacity_flavour"].items():
+            totals[("cloud", name)] = int(amount)
+    elif "cloud_capacity_raw" in init_capacity:
+        for prop, amount in init_capacity["cloud_capacity_raw"].items():
+            if isinstance(amount, int) or (isinstance(amount, str) and amount.isdigit()):
+                totals[("cloud", "host." + prop)] = int(amount)
+    for key, total in totals.items():
+        for index in range(shards):
+            quotas[index][key] = total // shards + (1 if index < total % shards else 0)
+    for position, name in enumerate(init_capacity.get("edge_instances", {})):
+        for index in range(shards):
+            quotas[index][("edge", name)] = 1 if position % shards == index else 0
+    return quotas
+
+def _free_of(capreg: SwChCapacityRegistry, restype: str, key: str) -> int:
+    if restype == "cloud":
+        return capreg.capacity["cloud"][capreg.capacity["cloud"]["type"]]["free"].get(key, 0)
+    return capreg.capacity["edge"]["instances"]["free"].get(key, 0)
+
+def _init_of(capreg: SwChCapacityRegistry, keys) -> dict:
+    init = dict()
+    for restype, key in keys:
+        if restype == "cloud":
+            init[(restype, key)] = capreg.capacity["cloud"][capreg.capacity["cloud"]["type"]]["init"].get(key, 0)
+        else:
+            init[(restype, key)] = capreg.capacity["edge"]["instances"]["init"].get(key, 0)
+    return init
+
+def _worker(conn, ra_id: str, init_capacity: dict, quota: dict, log_level: int):
+    logger = logging.getLogger(f"swch_capreg.shard.{ra_id}")
+    logger.setLevel(log_level)
+    capreg = SwChCapacityRegistry(ra_id, logger)
+    capreg.initialize(init_capacity)
+    for (restype, key), amount in quota.items():
+        capreg.resource_capacity_adjust(restype, key, amount - _free_of(capreg, restype, key))
+    subscription = capreg.subscribe_changes(maxsize=1 << 20)
+
+    def touched_free():
+        touched, dropped = set(), subscription.dropped
+        for event in subscription.drain():
+            if event["event"] == "state":
+                scope, deltas = capreg._global_counter_deltas(event["type"], event["resource"])
+                touched.update((event["type"], key) for key in deltas)
+            elif event["event"] == "capacity":
+                touched.add((event["type"], event["resource"]))
+            elif event["event"] == "reset":
+                dropped = -1
+        if dropped != subscription.dropped or dropped == -1:
+            touched = set(quota)
+        return dict((key, _free_of(capreg, *key)) for key in touched)
+
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        method, args, kwargs, buffered = request
+        output = None
+        try:
+            if method == "_capacity_counters":
+                result = dict((key, {"init": init, "free": _free_of(capreg, *key)}) for key, init in _init_of(capreg, quota).items())
+                conn.send((True, result, None, dict()))
+                continue
+            if buffered:
+                kwargs["fp"] = io.StringIO()
+            result = getattr(capreg, method)(*args, **kwargs)
+            if inspect.isgenerator(result):
+                result = list(result)
+            if buffered:
+                output = kwargs["fp"].getvalue()
+            response = (True, result, output)
+        except Exception as e:
+            response = (False, e, None)
+        conn.send(response + (touched_free(),))
+    conn.close()
+
+class ShardFuture:
+    """
+    Result of a call submitted to a shard; result() waits for it.
+    """
+    __slots__ = ("sharded", "shard", "fp", "done", "ok", "value")
+
+    def __init__(self, sharded, shard: int, fp):
+        self.sharded = sharded
+        self.shard = shard
+        self.fp = fp
+        self.done = False
+
+    def result(self):
+        while not self.done:
+            self.sharded._receive(self.shard)
+        if not self.ok:
+            raise self.value
+        return self.value
+
+class ShardedRegistry:
+
+    def __init__(self, ra_id: str, init_capacity: dict, shards: int | None = None, logger: logging.Logger | None = None,
+                 low_water: float = 0.25, log_level: int = logging.WARNING, start_method: str | None = None):
+        self.ra_id = ra_id
+        self.shards = shards or multiprocessing.cpu_count()
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        quotas = shard_quotas(init_capacity, self.shards)
+        self.totals = collections.Counter()
+        for quota in quotas:
+            self.totals.update(quota)
+        # even share and refill threshold per counter; counters with fewer units than shards are not rebalanced
+        self.share = dict((key, total / self.shards) for key, total in self.totals.items() if total >= self.shards)
+        self.low_water = dict((key, math.ceil(share * low_water)) for key, share in self.share.items())
+        self.free = [dict(quota) for quota in quotas]
+        self.low = [set() for _ in range(self.shards)]
+        self.pending = [collections.deque() for _ in range(self.shards)]
+        self.signatures = dict()
+        context = multiprocessing.get_context(start_method)
+        self.connections, self.processes = [], []
+        for index in range(self.shards):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=_worker, args=(child_conn, ra_id, init_capacity, quotas[index], log_level),
+                                      name=f"swch-capreg-shard-{index}", daemon=True)
+            process.start()
+            child_conn.close()
+            self.connections.append(parent_conn)
+            self.processes.append(process)
+
+    @classmethod
+    def from_file(cls, ra_id: str, filename: str, cache_dir: str | None = None, **options):
+        parser = SwChCapacityRegistry("catalog", options.get("logger"))
+        return cls(ra_id, parser.read_capacity_from_file(filename, cache_dir), **options)
+
+    @classmethod
+    def by_content(cls, ra_id: str, content: str, cache_dir: str | None = None, **options):
+        parser = SwChCapacityRegistry("catalog", options.get("logger"))
+        return cls(ra_id, parser.read_capacity_by_content(content, cache_dir), **options)
+
+    def shard_of(self, swarmid: str) -> int:
+        return zlib.crc32(swarmid.encode()) % self.shards
+
+    def _bind(self, method: str, args: tuple, kwargs: dict) -> inspect.BoundArguments:
+        signature = self.signatures.get(method)
+        if signature is None:
+            signature = self.signatures[method] = inspect.signature(getattr(SwChCapacityRegistry, method))
+        return signature.bind(None, *args, **kwargs)
+
+    def swarm_of(self, arguments: dict) -> str:
+        if "swarmid" in arguments:
+            return arguments["swarmid"]
+        offer = arguments.get("offer")
+        first = offer[0] if isinstance(offer, list) and offer else offer
+        # colocation entries carry no swarm id and need no state change on any shard
+        return first["ids"]["swarm_id"] if isinstance(first, dict) else ""
+
+    def submit(self, method: str, *args, **kwargs) -> ShardFuture:
+        """
+        Sends a swarm-scoped call to the shard of its swarm and returns a ShardFuture.
+        A file-like `fp` receives the text the method writes once the result is collected.
+        """
+        if method not in SWARM_METHODS:
+            raise ValueError(f"'{method}' is not swarm-scoped and cannot be routed to a shard")
+        bound = self._bind(method, args, kwargs)
+        shard = self.shard_of(self.swarm_of(bound.arguments))
+        if method.startswith("resource_offer_generate") and self.low[shard]:
+            self._refill(shard)
+        fp = bound.arguments.pop("fp", None)
+        return self._send(shard, method, bound.args[1:], bound.kwargs, fp)
+
+    def call(self, method: str, *args, **kwargs):
+        return self.submit(method, *args, **kwargs).result()
+
+    def __getattr__(self, name: str):
+        if name in SWARM_METHODS:
+            return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+        raise AttributeError(f"{self.__class__.__name__!r} object has no attribute {name!r}")
+
+    def _send(self, shard: int, method: str, args: tuple, kwargs: dict, fp=None) -> ShardFuture:
+        future = ShardFuture(self, shard, fp)
+        self.connections[shard].send((method, args, kwargs, fp is not None))
+        self.pending[shard].append(future)
+        return future
+
+    def _receive(self, shard: int):
+        ok, value, output, free = self.connections[shard].recv()
+        future = self.pending[shard].popleft()
+        if output is not None and future.fp is not None:
+            future.fp.write(output)
+        future.ok, future.value, future.done = ok, value, True
+        for key, amount in free.items():
+            self.free[shard][key] = amount
+            if key in self.low_water and amount < self.low_water[key]:
+                self.low[shard].add(key)
+            else:
+                self.low[shard].discard(key)
+
+    def _refill(self, shard: int):
+        """
+        Moves free capacity to the counters of a shard that are below their low-water mark,
+        up to their even share, from the shard holding the most free capacity of each counter.
+        """
+        for key in list(self.low[shard]):
+            donor = max((index for index in range(self.shards) if index != shard), key=lambda index: self.free[index].get(key, 0))
+            amount = min(math.ceil(self.share[key]) - self.free[shard].get(key, 0), self.free[donor].get(key, 0) // 2)
+            if amount <= 0:
+                continue
+            restype, name = key
+            moved = -self._send(donor, "resource_capacity_adjust", (restype, name, -amount), {}).result()
+            if moved > 0:
+                self._send(shard, "resource_capacity_adjust", (restype, name, moved), {}).result()
+                self.logger.debug(f"Moved {moved} of {restype} '{name}' from shard {donor} to shard {shard}")
+
+    def capacity_totals(self) -> dict:
+        """
+        Returns the init and free amount per counter summed over all shards, as {(restype, key): {...}}.
+        The init sums always equal the global capacity.
+        """
+        totals = dict((key, {"init": 0, "free": 0}) for key in self.totals)
+        for shard in range(self.shards):
+            for key, amount in self._send(shard, "_capacity_counters", (), {}).result().items():
+                totals[key]["init"] += amount["init"]
+                totals[key]["free"] += amount["free"]
+        return totals
+
+    def close(self):
+        for shard, connection in enumerate(self.connections):
+            while self.pending[shard]:
+                self._receive(shard)
+            connection.send(None)
+        for process in self.processes:
+            process.join()
+        for connection in self.connections:
+            connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
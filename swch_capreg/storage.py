@@ -0,0 +1,288 @@
+"""
+Pluggable storage backends for registry state.
+
+A storage is written through by SwChCapacityRegistry: the in-memory `capacity` dict stays
+the working copy, and every state transition is applied to the storage first (in one
+transaction), so a failing write leaves both unchanged. The writes of one registry call
+are committed together in a batch. The state can be rebuilt from the storage after a
+restart with SwChCapacityRegistry.initialize_from_storage().
+"""
+import contextlib
+import json
+import threading
+from collections.abc import Mapping
+
+STATES = ["free", "reserved", "assigned", "allocated"]
+
+
+class RegistryStorage:
+    """
+    Interface of registry storage backends. This base class stores nothing.
+    """
+    def save_capacity(self, capacity: dict):
+        """Replaces the stored state with a full capacity dict."""
+
+    def load_capacity(self) -> dict | None:
+        """Returns the stored capacity dict, or None if nothing is stored."""
+        return None
+
+    def batch(self):
+        """Context manager committing the writes of its block together. Each write stays atomic on
+        its own: a failing write stores nothing, and the writes before it are kept."""
+        return contextlib.nullcontext()
+
+    def set_resource_state(self, swarmid: str, msid: str, restype: str, resid: str, rstate: dict):
+        """Stores the per-swarm state counters of one resource."""
+
+    def state_change(self, swarmid: str, msid: str, restype: str, resid: str, count: int,
+                     from_state: str, to_state: str, scope: str, deltas: dict):
+        """Moves count from from_state to to_state for the swarm resource and for the global
+        counters of scope ("flavour", "raw" or "edge"), where deltas maps each counter key
+        to its amount per unit."""
+
+    def state_change_bulk(self, changes: list, from_state: str, to_state: str):
+        """Applies [(swarmid, msid, restype, resid, count, scope, deltas), ...] like state_change.
+        Backends should apply them in one transaction, so a failing change stores none of them."""
+        for swarmid, msid, restype, resid, count, scope, deltas in changes:
+            self.state_change(swarmid, msid, restype, resid, count, from_state, to_state, scope, deltas)
+
+    def adjust_capacity(self, scope: str, key: str, delta: int):
+        """Adds delta to the init and free global counters of key in scope ("flavour", "raw" or "edge")."""
+
+    def put_offer(self, swarmid: str, msid: str, offerid: str, offer):
+        """Stores (or replaces) one offer."""
+
+    def delete_offers(self, swarmid: str | None = None, msid: str | None = None, offerid: str | None = None):
+        """Deletes the offers matching the given ids; None matches all."""
+
+    def delete_resources(self, swarmid: str):
+        """Deletes all per-swarm resource states of a swarm."""
+
+def _to_json(value):
+    if isinstance(value, Mapping):
+        return dict(value.items())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _dumps(value) -> str:
+    return json.dumps(value, separators=(",", ":"), default=_to_json)
+
+class SQLiteStorage(RegistryStorage):
+    """
+    SQLite backend (file path or ":memory:") with indexed tables for catalog entries,
+    global counters, per-swarm resource states and offers. The connection is shared by
+    threads and guarded by a lock. Every write is a savepoint, so it can be undone alone
+    inside a batch, and only the outermost savepoint commits.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE IF NOT EXISTS catalog (
+            restype TEXT, resid TEXT, provider TEXT, data TEXT,
+            PRIMARY KEY (restype, resid));
+        CREATE INDEX IF NOT EXISTS catalog_provider ON catalog (provider);
+        CREATE TABLE IF NOT EXISTS counters (
+            scope TEXT, key TEXT, state TEXT, amount INTEGER,
+            PRIMARY KEY (scope, key, state));
+        CREATE TABLE IF NOT EXISTS resources (
+            swarm TEXT, ms TEXT, restype TEXT, resid TEXT,
+            free INTEGER DEFAULT 0, reserved INTEGER DEFAULT 0, assigned INTEGER DEFAULT 0, allocated INTEGER DEFAULT 0,
+            PRIMARY KEY (swarm, ms, restype, resid));
+        CREATE INDEX IF NOT EXISTS resources_resource ON resources (restype, resid);
+        CREATE TABLE IF NOT EXISTS offers (
+            swarm TEXT, ms TEXT, offer_id TEXT, restype TEXT, resid TEXT, data TEXT,
+            PRIMARY KEY (swarm, ms, offer_id));
+        CREATE INDEX IF NOT EXISTS offers_resource ON offers (restype, resid);
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        import sqlite3
+        self.path = path
+        # transactions are opened by the savepoints of transaction() and batch()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.executescript(self.SCHEMA)
+        # reentrant, as writes are nested in batches
+        self.lock = threading.RLock()
+        self.depth = 0
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    @contextlib.contextmanager
+    def _savepoint(self, keep_on_error: bool):
+        with self.lock:
+            savepoint = f"sp{self.depth}"
+            self.conn.execute(f"SAVEPOINT {savepoint}")
+            self.depth += 1
+            try:
+                yield
+            except BaseException:
+                if not keep_on_error:
+                    self.conn.execute(f"ROLLBACK TO {savepoint}")
+                raise
+            finally:
+                self.depth -= 1
+                self.conn.execute(f"RELEASE {savepoint}")
+
+    def transaction(self):
+        """Context manager applying the writes of its block all-or-nothing."""
+        return self._savepoint(keep_on_error=False)
+
+    def batch(self):
+        # the writes completed before a failing one were applied to the registry, so they are kept
+        return self._savepoint(keep_on_error=True)
+
+    def save_capacity(self, capacity: dict):
+        with self.transaction():
+            for table in ("meta", "catalog", "counters", "resources", "offers"):
+                self.conn.execute(f"DELETE FROM {table}")
+            catalog_rows, counter_rows = [], []
+            if "cloud" in capacity:
+                cloud_type = capacity["cloud"]["type"]
+                self.conn.execute("INSERT INTO meta VALUES ('cloud_type', ?)", (cloud_type,))
+                for resid, data in capacity["cloud"]["flavours"].items():
+                    catalog_rows.append(("cloud", resid, data.get("resource.provider"), _dumps(data)))
+                for state, amounts in capacity["cloud"][cloud_type].items():
+                    counter_rows.extend((cloud_type, key, state, amount) for key, amount in amounts.items())
+            if "edge" in capacity:
+                self.conn.execute("INSERT INTO meta VALUES ('edge', '1')")
+                for resid, data in capacity["edge"]["capacities"].items():
+                    catalog_rows.append(("edge", resid, data.get("resource.provider"), _dumps(data)))
+                for state, amounts in capacity["edge"]["instances"].items():
+                    counter_rows.extend(("edge", key, state, amount) for key, amount in amounts.items())
+            self.conn.executemany("INSERT INTO catalog VALUES (?, ?, ?, ?)", catalog_rows)
+            self.conn.executemany("INSERT INTO counters VALUES (?, ?, ?, ?)", counter_rows)
+            self.conn.executemany("INSERT INTO resources VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [
+                (swarmid, msid, restype, resid, *[rstate.get(state, 0) for state in STATES])
+                for swarmid, swarm in capacity.get("swarms", {}).items()
+                for msid, ms in swarm.items()
+                for restype, resources in ms.items()
+                for resid, rstate in resources.items()])
+            for swarmid, swarm_offers in capacity.get("offers", {}).items():
+                for msid, ms_offers in swarm_offers.items():
+                    for offerid, offer in ms_offers.items():
+                        self._insert_offer(swarmid, msid, offerid, offer)
+
+    def load_capacity(self) -> dict | None:
+        """Returns the stored capacity dict, or None if nothing is stored.
+        The whole state is read at once, so restoring takes time and memory in proportion
+        to the catalog, the counters, the swarm resources and the offers.
+        """
+        with self.lock:
+            return self._load_capacity()
+
+    def _load_capacity(self) -> dict | None:
+        meta = dict(self.conn.execute("SELECT key, value FROM meta"))
+        if not meta:
+            return None
+        capacity = {"swarms": dict(), "offers": dict()}
+        if "cloud_type" in meta:
+            cloud_type = meta["cloud_type"]
+            capacity["cloud"] = {"flavours": dict(), "type": cloud_type, cloud_type: dict()}
+        if "edge" in meta:
+            capacity["edge"] = {"capacities": dict(), "instances": dict()}
+        for restype, resid, data in self.conn.execute("SELECT restype, resid, data FROM catalog ORDER BY rowid"):
+            section = capacity["cloud"]["flavours"] if restype == "cloud" else capacity["edge"]["capacities"]
+            section[resid] = json.loads(data)
+        for scope, key, state, amount in self.conn.execute("SELECT scope, key, state, amount FROM counters ORDER BY rowid"):
+            section = capacity["edge"]["instances"] if scope == "edge" else capacity["cloud"][scope]
+            section.setdefault(state, dict())[key] = amount
+        for row in self.conn.execute("SELECT swarm, ms, restype, resid, free, reserved, assigned, allocated FROM resources ORDER BY rowid"):
+            swarmid, msid, restype, resid = row[:4]
+            resources = capacity["swarms"].setdefault(swarmid, dict()).setdefault(msid, dict()).setdefault(restype, dict())
+            resources[resid] = dict(zip(STATES, row[4:]))
+            # swarms whose offers were all rejected still have an (empty) offers entry
+            capacity["offers"].setdefault(swarmid, dict())
+        for swarmid, msid, offerid, data in self.conn.execute("SELECT swarm, ms, offer_id, data FROM offers ORDER BY rowid"):
+            capacity["offers"].setdefault(swarmid, dict()).setdefault(msid, dict())[offerid] = json.loads(data)
+        return capacity
+
+    def set_resource_state(self, swarmid: str, msid: str, restype: str, resid: str, rstate: dict):
+        with self.transaction():
+            self.conn.execute(
+                "INSERT INTO resources VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (swarm, ms, restype, resid) DO UPDATE SET "
+                "free = excluded.free, reserved = excluded.reserved, assigned = excluded.assigned, allocated = excluded.allocated",
+                (swarmid, msid, restype, resid, *[rstate.get(state, 0) for state in STATES]))
+
+    def _state_change(self, swarmid: str, msid: str, restype: str, resid: str, count: int,
+                      from_state: str, to_state: str, scope: str, deltas: dict):
+        # states are column names, so they are validated before being formatted into SQL
+        if from_state not in STATES or to_state not in STATES:
+            raise ValueError(f"Unknown state transition '{from_state}' -> '{to_state}'")
+        assignments = f"{from_state} = {from_state} - ?" + (f", {to_state} = {to_state} + ?" if to_state != "free" else "")
+        parameters = [count] + ([count] if to_state != "free" else [])
+        cursor = self.conn.execute(
+            f"UPDATE resources SET {assignments} WHERE swarm = ? AND ms = ? AND restype = ? AND resid = ? AND {from_state} >= ?",
+            parameters + [swarmid, msid, restype, resid, count])
+        if cursor.rowcount != 1:
+            raise ValueError(f"Stored state of '{resid}' in swarm '{swarmid}', ms '{msid}' cannot move {count} from '{from_state}'")
+        self.conn.executemany("UPDATE counters SET amount = amount + ? WHERE scope = ? AND key = ? AND state = ?",
+                              [(sign * amount * count, scope, key, state)
+                               for key, amount in deltas.items()
+                               for sign, state in ((-1, from_state), (1, to_state))])
+
+    def state_change(self, swarmid: str, msid: str, restype: str, resid: str, count: int,
+                     from_state: str, to_state: str, scope: str, deltas: dict):
+        with self.transaction():
+            self._state_change(swarmid, msid, restype, resid, count, from_state, to_state, scope, deltas)
+
+    def state_change_bulk(self, changes: list, from_state: str, to_state: str):
+        with self.transaction():
+            for swarmid, msid, restype, resid, count, scope, deltas in changes:
+                self._state_change(swarmid, msid, restype, resid, count, from_state, to_state, scope, deltas)
+
+    def adjust_capacity(self, scope: str, key: str, delta: int):
+        with self.transaction():
+            self.conn.executemany(
+                "INSERT INTO counters VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (scope, key, state) DO UPDATE SET amount = amount + excluded.amount",
+                [(scope, key, state, delta) for state in ("init", "free")])
+
+    def _insert_offer(self, swarmid: str, msid: str, offerid: str, offer):
+        first = offer[0] if isinstance(offer, list) and offer else offer
+        ids = first.get("ids", {}) if isinstance(first, Mapping) else {}
+        self.conn.execute("INSERT OR REPLACE INTO offers VALUES (?, ?, ?, ?, ?, ?)",
+                          (swarmid, msid, offerid, ids.get("res_type"), ids.get("res_id"), _dumps(offer)))
+
+    def put_offer(self, swarmid: str, msid: str, offerid: str, offer):
+        with self.transaction():
+            self._insert_offer(swarmid, msid, offerid, offer)
+
+    def delete_offers(self, swarmid: str | None = None, msid: str | None = None, offerid: str | None = None):
+        conditions, parameters = [], []
+        for column, value in (("swarm", swarmid), ("ms", msid), ("offer_id", offerid)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                parameters.append(value)
+        with self.transaction():
+            self.conn.execute("DELETE FROM offers" + (" WHERE " + " AND ".join(conditions) if conditions else ""), parameters)
+
+    def delete_resources(self, swarmid: str):
+        with self.transaction():
+            self.conn.execute("DELETE FROM resources WHERE swarm = ?", (swarmid,))
+
+    def swarms_holding(self, restype: str, resid: str, states: list | None = None) -> list:
+        """
+        Returns the swarms holding a non-zero amount of a resource in any of the states
+        (default: reserved, assigned, allocated).
+        """
+        states = [state for state in (states or ["reserved", "assigned", "allocated"]) if state in STATES]
+        held = " + ".join(states) if states else "0"
+        with self.lock:
+            return [row[0] for row in self.conn.execute(
+                f"SELECT DISTINCT swarm FROM resources WHERE restype = ? AND resid = ? AND ({held}) > 0 ORDER BY swarm",
+                (restype, resid))]
+
+    def resources_of_provider(self, provider: str, state: str = "allocated") -> list:
+        """
+        Returns [{"swarm", "ms", "restype", "resid", "count"}] of the resources of a provider
+        with a non-zero amount in state.
+        """
+        if state not in STATES:
+            raise ValueError(f"Unknown state '{state}'")
+        with self.lock:
+            return [dict(zip(("swarm", "ms", "restype", "resid", "count"), row)) for row in self.conn.execute(
+                f"SELECT r.swarm, r.ms, r.restype, r.resid, r.{state} FROM resources r "
+                f"JOIN catalog c ON c.restype = r.restype AND c.resid = r.resid "
+                f"WHERE c.provider = ? AND r.{state} > 0 ORDER BY r.swarm, r.ms, r.resid",
+                (provider.lower(),))]
@@ -0,0 +1,298 @@
+"""
+API-call trace recorder and deterministic replayer.
+
+A TraceRecorder (SwChCapacityRegistry.start_trace_recording) logs every public call of one
+registry with its arguments to an NDJSON trace file (gzip-compressed if the name ends in
+.gz). The first line holds the registry state when recording started, the last one a
+digest of the state when it stopped:
+
+    {"trace": 1, "ra_id": "ra-1", "capacity": {...}}
+    {"t": 0.0123, "m": "resource_offer_accept", "a": ["ra-1_swarm1_ms1_m2-small", {...}], "k": {}}
+    ...
+    {"end": "<sha256 of the final state>", "calls": 1234}
+
+Only outermost calls are recorded, so calls a method makes internally are not replayed twice.
+Calls of generator methods (resource_offer_generate_iter_*) get a generator number "g", and
+every item the consumer takes and an early close are recorded in between the other calls,
+so the replay advances the generator exactly where the recorded consumer did:
+
+    {"t": 0.0150, "m": "resource_offer_generate_iter_from_SAT_file", "a": ["swarm1", "app.yaml"], "k": {}, "g": 0}
+    {"t": 0.0151, "next": 0}
+    {"t": 0.0153, "m": "resource_offer_accept", "a": [...], "k": {}}
+    {"t": 0.0154, "close": 0}
+The TraceReplayer re-runs a trace on fresh registries, one per thread, at full speed or
+time-scaled, and reports throughput, latency percentiles and whether every replica ended
+in the recorded state.
+
+    python -m swch_capreg replay trace.ndjson.gz --threads 4 --speed 0
+"""
+import argparse
+import functools
+import gzip
+import hashlib
+import inspect
+import io
+import json
+import logging
+import threading
+import time
+from .methods import METHODS
+from .metrics import unwrap_method
+from .ndjson import _to_json
+from .loadtest import percentile
+
+#public state-changing methods recorded next to METHODS
+TRACED_METHODS = list(METHODS) + ["resource_state_init_amount", "resource_state_change", "resource_state_change_bulk"]
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def _dumps(value) -> str:
+    return json.dumps(value, separators=(",", ":"), default=_to_json)
+
+def state_digest(capacity: dict) -> str:
+    """
+    Returns the SHA-256 of the canonical JSON form of a capacity dict.
+    """
+    return hashlib.sha256(json.dumps(capacity, sort_keys=True, separators=(",", ":"), default=_to_json).encode()).hexdigest()
+
+class TraceRecorder:
+
+    def __init__(self, capreg, path: str):
+        self.capreg = capreg
+        self.path = path
+        self.fp = _open(path, "w")
+        self.calls = 0
+        self.generators = 0
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.fp.write(_dumps({"trace": 1, "ra_id": capreg.ra_id, "capacity": capreg.capacity}) + "\n")
+        self.started = time.perf_counter()
+
+    def instrument(self, methods: list = TRACED_METHODS):
+        for name in methods:
+            setattr(self.capreg, name, self._wrap(name, getattr(self.capreg, name)))
+
+    def uninstrument(self, methods: list = TRACED_METHODS):
+        for name in reversed(methods):
+            unwrap_method(self.capreg, name)
+
+    def close(self) -> str:
+        """
+        Writes the end record with the digest of the current registry state and closes the trace.
+        """
+        digest = state_digest(self.capreg.capacity)
+        with self.lock:
+            self.fp.write(_dumps({"end": digest, "calls": self.calls}) + "\n")
+            self.fp.close()
+        return digest
+
+    def record(self, name: str, args: tuple, kwargs: dict, generator: bool = False) -> int | None:
+        record = {"t": round(time.perf_counter() - self.started, 6), "m": name, "a": list(args), "k": kwargs}
+        with self.lock:
+            if generator:
+                record["g"] = self.generators
+                self.generators += 1
+            self.fp.write(_dumps(record) + "\n")
+            self.calls += 1
+        return record.get("g")
+
+    def record_step(self, step: str, generator: int):
+        line = _dumps({"t": round(time.perf_counter() - self.started, 6), step: generator})
+        with self.lock:
+            self.fp.write(line + "\n")
+
+    def _wrap(self, name: str, method):
+        signature = inspect.signature(method)
+        takes_fp = "fp" in signature.parameters
+
+        def record_call(args: tuple, kwargs: dict, generator: bool = False):
+            if takes_fp:
+                #NDJSON loaders read fp, so its content is recorded; writers get a fresh buffer on replay
+                bound = signature.bind(*args, **kwargs)
+                fp = bound.arguments.pop("fp")
+                content = fp.read() if name.startswith("load_") else None
+                number = self.record(name, bound.args, dict(bound.kwargs, fp=content), generator)
+                return bound.args, dict(bound.kwargs, fp=io.StringIO(content) if content is not None else fp), number
+            return args, kwargs, self.record(name, args, kwargs, generator)
+
+        if inspect.isgeneratorfunction(method):
+            @functools.wraps(method)
+            def recorded_generator(*args, **kwargs):
+                #the depth is raised only while the generator runs, not while the consumer handles an item
+                depth = getattr(self.local, "depth", 0)
+                number = None
+                if depth == 0:
+                    args, kwargs, number = record_call(args, kwargs, generator=True)
+                iterator = method(*args, **kwargs)
+                finished = False
+                try:
+                    while True:
+                        if number is not None:
+                            self.record_step("next", number)
+                        self.local.depth = depth + 1
+                        try:
+                            item = next(iterator)
+                        except StopIteration:
+                            finished = True
+                            return
+                        finally:
+                            self.local.depth = depth
+                        yield item
+                finally:
+                    if not finished:
+                        if number is not None:
+                            self.record_step("close", number)
+                        self.local.depth = depth + 1
+                        try:
+                            iterator.close()
+                        finally:
+                            self.local.depth = depth
+            return recorded_generator
+
+        @functools.wraps(method)
+        def recorded(*args, **kwargs):
+            depth = getattr(self.local, "depth", 0)
+            if depth == 0:
+                args, kwargs, _ = record_call(args, kwargs)
+            self.local.depth = depth + 1
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.local.depth = depth
+        return recorded
+
+class TraceReplayer:
+
+    def __init__(self, path: str, logger: logging.Logger | None = None):
+        self.path = path
+        if logger is None:
+            logger = logging.getLogger("swch_capreg.replay")
+            logger.setLevel(logging.WARNING)
+        self.logger = logger
+        with _open(path, "r") as fp:
+            self.header = json.loads(fp.readline())
+            self.calls = []
+            self.end = None
+            for line in fp:
+                record = json.loads(line)
+                if "end" in record:
+                    self.end = record["end"]
+                else:
+                    self.calls.append(record)
+
+    def fresh_registry(self):
+        from .capacity_registry import SwChCapacityRegistry
+        capreg = SwChCapacityRegistry(self.header["ra_id"], self.logger)
+        capreg.capacity = json.loads(_dumps(self.header["capacity"]))
+        capreg._rebuild_mirrors()
+        return capreg
+
+    def replay_once(self, speed: float = 0.0, start: float | None = None) -> dict:
+        """
+        Replays all calls on a fresh registry. With speed > 0, call i is not issued before
+        start + t_i / speed (speed 1 is the recorded pace), otherwise calls run back to back.
+        """
+        capreg = self.fresh_registry()
+        latencies, methods, errors = [], [], 0
+        #generator number -> (method name, open generator)
+        generators = dict()
+        start = time.perf_counter() if start is None else start
+        for call in self.calls:
+            if speed > 0:
+                delay = start + call["t"] / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            started = time.perf_counter()
+            if "m" not in call:
+                number = call.get("next", call.get("close"))
+                if number not in generators:
+                    continue
+                name, generator = generators[number]
+                try:
+                    if "next" in call:
+                        next(generator)
+                    else:
+                        generator.close()
+                        del generators[number]
+                except StopIteration:
+                    del generators[number]
+                except Exception as e:
+                    errors += 1
+                    del generators[number]
+                    self.logger.warning(f"Replaying '{name}' failed: {e}")
+                latencies.append(time.perf_counter() - started)
+                methods.append(name)
+                continue
+            kwargs = dict(call["k"])
+            if "fp" in kwargs:
+                kwargs["fp"] = io.StringIO(kwargs["fp"] or "")
+            try:
+                result = getattr(capreg, call["m"])(*call["a"], **kwargs)
+                if "g" in call:
+                    #advanced by the recorded next/close steps
+                    generators[call["g"]] = (call["m"], result)
+                elif hasattr(result, "__next__"):
+                    for _ in result:
+                        pass
+            except Exception as e:
+                errors += 1
+                self.logger.warning(f"Replaying '{call['m']}' failed: {e}")
+            latencies.append(time.perf_counter() - started)
+            methods.append(call["m"])
+        return {"latencies": latencies, "methods": methods, "errors": errors,
+                "digest": state_digest(capreg.capacity)}
+
+    def run(self, threads: int = 1, speed: float = 0.0) -> dict:
+        """
+        Replays the trace on `threads` independent registries in parallel threads.
+        """
+        results = [None] * threads
+        barrier = threading.Barrier(threads + 1)
+        def worker(index):
+            barrier.wait()
+            results[index] = self.replay_once(speed, start)
+        workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+        for thread in workers:
+            thread.start()
+        start = time.perf_counter()
+        barrier.wait()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        latencies = [latency for result in results for latency in result["latencies"]]
+        per_method = dict()
+        for result in results:
+            for method, latency in zip(result["methods"], result["latencies"]):
+                per_method.setdefault(method, []).append(latency)
+        return {
+            "trace": self.path,
+            "calls": len(latencies),
+            "threads": threads,
+            "speed": speed,
+            "errors": sum(result["errors"] for result in results),
+            "seconds": elapsed,
+            "calls_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+            "latency": {"p50": percentile(latencies, 50), "p90": percentile(latencies, 90),
+                        "p99": percentile(latencies, 99), "max": max(latencies, default=0.0)},
+            "methods": dict((method, {"calls": len(values), "p50": percentile(values, 50), "p99": percentile(values, 99)})
+                            for method, values in sorted(per_method.items())),
+            "state_match": None if self.end is None else all(result["digest"] == self.end for result in results),
+        }
+
+def main(argv: list | None = None):
+    parser = argparse.ArgumentParser(prog="python -m swch_capreg replay",
+                                     description="Replay a recorded API-call trace against fresh registries.")
+    parser.add_argument("trace", help="trace file written by start_trace_recording")
+    parser.add_argument("--threads", type=int, default=1, help="number of registries replayed in parallel")
+    parser.add_argument("--speed", type=float, default=0.0, help="time scale (1 = recorded pace, 0 = full speed)")
+    options = parser.parse_args(argv)
+    report = TraceReplayer(options.trace).run(options.threads, options.speed)
+    print(json.dumps(report, indent=2))
+    return report
+
+if __name__ == "__main__":
+    main()
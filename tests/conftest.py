@@ -0,0 +1,42 @@
+"""
+Shared helpers of the pytest tests.
+
+Capacities are given in the form read_capacity_from_file returns and SAT requirements
+in the form Sardou's get_requirements returns, so the tests run without TOSCA files.
+"""
+import copy
+import logging
+import pytest
+from swch_capreg import SwChCapacityRegistry
+
+logger = logging.getLogger("swch_capreg.tests")
+logger.setLevel(logging.WARNING)
+
+def flavour(cpus: int, mem: int, disk: int, provider: str = "SZTAKI", city: str = "budapest", **host) -> dict:
+    return {"host": dict({"num-cpus": cpus, "mem-size": mem, "disk-size": disk}, **host),
+            "resource": {"provider": provider}, "pricing": {"cost": 0.0}, "locality": {"city": city}}
+
+def requirement(cpus: int = 1, mem: int = 1, colocated: list | None = None) -> dict:
+    return {"expression": f"lambda d: d['host.num-cpus'] >= {cpus} and d['host.mem-size'] >= {mem}",
+            "properties": {}, "colocated": colocated or []}
+
+FLAVOURS = {"m2-small": flavour(1, 1, 10), "m2-medium": flavour(2, 2, 20), "m2-large": flavour(4, 4, 40)}
+RAW_CAPACITY = {"cloud_flavours": FLAVOURS,
+                "cloud_capacity_raw": {"num-cpus": "100", "mem-size": "1000", "disk-size": "10000"}}
+FLAVOUR_CAPACITY = {"cloud_flavours": FLAVOURS,
+                    "cloud_capacity_flavour": {"m2-small": 5, "m2-medium": 3, "m2-large": 1}}
+EDGE_CAPACITY = {"edge_instances": {"e1": flavour(2, 2, 20, "FUEL"), "e2": flavour(4, 4, 40, "FUEL")}}
+
+def use_requirements(capreg: SwChCapacityRegistry, requirements: dict):
+    """Makes every SAT file name resolve to the given requirements."""
+    capreg.extract_application_requirements_from_SAT_file = lambda filename: copy.deepcopy(requirements)
+
+@pytest.fixture
+def make_registry():
+    def make(capacity: dict, requirements: dict | None = None, ra_id: str = "ra1", **options) -> SwChCapacityRegistry:
+        capreg = SwChCapacityRegistry(ra_id, logger, **options)
+        capreg.initialize(copy.deepcopy(capacity))
+        if requirements is not None:
+            use_requirements(capreg, requirements)
+        return capreg
+    return make
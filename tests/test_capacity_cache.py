@@ -0,0 +1,44 @@
+import copy
+import os
+import sys
+import types
+import pytest
+from conftest import RAW_CAPACITY, logger
+from swch_capreg import SwChCapacityRegistry
+
+@pytest.fixture
+def sardou(monkeypatch):
+    """A Sardou module that returns RAW_CAPACITY for any CDT and counts the parses."""
+    module = types.ModuleType("sardou")
+    module.__version__ = "0.10.0"
+    module.parses = 0
+
+    class Sardou:
+        def __init__(self, path=None, content=None):
+            module.parses += 1
+
+        def get_capacities(self):
+            return copy.deepcopy(RAW_CAPACITY)
+
+    module.Sardou = Sardou
+    monkeypatch.setitem(sys.modules, "sardou", module)
+    return module
+
+def test_unchanged_cdt_is_read_from_the_cache(sardou, tmp_path):
+    cdt, cache_dir = tmp_path / "capacity.yaml", str(tmp_path / "cache")
+    cdt.write_text("capacity: 1\n")
+    capreg = SwChCapacityRegistry("ra1", logger)
+    capreg.initialize_capacity_from_file(str(cdt), cache_dir)
+    expected = copy.deepcopy(capreg.capacity)
+    capreg.initialize_capacity_from_file(str(cdt), cache_dir)
+    assert sardou.parses == 1 and capreg.capacity == expected
+    capreg.initialize_capacity_by_content("capacity: 1\n", cache_dir)
+    assert sardou.parses == 1
+
+    cdt.write_text("capacity: 2\n")
+    capreg.initialize_capacity_from_file(str(cdt), cache_dir)
+    assert sardou.parses == 2
+    #another Sardou release may parse the same CDT differently
+    sardou.__version__ = "0.11.0"
+    capreg.initialize_capacity_from_file(str(cdt), cache_dir)
+    assert sardou.parses == 3 and len(os.listdir(cache_dir)) == 3
@@ -0,0 +1,50 @@
+import copy
+import io
+import pickle
+import pytest
+from conftest import EDGE_CAPACITY, FLAVOUR_CAPACITY, flavour, logger, requirement, use_requirements
+from swch_capreg import SwChCapacityRegistry
+from swch_capreg.res_cap import CatalogRecord, ResCap
+
+ENTRIES = [flavour(1, "2", "10"), flavour(4, 4, 40, "FUEL", "Ljubljana", gpus=1), {"host": {"num-cpus": 2}, "flat": "X"}]
+
+@pytest.mark.parametrize("data", ENTRIES)
+def test_compact_record_behaves_like_the_parsed_dict(data):
+    rescap = ResCap()
+    for entry in ENTRIES:
+        rescap.parse_compact(entry)
+    expected, record = ResCap().parse(data), rescap.parse_compact(data)
+    assert isinstance(record, CatalogRecord)
+    assert record == expected and expected == record
+    #keys follow the slot order of the shared schema, which may differ from the order in the entry
+    assert len(record) == len(expected) and sorted(record) == sorted(expected)
+    assert sorted(record.keys()) == sorted(expected.keys())
+    assert sorted(map(repr, record.values())) == sorted(map(repr, expected.values()))
+    assert sorted(record.items(), key=repr) == sorted(expected.items(), key=repr)
+    for key in expected:
+        assert key in record and record[key] == expected[key] and record.get(key) == expected[key]
+    assert "host.missing" not in record and record.get("host.missing", 0) == 0
+    with pytest.raises(KeyError):
+        record["host.missing"]
+    #requirement lambdas may use any Mapping method
+    assert (lambda d: len(list(d.values())) == len(d.keys()))(record)
+    assert pickle.loads(pickle.dumps(record)) == expected
+
+def compact_registry(capacity: dict, compact: bool) -> SwChCapacityRegistry:
+    capreg = SwChCapacityRegistry("ra1", logger)
+    capreg.compact_catalog = compact
+    capreg.initialize(copy.deepcopy(capacity))
+    use_requirements(capreg, {"one": requirement(2, 2), "two": {"expression": "lambda d: 'sztaki' in d.values()", "properties": {}, "colocated": []}})
+    return capreg
+
+def test_compact_catalog_dumps_like_the_dict_catalog():
+    capacity = dict(FLAVOUR_CAPACITY, **EDGE_CAPACITY)
+    plain, compact = compact_registry(capacity, False), compact_registry(capacity, True)
+    assert isinstance(next(iter(compact.capacity["cloud"]["flavours"].values())), CatalogRecord)
+    assert compact.resource_offer_generate_from_SAT_file("swarm1", "app.yaml") == plain.resource_offer_generate_from_SAT_file("swarm1", "app.yaml")
+    assert "two" in compact.capacity["offers"]["swarm1"]
+    assert compact.save_capacity_registry_as_yaml() == plain.save_capacity_registry_as_yaml()
+    plain_fp, compact_fp = io.StringIO(), io.StringIO()
+    plain.save_capacity_registry_as_ndjson(plain_fp)
+    compact.save_capacity_registry_as_ndjson(compact_fp)
+    assert compact_fp.getvalue() == plain_fp.getvalue()
@@ -0,0 +1,69 @@
+import copy
+import time
+from conftest import EDGE_CAPACITY, FLAVOUR_CAPACITY, requirement
+
+CAPACITY = dict(FLAVOUR_CAPACITY, **EDGE_CAPACITY)
+REQUIREMENTS = {"one": requirement(1, 1), "two": requirement(4, 4)}
+
+def apply_events(events: list, holdings: dict, offers: dict):
+    """Keeps a consumer-side mirror of the swarm holdings and offer ids from change events."""
+    for event in events:
+        if event["event"] in ("state", "init_amount"):
+            resources = holdings.setdefault(event["swarm"], dict()).setdefault(event["ms"], dict()).setdefault(event["type"], dict())
+            rstate = resources.setdefault(event["resource"], {"free": 0, "reserved": 0, "assigned": 0, "allocated": 0})
+            if event["event"] == "init_amount":
+                rstate[event["to"]] = event["count"]
+                continue
+            rstate[event["from"]] -= event["count"]
+            if event["to"] != "free":
+                rstate[event["to"]] += event["count"]
+        elif event["event"] == "offer_added":
+            offers.setdefault(event["swarm"], set()).add(event["offer"])
+        elif event["event"] == "offer_removed":
+            offers[event["swarm"]].discard(event["offer"])
+        elif event["event"] == "swarm_removed":
+            holdings.pop(event["swarm"], None)
+            offers.pop(event["swarm"], None)
+
+def test_consumer_mirror_follows_the_registry(make_registry):
+    capreg = make_registry(CAPACITY, REQUIREMENTS)
+    subscription = capreg.subscribe_changes()
+    offers = capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml", {"one": 2})
+    (one_id, one), (two_id, two) = next(iter(offers["one"].items())), next(iter(offers["two"].items()))
+    capreg.resource_offer_accept(one_id, one)
+    capreg.resource_offer_reject(two_id, two)
+    res_set = capreg.resource_set_get_from_offer(one_id, one)
+    capreg.resource_set_deployed("swarm1", "one", res_set["restype"], res_set["resid"], 1)
+    capreg.resource_offer_generate_from_SAT_file("swarm2", "app.yaml")
+    capreg.resource_offer_generate_from_SAT_file("swarm2", "app.yaml", {"two": 1})
+
+    events = subscription.drain()
+    assert [event["seq"] for event in events] == list(range(events[0]["seq"], events[0]["seq"] + len(events)))
+    holdings, offer_ids = dict(), dict()
+    apply_events(events, holdings, offer_ids)
+    assert holdings == capreg.capacity["swarms"]
+    assert offer_ids == dict((swarmid, set(offerid for ms in swarm.values() for offerid in ms))
+                             for swarmid, swarm in capreg.capacity["offers"].items())
+    capreg.resources_and_offers_destroy_all("swarm2")
+    events = subscription.drain()
+    assert events[-1]["event"] == "swarm_removed" and events[-1]["swarm"] == "swarm2"
+    apply_events(events, holdings, offer_ids)
+    assert "swarm2" not in offer_ids and holdings == capreg.capacity["swarms"]
+    assert subscription.dropped == 0
+
+def test_full_queue_drops_and_reset_and_unsubscribe(make_registry):
+    capreg = make_registry(CAPACITY, REQUIREMENTS)
+    #by default a full queue drops events instead of holding up the registry
+    subscription = capreg.subscribe_changes(maxsize=1)
+    started = time.perf_counter()
+    capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml")
+    assert time.perf_counter() - started < 0.5
+    assert len(subscription.drain()) == 1 and subscription.dropped > 0
+    capreg.initialize(copy.deepcopy(CAPACITY))
+    assert [event["event"] for event in subscription.drain()] == ["reset"]
+    capreg.unsubscribe_changes(subscription)
+    assert subscription.closed and capreg.change_feed.subscriptions == []
+    #without subscribers no events are built, so sequence numbers do not advance
+    seq = capreg.change_feed.seq
+    capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml")
+    assert capreg.change_feed.seq == seq
@@ -0,0 +1,38 @@
+from swch_capreg import SwChCapacityRegistry
+import yaml
+import pprint
+
+if __name__ == "__main__":
+    capreg = SwChCapacityRegistry("ra-sztaki-cloud-hu")
+    capreg.initialize_capacity_from_file("sztaki-capacity-raw.yaml")
+    capreg.dump_capacity_registry_info()
+
+    sat_filename = "BookInfo-simple.yaml"
+
+    ######################################################
+    # TEST1: planning flavours for a multi-instance SAT
+    ######################################################
+
+    #Planning the flavour assignment of the whole SAT against the raw pool without reserving anything
+    instance_counts = {"one": 3, "two": 10}
+    requirements = capreg.extract_application_requirements_from_SAT_file(sat_filename)
+    matching_resources = capreg.calculate_matching_resources(requirements)
+    plan = capreg.plan_raw_flavour_assignment(matching_resources, instance_counts)
+    print("Planned flavour assignment:")
+    pprint.pprint(plan)
+
+    ######################################################
+    # TEST2: generating offers with the planned instance counts
+    ######################################################
+
+    #Generating offers for 'swarm1', only the planned flavour is reserved for each ms
+    swarmid="swarm1"
+    generated_offers = capreg.resource_offer_generate_from_SAT_file(swarmid, sat_filename, instance_counts)
+    print("Generated offers:")
+    print(yaml.dump(generated_offers))
+    capreg.dump_capacity_registry_info()
+
+    #Releasing all resources for demonstration purposes
+    swarmid="swarm1"
+    capreg.resources_and_offers_destroy_all(swarmid)
+    capreg.dump_capacity_registry_info()
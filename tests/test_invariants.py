@@ -0,0 +1,68 @@
+import copy
+import pytest
+from conftest import EDGE_CAPACITY, FLAVOUR_CAPACITY, RAW_CAPACITY, requirement
+from swch_capreg.storage import SQLiteStorage
+
+REQUIREMENTS = {"one": requirement(1, 1), "two": requirement(2, 2)}
+
+@pytest.mark.parametrize("capacity", [FLAVOUR_CAPACITY, RAW_CAPACITY, EDGE_CAPACITY])
+def test_lifecycle_keeps_the_invariants(make_registry, capacity):
+    capreg = make_registry(capacity, REQUIREMENTS)
+    capreg.enable_invariant_checks(raise_on_violation=True)
+    offers = capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml")
+    for msid, ms_offers in offers.items():
+        for offerid, offer in list(ms_offers.items()):
+            capreg.resource_offer_accept(offerid, offer)
+            res_set = capreg.resource_set_get_from_offer(offerid, offer)
+            capreg.resource_set_deployed("swarm1", msid, res_set["restype"], res_set["resid"], res_set["count"])
+    capreg.resource_offer_generate_from_SAT_file("swarm2", "app.yaml")
+    capreg.resources_and_offers_destroy_all("swarm1")
+    assert capreg.audit_invariants() == []
+
+def test_transition_on_corrupted_counters_is_reported(make_registry):
+    capreg = make_registry(FLAVOUR_CAPACITY, REQUIREMENTS)
+    capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml")
+    resid = next(iter(capreg.capacity["swarms"]["swarm1"]["one"]["cloud"]))
+    #a stale free allowance: the global free counter no longer covers the swarm's reservation
+    capreg.capacity["cloud"]["flavour"]["free"][resid] += 1
+    violations = capreg.audit_invariants()
+    assert violations == [f"flavour '{resid}': free + reserved + assigned + allocated = "
+                          f"{capreg.capacity['cloud']['flavour']['init'][resid] + 1}, init = {capreg.capacity['cloud']['flavour']['init'][resid]}"]
+    capreg.enable_invariant_checks(raise_on_violation=True)
+    capreg.capacity["cloud"]["flavour"]["free"][resid] -= 1
+    assert capreg.resource_state_change("swarm1", "one", "cloud", resid, 1, "reserved", "assigned") == 1
+    assert capreg.audit_invariants() == []
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_violating_transition_is_refused_and_changes_nothing(make_registry, bulk):
+    storage = SQLiteStorage()
+    capreg = make_registry(RAW_CAPACITY, REQUIREMENTS, storage=storage)
+    capreg.enable_preemption()
+    capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml")
+    resid = next(iter(capreg.capacity["swarms"]["swarm1"]["one"]["cloud"]))
+    capreg.enable_invariant_checks(raise_on_violation=True)
+    #a stale global counter: the swarm holds more than the global reserved counter says
+    capreg.capacity["cloud"]["raw"]["reserved"]["host.num-cpus"] -= 1
+    capreg.capacity["cloud"]["raw"]["free"]["host.num-cpus"] += 1
+    before, stored = copy.deepcopy(capreg.capacity), storage.load_capacity()
+    heaps = copy.deepcopy(capreg.reservations.heaps)
+    subscription = capreg.subscribe_changes()
+    with pytest.raises(ValueError, match="host.num-cpus"):
+        if bulk:
+            capreg.resource_state_change_bulk([("swarm1", "one", "cloud", resid, 1)], "reserved", "assigned")
+        else:
+            capreg.resource_state_change("swarm1", "one", "cloud", resid, 1, "reserved", "assigned")
+    assert capreg.capacity == before
+    assert storage.load_capacity() == stored
+    assert capreg.reservations.heaps == heaps
+    assert subscription.drain() == []
+
+def test_swarm_totals_must_match_the_global_counters(make_registry):
+    capreg = make_registry(RAW_CAPACITY, REQUIREMENTS)
+    capreg.enable_invariant_checks()
+    capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml")
+    rstate = next(iter(capreg.capacity["swarms"]["swarm1"]["two"]["cloud"].values()))
+    rstate["reserved"] += 1
+    violations = capreg.audit_invariants()
+    assert violations and all("swarms hold" in violation for violation in violations)
+    assert any(violation.startswith("raw 'host.num-cpus'") for violation in violations)
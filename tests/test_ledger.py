@@ -0,0 +1,72 @@
+import copy
+import pytest
+from conftest import EDGE_CAPACITY, FLAVOUR_CAPACITY, RAW_CAPACITY, requirement
+from swch_capreg.storage import SQLiteStorage
+
+pytest.importorskip("numpy")
+from swch_capreg.ledger import ReservationLedger
+
+REQUIREMENTS = {"one": requirement(1, 1), "two": requirement(2, 2)}
+
+def counters(capacity: dict) -> dict:
+    """Returns the global counter sections and swarm holdings of a capacity dict."""
+    sections = dict()
+    if "cloud" in capacity:
+        cloud_type = "raw" if "raw" in capacity["cloud"] else "flavour"
+        sections["cloud"] = {cloud_type: capacity["cloud"][cloud_type]}
+    if "edge" in capacity:
+        sections["edge"] = {"instances": capacity["edge"]["instances"]}
+    return copy.deepcopy(dict(sections, swarms=capacity["swarms"]))
+
+def accepted_changes(capreg, swarmid: str) -> list:
+    offers = capreg.resource_offer_generate_from_SAT_file(swarmid, "app.yaml", {"one": 2, "two": 1})
+    changes = []
+    for msid, ms_offers in offers.items():
+        for offerid, offer in ms_offers.items():
+            capreg.resource_offer_accept(offerid, offer)
+            res_set = capreg.resource_set_get_from_offer(offerid, offer)
+            changes.append((swarmid, msid, res_set["restype"], res_set["resid"], res_set["count"]))
+    return changes
+
+@pytest.mark.parametrize("capacity", [FLAVOUR_CAPACITY, RAW_CAPACITY, EDGE_CAPACITY])
+def test_ledger_mirrors_the_counters(make_registry, capacity):
+    capreg = make_registry(capacity, REQUIREMENTS)
+    capreg.attach_reservation_ledger()
+    changes = accepted_changes(capreg, "swarm1")
+    accepted_changes(capreg, "swarm2")
+    assert capreg.resource_state_change_bulk(changes, "assigned", "allocated") == sum(change[4] for change in changes)
+    capreg.resources_and_offers_destroy_all("swarm2")
+    assert counters(capreg.ledger.views()) == counters(capreg.capacity)
+    summary = capreg.resource_utilisation_summary()
+    assert all(0 < values["used_ratio"] <= 1 for values in summary.get("raw", summary).values() if "used_ratio" in values)
+
+@pytest.mark.parametrize("ledger", [False, True])
+def test_bulk_change_is_all_or_nothing(make_registry, ledger):
+    storage = SQLiteStorage()
+    capreg = make_registry(RAW_CAPACITY, REQUIREMENTS, storage=storage)
+    if ledger:
+        capreg.attach_reservation_ledger()
+    changes = accepted_changes(capreg, "swarm1")
+    before = counters(capreg.capacity)
+    #a short resource rejects the whole batch
+    assert capreg.resource_state_change_bulk(changes + [("swarm1", "one", "cloud", "m2-small", 99)], "assigned", "allocated") is None
+    assert counters(capreg.capacity) == before
+    #a failing storage write in the middle of the batch stores nothing and changes nothing
+    swarmid, msid, restype, resid, _ = changes[-1]
+    storage.conn.execute("UPDATE resources SET assigned = 0 WHERE swarm = ? AND ms = ? AND resid = ?", (swarmid, msid, resid))
+    with pytest.raises(ValueError):
+        capreg.resource_state_change_bulk(changes, "assigned", "allocated")
+    assert counters(capreg.capacity) == before
+    stored = storage.load_capacity()
+    assert all(rstate["allocated"] == 0 for ms in stored["swarms"]["swarm1"].values() for resources in ms.values() for rstate in resources.values())
+    assert all(amount == 0 for amount in stored["cloud"]["raw"]["allocated"].values())
+    if ledger:
+        assert counters(capreg.ledger.views()) == before
+
+@pytest.mark.parametrize("capacity", [FLAVOUR_CAPACITY, RAW_CAPACITY, dict(FLAVOUR_CAPACITY, **EDGE_CAPACITY)])
+def test_summary_without_a_ledger_matches_the_ledger(make_registry, capacity):
+    capreg = make_registry(capacity, REQUIREMENTS)
+    accepted_changes(capreg, "swarm1")
+    summary = capreg.resource_utilisation_summary()
+    assert capreg.ledger is None
+    assert summary == ReservationLedger.from_capacity(capreg.capacity, capreg.calc_res_props).utilisation()
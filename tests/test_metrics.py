@@ -0,0 +1,50 @@
+import re
+from conftest import FLAVOUR_CAPACITY, requirement
+
+REQUIREMENTS = {"one": requirement(1, 1), "two": requirement(4, 4)}
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\\n]|\\.)*)"(?:,|$)')
+
+def parse_exposition(text: str) -> tuple:
+    """Parses Prometheus text format into ({(name, labels): value}, {name: type})."""
+    samples, types = dict(), dict()
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, type = line.split(" ")
+            types[name] = type
+            continue
+        if line.startswith("#"):
+            continue
+        name, labels, value = SAMPLE.match(line).groups()
+        pairs = LABEL.findall(labels or "")
+        assert ",".join(f'{key}="{raw}"' for key, raw in pairs) == (labels or "")
+        unescaped = tuple((key, re.sub(r'\\(.)', lambda m: "\n" if m.group(1) == "n" else m.group(1), raw)) for key, raw in pairs)
+        samples[(name, unescaped)] = float(value)
+    return samples, types
+
+def test_export_parses_and_counts_only_real_events(make_registry):
+    ra_id = 'ra "1"\\eu\nwest'
+    capreg = make_registry(FLAVOUR_CAPACITY, REQUIREMENTS, ra_id=ra_id)
+    collector = capreg.attach_metrics()
+    offers = capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml")
+    generated = sum(len(ms_offers) for ms_offers in offers.values())
+    #an unchanged re-offer yields the same offers again
+    capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml")
+    offerid, offer = next(iter(offers["one"].items()))
+    capreg.resource_offer_accept(offerid, offer)
+    resid = offer["ids"]["res_id"]
+    #m2-large is used up, so the second swarm's availability check finds less than required: not an overbook
+    capreg.resource_offer_generate_from_SAT_file("swarm2", "app.yaml")
+    assert capreg.resource_state_change("swarm1", "one", "cloud", resid, 5, "assigned", "allocated") is None
+    assert capreg.resource_state_change("swarm1", "one", "cloud", resid, 5, "assigned", "free") is None
+
+    samples, types = parse_exposition(collector.export())
+    label = (("ra_id", ra_id),)
+    assert samples[("swch_capreg_offers_generated_total", label)] == generated + sum(len(ms_offers) for ms_offers in capreg.capacity["offers"]["swarm2"].values())
+    assert samples[("swch_capreg_offers_accepted_total", label)] == 1
+    assert samples[("swch_capreg_failed_transitions_total", label)] == 2
+    assert samples[("swch_capreg_overbook_attempts_total", label)] == 1
+    assert types["swch_capreg_method_seconds"] == "histogram" and types["swch_capreg_overbook_attempts_total"] == "counter"
+    count = samples[("swch_capreg_method_seconds_count", label + (("method", "resource_offer_generate_from_SAT_file"),))]
+    assert count == 3
+    assert samples[("swch_capreg_method_seconds_bucket", label + (("method", "resource_offer_generate_from_SAT_file"), ("le", "+Inf")))] == count
@@ -0,0 +1,44 @@
+import copy
+import io
+from conftest import EDGE_CAPACITY, FLAVOUR_CAPACITY, logger, requirement
+from swch_capreg import SwChCapacityRegistry, ndjson
+
+CAPACITY = dict(FLAVOUR_CAPACITY, **EDGE_CAPACITY)
+REQUIREMENTS = {"one": requirement(1, 1), "two": requirement(4, 4), "three": requirement(1, 1, colocated=["four"]),
+                "four": requirement(2, 2)}
+
+def round_trip(write) -> dict:
+    fp = io.StringIO()
+    count = write(fp)
+    assert count == len(fp.getvalue().splitlines())
+    fp.seek(0)
+    return ndjson.load_records(ndjson.read_records(fp))
+
+def test_load_of_dump_is_identity(make_registry):
+    capreg = make_registry(CAPACITY, REQUIREMENTS)
+    offers = capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml", {"one": 2})
+    (one_id, one), (two_id, two) = next(iter(offers["one"].items())), next(iter(offers["two"].items()))
+    capreg.resource_offer_accept(one_id, one)
+    res_set = capreg.resource_set_get_from_offer(one_id, one)
+    capreg.resource_set_deployed("swarm1", "one", res_set["restype"], res_set["resid"], 1)
+    #a microservice whose offers were all rejected keeps an empty entry
+    for offerid, offer in list(offers["two"].items()):
+        capreg.resource_offer_reject(offerid, offer)
+    capreg.resource_offer_generate_from_SAT_file("swarm2", "app.yaml")
+
+    swarm_offers = capreg.resource_offer_query_all("swarm1")
+    assert swarm_offers["two"] == {} and swarm_offers["four"] == {"colocated": "three"} and isinstance(swarm_offers["one"][one_id], list)
+    assert round_trip(lambda fp: capreg.resource_offer_query_all_as_ndjson("swarm1", fp)) == swarm_offers
+    assert round_trip(lambda fp: capreg.resource_offer_query_all_as_ndjson("nobody", fp)) == {}
+    for swarmid in ("swarm1", "swarm2"):
+        assert round_trip(lambda fp: capreg.resource_set_query_all_as_ndjson(swarmid, fp)) == capreg.resource_set_query_all(swarmid)
+        assert round_trip(lambda fp: capreg.resource_set_query_all_as_ndjson(swarmid, fp, "one")) == capreg.resource_set_query_all(swarmid, "one")
+
+    snapshot = copy.deepcopy(capreg.capacity)
+    assert round_trip(capreg.save_capacity_registry_as_ndjson) == snapshot
+    fp = io.StringIO()
+    capreg.save_capacity_registry_as_ndjson(fp)
+    fp.seek(0)
+    restored = SwChCapacityRegistry("ra1", logger)
+    restored.load_capacity_registry_from_ndjson(fp)
+    assert restored.capacity == snapshot and capreg.capacity == snapshot
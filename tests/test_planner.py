@@ -0,0 +1,39 @@
+from conftest import RAW_CAPACITY, requirement
+from swch_capreg.planner import RawCapPlanner
+
+REQUIREMENTS = {"one": requirement(1, 1), "two": requirement(2, 2), "three": requirement(4, 4)}
+INSTANCE_COUNTS = {"one": 10, "two": 8, "three": 5}
+
+def test_planned_flavours_are_reserved_for_the_whole_sat(make_registry):
+    capreg = make_registry(RAW_CAPACITY, REQUIREMENTS)
+    requirements = capreg.extract_application_requirements_from_SAT_file("app.yaml")
+    matching_resources = capreg.calculate_matching_resources(requirements)
+    plan = capreg.plan_raw_flavour_assignment(matching_resources, INSTANCE_COUNTS)
+    raw = capreg.capacity["cloud"]["raw"]
+    assert all(amount == 0 for amount in raw["reserved"].values())
+    for msid, count in INSTANCE_COUNTS.items():
+        assert plan[msid]["flavour"] in [resource["cloud"] for resource in matching_resources[msid] if "cloud" in resource]
+        assert plan[msid]["count"] == plan[msid]["required"] == count
+
+    offers = capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml", INSTANCE_COUNTS)
+    flavours = capreg.capacity["cloud"]["flavours"]
+    for msid, count in INSTANCE_COUNTS.items():
+        offerid = f"ra1_swarm1_{msid}_{plan[msid]['flavour']}"
+        assert list(offers[msid]) == [offerid] and len(offers[msid][offerid]) == count
+    for prop in capreg.calc_res_props:
+        reserved = sum(flavours[plan[msid]["flavour"]].get(prop, 0) * count for msid, count in INSTANCE_COUNTS.items())
+        assert raw["reserved"][prop] == reserved
+        assert raw["free"][prop] == raw["init"][prop] - reserved
+    capreg.resources_and_offers_destroy_all("swarm1")
+    assert raw["free"] == raw["init"]
+
+def test_hardest_microservice_is_placed_first():
+    planner = RawCapPlanner(["host.num-cpus", "host.mem-size"])
+    flavours = {"small": {"host.num-cpus": 1, "host.mem-size": 1}, "wide": {"host.num-cpus": 4, "host.mem-size": 1}}
+    demands = {"any": {"count": 4, "candidates": ["small", "wide"]}, "wide": {"count": 2, "candidates": ["wide"]}}
+    plan = planner.plan(demands, flavours, {"host.num-cpus": 12, "host.mem-size": 10})
+    assert plan == {"wide": {"flavour": "wide", "count": 2, "required": 2},
+                    "any": {"flavour": "small", "count": 4, "required": 4}}
+    #what does not fit the remaining pool gets no flavour
+    plan = planner.plan(dict(demands, any={"count": 5, "candidates": ["wide"]}), flavours, {"host.num-cpus": 12, "host.mem-size": 10})
+    assert plan["any"] == {"flavour": None, "count": 0, "required": 5}
@@ -0,0 +1,53 @@
+from conftest import EDGE_CAPACITY, flavour, requirement
+
+REQUIREMENTS = {"one": requirement(2, 2)}
+TINY_RAW_CAPACITY = {"cloud_flavours": {"c1": flavour(1, 1, 1)},
+                     "cloud_capacity_raw": {"num-cpus": "2", "mem-size": "100", "disk-size": "100"}}
+
+def test_higher_priority_swarm_reclaims_reserved_edge_instances(make_registry):
+    capreg = make_registry(EDGE_CAPACITY, REQUIREMENTS)
+    capreg.enable_preemption()
+    capreg.set_swarm_priority("high", 10)
+    low = capreg.resource_offer_generate_from_SAT_file("low", "app.yaml")
+    assert set(low["one"]) == {"ra1_low_one_e1", "ra1_low_one_e2"}
+    subscription = capreg.subscribe_changes()
+    high = capreg.resource_offer_generate_from_SAT_file("high", "app.yaml")
+    assert set(high["one"]) == {"ra1_high_one_e1", "ra1_high_one_e2"}
+    assert capreg.resource_offer_query_all("low") == {"one": {}}
+    assert all(rstate["reserved"] == 0 for rstate in capreg.capacity["swarms"]["low"]["one"]["edge"].values())
+    removed = [event["offer"] for event in subscription.drain() if event["event"] == "offer_removed"]
+    assert sorted(removed) == ["ra1_low_one_e1", "ra1_low_one_e2"]
+    assert capreg.audit_invariants() == []
+
+def test_equal_priority_and_accepted_capacity_are_not_preempted(make_registry):
+    capreg = make_registry(EDGE_CAPACITY, REQUIREMENTS)
+    capreg.enable_preemption()
+    low = capreg.resource_offer_generate_from_SAT_file("low", "app.yaml")
+    capreg.resource_offer_accept("ra1_low_one_e1", low["one"]["ra1_low_one_e1"])
+    assert capreg.resource_offer_generate_from_SAT_file("same", "app.yaml") == {}
+    capreg.set_swarm_priority("high", 10)
+    high = capreg.resource_offer_generate_from_SAT_file("high", "app.yaml")
+    assert list(high["one"]) == ["ra1_high_one_e2"]
+    assert capreg.capacity["swarms"]["low"]["one"]["edge"]["e1"]["assigned"] == 1
+    assert capreg.audit_invariants() == []
+
+def test_planned_raw_offer_reclaims_lower_priority_reservations(make_registry):
+    capreg = make_registry(TINY_RAW_CAPACITY, {"one": requirement()})
+    capreg.enable_preemption()
+    capreg.set_swarm_priority("high", 10)
+    low = capreg.resource_offer_generate_from_SAT_file("low", "app.yaml", {"one": 2})
+    assert len(low["one"]["ra1_low_one_c1"]) == 2
+    high = capreg.resource_offer_generate_from_SAT_file("high", "app.yaml", {"one": 2})
+    assert len(high["one"]["ra1_high_one_c1"]) == 2
+    assert capreg.resource_offer_query_all("low") == {"one": {}}
+    assert capreg.capacity["cloud"]["raw"]["reserved"]["host.num-cpus"] == 2
+    assert capreg.audit_invariants() == []
+
+def test_nothing_is_released_if_lower_priority_reservations_do_not_cover(make_registry):
+    capreg = make_registry(TINY_RAW_CAPACITY, {"one": requirement()})
+    capreg.enable_preemption()
+    capreg.set_swarm_priority("high", 10)
+    capreg.resource_offer_generate_from_SAT_file("low", "app.yaml", {"one": 1})
+    assert capreg.resource_offer_generate_from_SAT_file("high", "app.yaml", {"one": 3}) == {}
+    assert capreg.capacity["swarms"]["low"]["one"]["cloud"]["c1"]["reserved"] == 1
+    assert capreg.audit_invariants() == []
@@ -0,0 +1,37 @@
+import json
+import os
+import subprocess
+import sys
+from conftest import RAW_CAPACITY, requirement
+
+REQUIREMENTS = {"one": requirement(1, 1), "two": requirement(4, 4)}
+
+#stands in for Sardou in the profiled process: any CDT or SAT file parses to the fixtures
+SARDOU = f'''
+import json
+class Sardou:
+    def __init__(self, path=None, content=None):
+        pass
+    def get_capacities(self):
+        return json.loads({json.dumps(RAW_CAPACITY)!r})
+    def get_requirements(self):
+        return json.loads({json.dumps(REQUIREMENTS)!r})
+'''
+
+def test_profile_command_prints_the_report(tmp_path):
+    (tmp_path / "sardou.py").write_text(SARDOU)
+    capacity, sat = tmp_path / "capacity.yaml", tmp_path / "app.yaml"
+    capacity.write_text("capacity\n")
+    sat.write_text("sat\n")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(tmp_path), root]))
+    completed = subprocess.run([sys.executable, "-m", "swch_capreg", "profile", "--capacity", str(capacity), "--sat", str(sat),
+                                "--swarms", "2", "--top", "3"], capture_output=True, text=True, env=env, timeout=120)
+    assert completed.returncode == 0, completed.stderr
+    report = json.loads(completed.stdout)
+    assert set(report) == {"capacity", "sat", "swarms", "python", "total_seconds", "phases", "memory", "top_functions", "top_allocations"}
+    assert report["swarms"] == 2 and report["memory"]["peak_bytes"] >= report["memory"]["current_bytes"] > 0
+    for phase in ("sardou_parse", "initialize", "matching", "availability", "reservation", "offer_composition", "accept", "reject", "deploy", "destroy"):
+        assert report["phases"][phase]["calls"] > 0
+    assert report["phases"]["offer_composition"]["calls"] == report["phases"]["destroy"]["calls"] == 2
+    assert len(report["top_functions"]) == len(report["top_allocations"]) == 3
@@ -0,0 +1,68 @@
+import io
+import logging
+from conftest import FLAVOURS, RAW_CAPACITY, flavour, logger, requirement, use_requirements
+from swch_capreg import SwChCapacityRegistry
+
+GPU_FLAVOURS = dict(FLAVOURS, g1=flavour(2, 2, 20, gpus=1))
+GPU_CAPACITY = {"cloud_flavours": GPU_FLAVOURS, "cloud_capacity_raw": dict(RAW_CAPACITY["cloud_capacity_raw"], gpus="3")}
+REQUIREMENTS = {"gpu": {"expression": "lambda d: d.get('host.gpus', 0) >= 1", "properties": {}, "colocated": []},
+                "cpu": requirement(4, 4)}
+
+def restored(capreg: SwChCapacityRegistry, ndjson: bool) -> SwChCapacityRegistry:
+    copy = SwChCapacityRegistry("ra1", logger)
+    if ndjson:
+        fp = io.StringIO()
+        capreg.save_capacity_registry_as_ndjson(fp)
+        fp.seek(0)
+        copy.load_capacity_registry_from_ndjson(fp)
+    else:
+        copy.load_capacity_registry_from_yaml(capreg.save_capacity_registry_as_yaml())
+    use_requirements(copy, REQUIREMENTS)
+    return copy
+
+def test_extra_raw_dimension_is_accounted_everywhere(make_registry):
+    capreg = make_registry(GPU_CAPACITY, REQUIREMENTS)
+    capreg.enable_invariant_checks(raise_on_violation=True)
+    capreg.enable_preemption()
+    raw = capreg.capacity["cloud"]["raw"]
+    assert capreg.calc_res_props[-1] == "host.gpus" and capreg.calc_res_props_labels[-1] == "GPUS"
+    #availability: CPU, RAM and disk would allow 50 instances of g1, the GPUs only 3
+    assert capreg.calculate_available_instances_of_resources("cloud", "g1", 50) == 3
+    assert capreg.calculate_available_instances_of_resources("cloud", "m2-large", 50) == 25
+    #planner: 4 GPU instances do not fit, 3 do
+    matching = capreg.calculate_matching_resources(capreg.extract_application_requirements_from_SAT_file("app.yaml"))
+    assert capreg.plan_raw_flavour_assignment(matching, {"gpu": 4, "cpu": 1})["gpu"]["flavour"] is None
+    assert capreg.plan_raw_flavour_assignment(matching, {"gpu": 3, "cpu": 1})["gpu"] == {"flavour": "g1", "count": 3, "required": 3}
+    #transitions move the GPUs with the other dimensions
+    low = capreg.resource_offer_generate_from_SAT_file("low", "app.yaml", {"gpu": 2, "cpu": 1})
+    assert raw["reserved"]["host.gpus"] == 2 and raw["free"]["host.gpus"] == 1
+    capreg.resource_offer_accept("ra1_low_gpu_g1", low["gpu"]["ra1_low_gpu_g1"][:1])
+    assert raw["assigned"]["host.gpus"] == 1 and raw["reserved"]["host.gpus"] == 1
+    #preemption: the reserved GPU of the lower-priority swarm is reclaimed, the accepted one is kept
+    capreg.set_swarm_priority("high", 10)
+    high = capreg.resource_offer_generate_from_SAT_file("high", "app.yaml", {"gpu": 2, "cpu": 1})
+    assert len(high["gpu"]["ra1_high_gpu_g1"]) == 2
+    assert capreg.capacity["swarms"]["low"]["gpu"]["cloud"]["g1"] == {"free": 0, "reserved": 0, "assigned": 1, "allocated": 0}
+    assert raw["free"]["host.gpus"] == 0 and raw["reserved"]["host.gpus"] == 2
+    assert capreg.audit_invariants() == []
+    #dump and restore keep the dimension
+    for ndjson in (False, True):
+        copy = restored(capreg, ndjson)
+        #the YAML dump sorts keys, so the dimensions may come back in another order
+        assert copy.capacity == capreg.capacity and sorted(copy.calc_res_props) == sorted(capreg.calc_res_props)
+        assert copy.calculate_available_instances_of_resources("cloud", "g1", 1) == 0
+        copy.resources_and_offers_destroy_all("high")
+        assert copy.calculate_available_instances_of_resources("cloud", "g1", 5) == 2
+        assert copy.capacity["cloud"]["raw"]["free"]["host.gpus"] == 2
+
+def test_dimension_missing_from_the_cdt_has_no_capacity(make_registry, caplog):
+    capacity = dict(RAW_CAPACITY, cloud_flavours=GPU_FLAVOURS)
+    with caplog.at_level(logging.WARNING, logger=logger.name):
+        capreg = make_registry(capacity, REQUIREMENTS)
+    assert "Flavours g1 use 'host.gpus'" in caplog.text
+    assert capreg.capacity["cloud"]["raw"]["init"]["host.gpus"] == 0 and "host.gpus" in capreg.calc_res_props
+    assert capreg.calculate_available_instances_of_resources("cloud", "g1", 1) == 0
+    assert capreg.calculate_available_instances_of_resources("cloud", "m2-large", 1) == 1
+    offers = capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml")
+    assert "gpu" not in offers and list(offers["cpu"]) == ["ra1_swarm1_cpu_m2-large"]
+    assert restored(capreg, False).calculate_available_instances_of_resources("cloud", "g1", 1) == 0
@@ -0,0 +1,34 @@
+import copy
+import pytest
+from conftest import FLAVOUR_CAPACITY, RAW_CAPACITY, EDGE_CAPACITY, logger, requirement, use_requirements
+from swch_capreg import SwChCapacityRegistryHost
+
+@pytest.mark.parametrize("capacity", [FLAVOUR_CAPACITY, RAW_CAPACITY, EDGE_CAPACITY])
+def test_tenants_share_the_catalog_but_not_the_counters(capacity):
+    host = SwChCapacityRegistryHost(logger)
+    host.load_catalog(copy.deepcopy(capacity))
+    first, second = host.registry("ra-1"), host.registry("ra-2")
+    assert host.registry("ra-1") is first and len(host) == 2
+    restype, section = ("edge", "instances") if "edge_instances" in capacity else ("cloud", first.capacity["cloud"]["type"])
+    counters = lambda capreg: capreg.capacity[restype][section]
+    for state in ("init", "free", "reserved", "assigned", "allocated"):
+        assert counters(first)[state] is not counters(second)[state]
+    key = next(iter(counters(first)["init"]))
+    before = copy.deepcopy(counters(second))
+    assert first.resource_capacity_adjust(restype, key, 3) == 3
+    assert counters(second) == before
+    assert first.audit_invariants() == [] and second.audit_invariants() == []
+    if restype == "cloud":
+        assert first.capacity["cloud"]["flavours"] is second.capacity["cloud"]["flavours"]
+
+def test_offers_of_one_tenant_do_not_touch_another():
+    host = SwChCapacityRegistryHost(logger)
+    host.load_catalog(copy.deepcopy(FLAVOUR_CAPACITY))
+    first, second = host.registry("ra-1"), host.registry("ra-2")
+    for capreg in (first, second):
+        use_requirements(capreg, {"one": requirement(4, 4)})
+    assert list(first.resource_offer_generate_from_SAT_file("swarm1", "app.yaml")["one"]) == ["ra-1_swarm1_one_m2-large"]
+    assert list(second.resource_offer_generate_from_SAT_file("swarm1", "app.yaml")["one"]) == ["ra-2_swarm1_one_m2-large"]
+    assert first.capacity["cloud"]["flavour"]["free"]["m2-large"] == 0
+    assert second.capacity["cloud"]["flavour"]["free"]["m2-large"] == 0
+    assert host.catalog.init_capacity["cloud_capacity_flavour"] == FLAVOUR_CAPACITY["cloud_capacity_flavour"]
@@ -0,0 +1,109 @@
+import copy
+import pytest
+from conftest import RAW_CAPACITY, FLAVOUR_CAPACITY, EDGE_CAPACITY, flavour, requirement, use_requirements
+from swch_capreg.storage import SQLiteStorage
+
+REQUIREMENTS = {"one": requirement(1, 2), "two": requirement(2, 4)}
+
+def reserved_without_offer(capreg, swarmid):
+    offered = set()
+    for msid, ms_offers in capreg.capacity["offers"].get(swarmid, {}).items():
+        for offer in ms_offers.values():
+            first = offer[0] if isinstance(offer, list) else offer
+            if isinstance(first, dict):
+                offered.add((msid, first["ids"]["res_type"], first["ids"]["res_id"]))
+    return [(msid, restype, resid)
+            for msid, ms in capreg.capacity["swarms"].get(swarmid, {}).items()
+            for restype, resources in ms.items()
+            for resid, rstate in resources.items()
+            if rstate["reserved"] > 0 and (msid, restype, resid) not in offered]
+
+@pytest.mark.parametrize("capacity", [RAW_CAPACITY, FLAVOUR_CAPACITY, EDGE_CAPACITY])
+@pytest.mark.parametrize("instance_counts", [None, {"one": 2, "two": 1}])
+def test_unchanged_reoffer_is_a_no_op(make_registry, capacity, instance_counts):
+    capreg = make_registry(capacity, REQUIREMENTS)
+    capreg.enable_invariant_checks(raise_on_violation=True)
+    first = capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml", instance_counts)
+    expected_offers, expected_swarms = copy.deepcopy(first), copy.deepcopy(capreg.capacity["swarms"])
+    subscription = capreg.subscribe_changes()
+    second = capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml", instance_counts)
+    assert second == expected_offers
+    assert capreg.capacity["swarms"] == expected_swarms
+    assert subscription.drain() == []
+
+@pytest.mark.parametrize("capacity", [RAW_CAPACITY, FLAVOUR_CAPACITY, EDGE_CAPACITY])
+@pytest.mark.parametrize("instance_counts", [None, {"one": 2, "two": 1}])
+def test_reoffer_after_accept_is_a_no_op(make_registry, capacity, instance_counts):
+    capreg = make_registry(capacity, REQUIREMENTS)
+    capreg.enable_invariant_checks(raise_on_violation=True)
+    first = capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml", instance_counts)
+    #one offer accepted per microservice, the alternatives still pending
+    for msid, ms_offers in first.items():
+        capreg.resource_offer_accept(*next(iter(ms_offers.items())))
+    expected_offers, expected_swarms = copy.deepcopy(capreg.resource_offer_query_all("swarm1")), copy.deepcopy(capreg.capacity["swarms"])
+    subscription = capreg.subscribe_changes()
+    assert capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml", instance_counts) == expected_offers
+    assert capreg.capacity["swarms"] == expected_swarms
+    assert subscription.drain() == []
+
+def test_reoffer_keeps_accepted_offers_when_capacity_is_used_up(make_registry):
+    storage = SQLiteStorage()
+    capreg = make_registry({"cloud_flavours": FLAVOUR_CAPACITY["cloud_flavours"], "cloud_capacity_flavour": {"m2-large": 1}},
+                           {"one": requirement(4, 4)}, storage=storage)
+    offers = capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml")
+    capreg.resource_offer_accept("ra1_swarm1_one_m2-large", offers["one"]["ra1_swarm1_one_m2-large"])
+    subscription = capreg.subscribe_changes()
+    assert list(capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml")["one"]) == ["ra1_swarm1_one_m2-large"]
+    assert capreg.capacity["swarms"]["swarm1"]["one"]["cloud"]["m2-large"] == {"free": 0, "reserved": 0, "assigned": 1, "allocated": 0}
+    assert storage.load_capacity()["offers"] == capreg.capacity["offers"]
+    assert subscription.drain() == []
+
+def test_reoffer_moves_instances_between_microservices_without_overbooking(make_registry):
+    capacity = {"cloud_flavours": {"c1": flavour(1, 1, 1)},
+                "cloud_capacity_raw": {"num-cpus": "4", "mem-size": "100", "disk-size": "100"}}
+    capreg = make_registry(capacity, {"one": requirement(), "two": requirement()})
+    capreg.enable_invariant_checks(raise_on_violation=True)
+    capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml", {"one": 1, "two": 3})
+    offers = capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml", {"one": 3, "two": 1})
+    assert len(offers["one"]["ra1_swarm1_one_c1"]) == 3
+    assert offers["two"]["ra1_swarm1_two_c1"]["ids"]["offer_id"] == "ra1_swarm1_two_c1"
+    raw = capreg.capacity["cloud"]["raw"]
+    assert raw["reserved"]["host.num-cpus"] == 4 and raw["free"]["host.num-cpus"] == 0
+    assert capreg.audit_invariants() == []
+
+def test_reoffer_releases_removed_microservices_and_keeps_other_swarms(make_registry):
+    capreg = make_registry(FLAVOUR_CAPACITY, REQUIREMENTS)
+    capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml")
+    other = copy.deepcopy(capreg.resource_offer_generate_from_SAT_file("swarm2", "app.yaml"))
+    use_requirements(capreg, {"one": REQUIREMENTS["one"]})
+    offers = capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml")
+    assert list(offers) == ["one"]
+    assert all(rstate["reserved"] == 0 for rstate in capreg.capacity["swarms"]["swarm1"].get("two", {}).get("cloud", {}).values())
+    assert reserved_without_offer(capreg, "swarm1") == []
+    assert capreg.resource_offer_query_all("swarm2") == other
+    assert capreg.audit_invariants() == []
+    assert capreg.resources_and_offers_destroy_all("swarm1") and capreg.resources_and_offers_destroy_all("swarm2")
+    assert capreg.capacity["cloud"]["flavour"]["free"] == FLAVOUR_CAPACITY["cloud_capacity_flavour"]
+
+def test_reoffer_releases_microservices_that_become_colocated(make_registry):
+    capreg = make_registry(RAW_CAPACITY, REQUIREMENTS)
+    capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml")
+    #'two' is matched first, then replaced by the colocation with 'one'
+    use_requirements(capreg, {"two": REQUIREMENTS["two"], "one": requirement(1, 2, colocated=["two"])})
+    subscription = capreg.subscribe_changes()
+    offers = capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml")
+    assert offers["two"] == {"colocated": "one"}
+    assert reserved_without_offer(capreg, "swarm1") == []
+    assert capreg.audit_invariants() == []
+    removed = [event["offer"] for event in subscription.drain() if event["event"] == "offer_removed"]
+    assert len(removed) == len(set(removed))
+
+def test_streaming_consumer_stopping_early_leaves_no_orphan_reservations(make_registry):
+    capreg = make_registry(RAW_CAPACITY, REQUIREMENTS)
+    capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml", {"one": 1, "two": 1})
+    generator = capreg.resource_offer_generate_iter_from_SAT_file("swarm1", "app.yaml", {"one": 2, "two": 2})
+    msid, offerid, offer = next(generator)
+    generator.close()
+    assert capreg.resource_offer_query_all("swarm1") == {msid: {offerid: offer}}
+    assert reserved_without_offer(capreg, "swarm1") == []
+    assert capreg.audit_invariants() == []
@@ -0,0 +1,80 @@
+import asyncio
+import json
+from conftest import FLAVOUR_CAPACITY, requirement
+from swch_capreg.server import SwChCapacityRegistryServer
+
+REQUIREMENTS = {"one": requirement(2, 2)}
+
+def test_unknown_methods_and_registry_errors_are_told_apart(make_registry):
+    server = SwChCapacityRegistryServer(make_registry(FLAVOUR_CAPACITY, REQUIREMENTS))
+    status, response = server.handle("POST", "/call/nothing", b"{}")
+    assert status == 404 and response == {"error": "Unknown method: 'nothing'"}
+    #KeyError raised inside the registry is a failed call, not an unknown method
+    body = json.dumps({"args": ["ra1_swarm1_one_m2-medium", {"ids": {}}]}).encode()
+    status, response = server.handle("POST", "/call/resource_offer_accept", body)
+    assert status == 500 and response["error"].startswith("KeyError")
+    status, response = server.handle("POST", "/call/resource_offer_generate_from_SAT_file", json.dumps({"args": ["swarm1", "app.yaml"]}).encode())
+    assert status == 200 and "ra1_swarm1_one_m2-medium" in response["result"]["one"]
+
+def test_batch_reports_errors_per_call(make_registry):
+    server = SwChCapacityRegistryServer(make_registry(FLAVOUR_CAPACITY, REQUIREMENTS))
+    calls = [{"method": "resource_offer_generate_from_SAT_file", "args": ["swarm1", "app.yaml"]},
+             {"method": "nothing"},
+             {"method": "resource_offer_accept", "args": ["ra1_swarm1_one_m2-medium", {"ids": {}}]},
+             {"method": "resource_offer_query_all", "args": ["swarm1"]}]
+    status, responses = server.handle("POST", "/batch", json.dumps(calls).encode())
+    assert status == 200 and len(responses) == 4
+    assert responses[1] == {"error": "Unknown method: 'nothing'"}
+    assert responses[2]["error"].startswith("KeyError")
+    assert responses[3]["result"] == responses[0]["result"]
+
+def test_keep_alive_round_trip(make_registry):
+    server = SwChCapacityRegistryServer(make_registry(FLAVOUR_CAPACITY, REQUIREMENTS), port=0)
+
+    async def request(reader, writer, verb, target, body=b""):
+        writer.write(f"{verb} {target} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+        status = int((await reader.readline()).split()[1])
+        headers = dict()
+        while (line := await reader.readline()) != b"\r\n":
+            name, _, value = line.decode().partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return status, json.loads(await reader.readexactly(int(headers["content-length"])))
+
+    async def session():
+        await server.start()
+        reader, writer = await asyncio.open_connection(server.host, server.port)
+        try:
+            first = await request(reader, writer, "GET", "/methods")
+            second = await request(reader, writer, "POST", "/call/nothing", b"{}")
+        finally:
+            writer.close()
+            await server.close()
+        return first, second
+
+    (status, response), (missing, _) = asyncio.run(session())
+    assert status == 200 and "resource_offer_accept" in response["methods"]
+    assert missing == 404
+
+def test_call_body_must_be_an_object(make_registry):
+    server = SwChCapacityRegistryServer(make_registry(FLAVOUR_CAPACITY, REQUIREMENTS))
+    for body in (b"[]", b"1", b'"swarm1"'):
+        status, response = server.handle("POST", "/call/resource_offer_query_all", body)
+        assert status == 400 and "object" in response["error"]
+
+def test_invalid_content_length_is_answered_and_closes(make_registry):
+    server = SwChCapacityRegistryServer(make_registry(FLAVOUR_CAPACITY, REQUIREMENTS), port=0)
+
+    async def session():
+        await server.start()
+        reader, writer = await asyncio.open_connection(server.host, server.port)
+        try:
+            writer.write(b"POST /call/nothing HTTP/1.1\r\nContent-Length: ten\r\n\r\n{}")
+            response = await reader.read()
+        finally:
+            writer.close()
+            await server.close()
+        return response
+
+    head, _, body = asyncio.run(session()).partition(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 400 ") and b"Connection: close" in head
+    assert json.loads(body) == {"error": "Invalid Content-Length: ten"}
@@ -0,0 +1,71 @@
+import copy
+import pytest
+from conftest import EDGE_CAPACITY, FLAVOUR_CAPACITY, RAW_CAPACITY, flavour, requirement
+from swch_capreg import SwChCapacityRegistry
+from swch_capreg.sharding import ShardedRegistry, shard_quotas
+from swch_capreg.storage import SQLiteStorage
+
+REQUIREMENTS = {"one": requirement()}
+POOL_CAPACITY = {"cloud_flavours": {"c1": flavour(1, 1, 1)}, "cloud_capacity_flavour": {"c1": 8}}
+
+def test_quotas_add_up_to_the_capacity():
+    capacity = dict(FLAVOUR_CAPACITY, **EDGE_CAPACITY)
+    quotas = shard_quotas(capacity, 2)
+    assert [quota[("cloud", "m2-small")] for quota in quotas] == [3, 2]
+    assert [quota[("cloud", "m2-large")] for quota in quotas] == [1, 0]
+    assert [quota[("edge", "e1")] for quota in quotas] == [1, 0]
+    assert [quota[("edge", "e2")] for quota in quotas] == [0, 1]
+    quotas = shard_quotas(RAW_CAPACITY, 3)
+    assert [quota[("cloud", "host.num-cpus")] for quota in quotas] == [34, 33, 33]
+
+@pytest.mark.parametrize("capacity, key", [(FLAVOUR_CAPACITY, "m2-small"), (RAW_CAPACITY, "host.num-cpus")])
+def test_capacity_adjust_updates_storage_and_mirrors_in_place(make_registry, capacity, key):
+    pytest.importorskip("numpy")
+    storage = SQLiteStorage()
+    capreg = make_registry(capacity, REQUIREMENTS, storage=storage)
+    ledger = capreg.attach_reservation_ledger()
+    capreg.enable_invariant_checks(raise_on_violation=True)
+    capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml")
+    section = capreg.capacity["cloud"][capreg.capacity["cloud"]["type"]]
+    free = section["free"][key]
+    assert capreg.resource_capacity_adjust("cloud", key, -(free + 10)) == -free
+    assert capreg.resource_capacity_adjust("cloud", key, 2) == 2
+    assert capreg.ledger is ledger
+    assert section["free"][key] == 2 and section["reserved"][key] > 0
+    assert section["init"][key] == section["free"][key] + section["reserved"][key]
+    assert storage.load_capacity()["cloud"] == capreg.capacity["cloud"]
+    assert ledger.views()["cloud"][capreg.capacity["cloud"]["type"]] == section
+    assert capreg.audit_invariants() == []
+
+@pytest.fixture
+def sharded(monkeypatch):
+    # forked workers inherit the patched class, so they need no SAT files either
+    monkeypatch.setattr(SwChCapacityRegistry, "extract_application_requirements_from_SAT_file",
+                        lambda self, filename: copy.deepcopy(REQUIREMENTS))
+    with ShardedRegistry("ra1", copy.deepcopy(POOL_CAPACITY), shards=2, start_method="fork") as sharded:
+        yield sharded
+
+def swarms_of_shard(sharded: ShardedRegistry, shard: int, count: int) -> list:
+    swarmids = (f"swarm{index}" for index in range(1000))
+    return [swarmid for swarmid in swarmids if sharded.shard_of(swarmid) == shard][:count]
+
+def test_calls_are_routed_to_the_shard_of_the_swarm(sharded):
+    first, second = swarms_of_shard(sharded, 0, 1) + swarms_of_shard(sharded, 1, 1)
+    futures = [sharded.submit("resource_offer_generate_from_SAT_file", swarmid, "app.yaml", {"one": 3}) for swarmid in (first, second)]
+    offers = [future.result() for future in futures]
+    assert [len(offer["one"][f"ra1_{swarmid}_one_c1"]) for offer, swarmid in zip(offers, (first, second))] == [3, 3]
+    assert sharded.resource_offer_query_all(first) == offers[0]
+    assert sharded.free[0][("cloud", "c1")] == 1 and sharded.free[1][("cloud", "c1")] == 1
+    assert sharded.capacity_totals() == {("cloud", "c1"): {"init": 8, "free": 2}}
+    with pytest.raises(ValueError):
+        sharded.submit("resource_utilisation_summary")
+
+def test_low_shard_is_refilled_from_the_other_one(sharded):
+    first, second = swarms_of_shard(sharded, 0, 2)
+    assert len(sharded.resource_offer_generate_from_SAT_file(first, "app.yaml", {"one": 4})["one"]["ra1_" + first + "_one_c1"]) == 4
+    assert sharded.low[0] == {("cloud", "c1")}
+    #half of the other shard's free capacity moves over before the next offer
+    offers = sharded.resource_offer_generate_from_SAT_file(second, "app.yaml", {"one": 2})
+    assert len(offers["one"]["ra1_" + second + "_one_c1"]) == 2
+    assert sharded.capacity_totals() == {("cloud", "c1"): {"init": 8, "free": 2}}
+    assert sharded.free == [{("cloud", "c1"): 0}, {("cloud", "c1"): 2}]
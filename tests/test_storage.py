@@ -0,0 +1,134 @@
+import copy
+import pytest
+import sys
+import threading
+from conftest import EDGE_CAPACITY, RAW_CAPACITY, logger, requirement, use_requirements
+from swch_capreg import SwChCapacityRegistry
+from swch_capreg.storage import SQLiteStorage
+
+CAPACITY = dict(RAW_CAPACITY, **EDGE_CAPACITY)
+REQUIREMENTS = {"one": requirement(1, 1), "two": requirement(4, 4)}
+
+def busy_registry(make_registry, storage: SQLiteStorage) -> SwChCapacityRegistry:
+    """swarm1 accepts and deploys its cloud offers and rejects the edge ones; swarm2 keeps its offers."""
+    capreg = make_registry(CAPACITY, REQUIREMENTS, storage=storage)
+    offers = capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml", {"one": 2})
+    for msid, ms_offers in offers.items():
+        for offerid, offer in list(ms_offers.items()):
+            res_set = capreg.resource_set_get_from_offer(offerid, offer)
+            if res_set["restype"] == "edge":
+                capreg.resource_offer_reject(offerid, offer)
+                continue
+            capreg.resource_offer_accept(offerid, offer)
+            capreg.resource_set_deployed("swarm1", msid, "cloud", res_set["resid"], res_set["count"])
+    capreg.resource_offer_generate_from_SAT_file("swarm2", "app.yaml")
+    return capreg
+
+def test_state_is_written_through_and_restored_after_a_restart(make_registry, tmp_path):
+    path = str(tmp_path / "registry.db")
+    storage = SQLiteStorage(path)
+    capreg = busy_registry(make_registry, storage)
+    assert storage.load_capacity() == capreg.capacity
+    capreg.resources_and_offers_destroy_all("swarm2")
+    assert storage.load_capacity() == capreg.capacity
+    storage.close()
+
+    restarted = SwChCapacityRegistry("ra1", logger, storage=SQLiteStorage(path))
+    assert restarted.initialize_from_storage() is True
+    assert restarted.capacity == capreg.capacity
+    assert restarted.audit_invariants() == []
+    #the restored registry keeps working and writing through
+    use_requirements(restarted, REQUIREMENTS)
+    assert restarted.resources_and_offers_destroy_all("swarm1") is True
+    assert restarted.capacity["cloud"]["raw"]["free"] == restarted.capacity["cloud"]["raw"]["init"]
+    assert restarted.storage.load_capacity() == restarted.capacity
+    assert SwChCapacityRegistry("ra1", logger, storage=SQLiteStorage(str(tmp_path / "empty.db"))).initialize_from_storage() is False
+
+def test_failed_write_leaves_the_registry_unchanged(make_registry):
+    storage = SQLiteStorage()
+    capreg = busy_registry(make_registry, storage)
+    storage.conn.execute("UPDATE resources SET reserved = 0 WHERE swarm = 'swarm2' AND ms = 'one'")
+    before = copy.deepcopy(capreg.capacity)
+    resid = next(iter(capreg.capacity["swarms"]["swarm2"]["one"]["cloud"]))
+    with pytest.raises(ValueError):
+        capreg.resource_state_change("swarm2", "one", "cloud", resid, 1, "reserved", "assigned")
+    assert capreg.capacity == before
+
+def test_swarms_holding_and_resources_of_provider(make_registry):
+    storage = SQLiteStorage()
+    capreg = busy_registry(make_registry, storage)
+    held = dict((resid, set()) for resid in capreg.capacity["cloud"]["flavours"])
+    for swarmid, swarm in capreg.capacity["swarms"].items():
+        for ms in swarm.values():
+            for resid, rstate in ms.get("cloud", {}).items():
+                if rstate["reserved"] + rstate["assigned"] + rstate["allocated"] > 0:
+                    held[resid].add(swarmid)
+    for resid, swarmids in held.items():
+        assert storage.swarms_holding("cloud", resid) == sorted(swarmids)
+    assert storage.swarms_holding("cloud", "m2-large", ["allocated"]) == ["swarm1"]
+    assert storage.swarms_holding("edge", "e2") == ["swarm2"]
+    allocated = storage.resources_of_provider("SZTAKI")
+    assert allocated == [{"swarm": "swarm1", "ms": msid, "restype": "cloud", "resid": resid, "count": rstate["allocated"]}
+                         for msid, ms in sorted(capreg.capacity["swarms"]["swarm1"].items())
+                         for resid, rstate in sorted(ms.get("cloud", {}).items()) if rstate["allocated"]]
+    assert allocated and storage.resources_of_provider("FUEL") == []
+    assert [row["resid"] for row in storage.resources_of_provider("FUEL", "reserved")] == ["e1", "e2"]
+    with pytest.raises(ValueError):
+        storage.resources_of_provider("SZTAKI", "bogus")
+
+def test_writes_of_one_call_are_committed_together(make_registry):
+    storage = SQLiteStorage()
+    capreg = busy_registry(make_registry, storage)
+    statements = []
+    storage.conn.set_trace_callback(statements.append)
+    capreg.resource_offer_generate_from_SAT_file("swarm3", "app.yaml", {"one": 2})
+    #a reservation writes the resource row and moves it to reserved in one commit
+    writes = [index for index, statement in enumerate(statements) if statement.startswith(("INSERT INTO resources", "UPDATE resources"))]
+    assert writes and all(statements[index - 2:index] == ["SAVEPOINT sp0", "SAVEPOINT sp1"] for index in writes[::2])
+    assert all("RELEASE sp0" not in statements[first:second] for first, second in zip(writes[::2], writes[1::2]))
+    del statements[:]
+    capreg.resources_and_offers_destroy_all("swarm2")
+    assert statements.count("RELEASE sp0") == 1 and statements.count("RELEASE sp1") > 1
+    assert storage.load_capacity() == capreg.capacity
+
+def test_failed_write_in_a_batch_keeps_the_earlier_writes(make_registry):
+    storage = SQLiteStorage()
+    capreg = busy_registry(make_registry, storage)
+    with pytest.raises(ValueError):
+        with storage.batch():
+            storage.put_offer("swarm9", "one", "offer9", {"ids": {}})
+            storage.state_change("swarm9", "one", "cloud", "m2-small", 1, "reserved", "free", "raw", {})
+    assert "swarm9" in storage.load_capacity()["offers"]
+    assert storage.conn.in_transaction is False
+
+def test_shared_connection_is_guarded(make_registry):
+    storage = SQLiteStorage()
+    capreg = busy_registry(make_registry, storage)
+    errors = []
+
+    def writer(index):
+        try:
+            for count in range(50):
+                with storage.batch():
+                    storage.put_offer(f"swarm-{index}", "one", f"offer-{count}", {"ids": {}})
+                    storage.delete_offers(f"swarm-{index}", "one", f"offer-{count - 1}")
+                storage.load_capacity()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(index,)) for index in range(4)]
+    #switch threads often, so the writers interleave inside the storage methods
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert errors == []
+    stored = storage.load_capacity()
+    assert all(stored["offers"][f"swarm-{index}"]["one"].keys() == {"offer-49"} for index in range(4))
+    del stored["offers"]["swarm-0"], stored["offers"]["swarm-1"], stored["offers"]["swarm-2"], stored["offers"]["swarm-3"]
+    assert stored == capreg.capacity
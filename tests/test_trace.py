@@ -0,0 +1,40 @@
+import pytest
+from conftest import RAW_CAPACITY, requirement, use_requirements
+from swch_capreg.trace import TraceReplayer, state_digest
+
+REQUIREMENTS = {"one": requirement(1, 2), "two": requirement(2, 4), "three": requirement(4, 4)}
+
+def replayer_for(path: str) -> TraceReplayer:
+    replayer = TraceReplayer(path)
+    fresh_registry = replayer.fresh_registry
+    def fresh_registry_with_requirements():
+        capreg = fresh_registry()
+        use_requirements(capreg, REQUIREMENTS)
+        return capreg
+    replayer.fresh_registry = fresh_registry_with_requirements
+    return replayer
+
+@pytest.mark.parametrize("suffix", [".ndjson", ".ndjson.gz"])
+def test_batch_and_streaming_calls_replay_to_the_recorded_state(make_registry, tmp_path, suffix):
+    capreg = make_registry(RAW_CAPACITY, REQUIREMENTS)
+    path = str(tmp_path / ("trace" + suffix))
+    capreg.start_trace_recording(path)
+    capreg.resource_offer_generate_from_SAT_file("swarm1", "app.yaml")
+    #consumer accepts and rejects while the generator runs, then re-offers and stops early
+    for msid, offerid, offer in capreg.resource_offer_generate_iter_from_SAT_file("swarm2", "app.yaml", {"one": 2, "two": 1}):
+        if msid == "one":
+            capreg.resource_offer_accept(offerid, offer)
+        else:
+            capreg.resource_offer_reject(offerid, offer)
+    generator = capreg.resource_offer_generate_iter_from_SAT_file("swarm2", "app.yaml", {"one": 3, "two": 2})
+    next(generator)
+    generator.close()
+    capreg.resources_and_offers_destroy_all("swarm1")
+    digest = capreg.stop_trace_recording()
+    assert digest == state_digest(capreg.capacity)
+
+    replayer = replayer_for(path)
+    assert [call["m"] for call in replayer.calls if "m" in call].count("resource_state_change") == 0
+    report = replayer.run(threads=2)
+    assert report["errors"] == 0
+    assert report["state_match"] is True